@@ -15,12 +15,14 @@ from pyramid.config import Configurator
 from pyramid.renderers import JSON
 from pyramid.request import Request
 from pyramid.settings import asbool
+from pyramid.tweens import MAIN
 from pyramid_beaker import session_factory_from_settings
 from sqlalchemy.orm import scoped_session
 
 from old.models import Model, get_session_factory, get_engine, Tag
 from old.lib.constants import ISO_STRFTIME, OLD_NAME_DFLT
 from old.lib.foma_worker import start_foma_worker
+from old.lib.parser import FLOOKUP_POOLS
 
 
 LOGGER = logging.getLogger(__name__)
@@ -282,6 +284,15 @@ ENV_VAR_MAP = {
     'OLD_PERMANENT_STORE': 'permanent_store',
     'OLD_ADD_LANGUAGE_DATA': 'add_language_data',
     'OLD_EMPTY_DATABASE': 'empty_database',
+    'OLD_SEARCH_INDEX': 'search_index',
+    'OLD_QUERY_BUDGET': 'query_budget',
+    'OLD_QUERY_BUDGET_STRICT': 'query_budget.strict',
+    # Jobs (foma compilation, LM estimation, etc.)
+    'OLD_JOBS_POOL_SIZE': 'jobs.pool_size',
+    # flookup coprocess pools
+    'OLD_FLOOKUP_POOL_SIZE': 'flookup.pool_size',
+    'OLD_FLOOKUP_MAX_POOLS': 'flookup.max_pools',
+    'OLD_FLOOKUP_IDLE_TIMEOUT': 'flookup.idle_timeout',
     # Email
     'OLD_PASSWORD_RESET_SMTP_SERVER': 'password_reset_smtp_server',
     'OLD_TEST_EMAIL_TO': 'test_email_to',
@@ -339,10 +350,13 @@ def override_settings_with_env_vars(settings):
 def main(global_config, **settings):
     """This function returns a Pyramid WSGI application."""
     # pylint: disable=unused-argument
-    start_foma_worker()
     settings = override_settings_with_env_vars(settings)
+    start_foma_worker(settings)
+    FLOOKUP_POOLS.configure(settings)
     config = Configurator(settings=settings, request_factory=MyRequest)
     config.include('.routes')
     config.add_renderer('json', get_json_renderer())
+    config.add_tween('old.lib.querybudget.query_budget_tween_factory',
+                     over=MAIN)
     config.scan()
     return OLDHeadersMiddleware(config.make_wsgi_app())
@@ -113,6 +113,17 @@ Note also that SQLAQueryBuilder detects the RDBMS and issues collate commands
 where necessary to ensure that pattern matches are case-sensitive while ordering
 is not.
 
+``get_SQLA_query`` caches query plans in ``QUERY_PLANS``. A plan is the filter
+and ORDER BY expressions (and joins) built for a search with its values
+replaced by bound parameters. It is keyed by the search with its values
+replaced by their types, so searches that differ only in their values reuse the
+plan of the first one and only their values are converted and bound.
+
+If the ``search_index`` setting is true, ``like`` and ``regexp`` filters on
+the text attributes indexed by :mod:`old.models.searchtrigram` are conjoined
+with a filter that narrows the candidate ids via the trigram index, cf.
+:mod:`old.lib.searchindex`.
+
 A further potential enhancement would be to allow doubly relational searches,
 e.g., return all forms whose enterer has remembered a form with a transcription
 like 'a':
@@ -126,15 +137,20 @@ like 'a':
         >>>         Form.transcription.like('%1%'))))
 """
 
+from collections import OrderedDict
 import datetime
+import json
 import logging
+import threading
 
-from sqlalchemy.sql import or_, and_, not_, asc, desc
+from pyramid.settings import asbool
+from sqlalchemy.sql import or_, and_, not_, asc, desc, bindparam
 from sqlalchemy.exc import OperationalError, InvalidRequestError
 from sqlalchemy.sql.expression import collate
 from sqlalchemy.orm import aliased
 from sqlalchemy.types import Unicode, UnicodeText
 
+from old.lib import searchindex
 from old.lib.utils import normalize
 import old.models as old_models
 
@@ -215,6 +231,67 @@ class OLDSearchParseError(Exception):
         return self.errors
 
 
+class QueryPlanCache(object):
+    """Process-wide LRU of the query plans of ``SQLAQueryBuilder``, with
+    hit and miss counters (see ``info``).
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.plans.move_to_end(key)
+            return plan
+
+    def set(self, key, plan):
+        with self.lock:
+            self.plans[key] = plan
+            self.plans.move_to_end(key)
+            while len(self.plans) > self.max_entries:
+                self.plans.popitem(last=False)
+
+    def info(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self.plans), 'max_entries': self.max_entries}
+
+    def clear(self):
+        with self.lock:
+            self.plans.clear()
+            self.hits = self.misses = 0
+
+
+QUERY_PLANS = QueryPlanCache(500)
+
+
+class QueryPlan(object):
+    """The parameterized expressions of a search. ``slots`` holds the
+    (model name, attribute name, relation name) triple of each value in the
+    search; the value (or each item of a list value) of slot *i* is bound to
+    the parameter ``search_<i>`` (or ``search_<i>_<j>``).
+    """
+
+    def __init__(self, filter_expression, order_by_expression, joins, slots):
+        self.filter_expression = filter_expression
+        self.order_by_expression = order_by_expression
+        self.joins = joins
+        self.slots = slots
+
+
+class _Uncacheable(Exception):
+    pass
+
+
 class SQLAQueryBuilder(object):
     """Generate an SQLAlchemy query object from a Python dictionary.
 
@@ -248,8 +325,20 @@ class SQLAQueryBuilder(object):
         if not settings:
             settings = {}
         self.RDBMSName = get_RDBMS_name(settings) # i.e., mysql or sqlite
+        # Whether to narrow like/regexp searches via the search index.
+        self.search_index = asbool(settings.get('search_index', False))
+        # While a query plan is being built, the (model, attribute, relation)
+        # names of each value of the search, cf. ``_get_value``.
+        self._plan_slots = None
 
     def get_SQLA_query(self, python):
+        key, values = self._get_plan_key(python)
+        if key is not None:
+            plan = QUERY_PLANS.get(key)
+            if plan is not None:
+                params = self._get_plan_params(plan, values)
+                if params is not None:
+                    return self._get_plan_query(plan, params)
         self.clear_errors()
         filter_expression = self.get_SQLA_filter(python.get('filter'))
         order_by_expression = self._get_SQLA_order_by(python.get('order_by'), self.primary_key)
@@ -258,8 +347,139 @@ class SQLAQueryBuilder(object):
         query = query.filter(filter_expression)
         query = query.order_by(order_by_expression)
         query = self._add_joins_to_query(query)
+        if key is not None:
+            plan = self._get_plan(python)
+            if plan is not None:
+                QUERY_PLANS.set(key, plan)
         return query
 
+    ############################################################################
+    # Query plans
+    ############################################################################
+
+    def _get_plan_key(self, python):
+        """Return the key of the query plan of the search ``python`` and the
+        values of its simple filter expressions or ``(None, None)`` if the
+        search cannot be planned.
+        """
+        values = []
+        try:
+            shape = self._get_filter_shape(python.get('filter'), values)
+            order_by = json.dumps(python.get('order_by'))
+        except (_Uncacheable, AttributeError, TypeError, ValueError):
+            return None, None
+        return (self.model_name, self.primary_key, self.RDBMSName,
+                self.search_index, json.dumps(shape), order_by), values
+
+    def _get_filter_shape(self, python, values):
+        """Return ``python`` with the values of its simple filter expressions
+        replaced by their types, appending the values to ``values``.
+        """
+        if not isinstance(python, list) or not python:
+            raise _Uncacheable
+        if python[0] in ('and', 'or') and len(python) == 2:
+            if not isinstance(python[1], list):
+                raise _Uncacheable
+            return [python[0],
+                    [self._get_filter_shape(x, values) for x in python[1]]]
+        if python[0] == 'not' and len(python) == 2:
+            return ['not', self._get_filter_shape(python[1], values)]
+        if (len(python) not in (4, 5) or
+                not all(isinstance(x, str) for x in python[:-1])):
+            raise _Uncacheable
+        values.append(python[-1])
+        return python[:-1] + [self._get_value_shape(python[-1])]
+
+    @staticmethod
+    def _get_value_shape(value):
+        scalar_types = (str, int, float, bool)
+        if value is None:
+            return None
+        if isinstance(value, scalar_types):
+            return type(value).__name__
+        if (isinstance(value, list) and
+                all(isinstance(x, scalar_types) for x in value)):
+            return [type(x).__name__ for x in value]
+        raise _Uncacheable
+
+    def _get_plan(self, python):
+        """Build the query plan of the search ``python``. Return ``None`` if
+        that fails.
+        """
+        self.clear_errors()
+        self._plan_slots = []
+        try:
+            filter_expression = self.get_SQLA_filter(python.get('filter'))
+            order_by_expression = self._get_SQLA_order_by(
+                python.get('order_by'), self.primary_key)
+            plan = QueryPlan(filter_expression, order_by_expression,
+                             self.joins, self._plan_slots)
+        finally:
+            self._plan_slots = None
+            self.joins = []
+        if self.errors:
+            self.clear_errors()
+            return None
+        return plan
+
+    def _get_plan_params(self, plan, values):
+        """Return the bound parameters of ``plan`` for the values of a search
+        or ``None`` if the values cannot be converted.
+        """
+        if len(values) != len(plan.slots):
+            return None
+        self.clear_errors()
+        params = {}
+        for index, (value, slot) in enumerate(zip(values, plan.slots)):
+            value = self._get_value(value, *slot)
+            if isinstance(value, list):
+                for index_, item in enumerate(value):
+                    params['search_%d_%d' % (index, index_)] = item
+            elif value is not None:
+                params['search_%d' % index] = value
+                if self._is_narrowed(*slot):
+                    params.update(searchindex.get_candidates_params(
+                        'search_%d' % index, slot[2], value))
+        if self.errors:
+            self.clear_errors()
+            return None
+        return params
+
+    ############################################################################
+    # Search index
+    ############################################################################
+
+    def _is_narrowed(self, model_name, attribute_name, relation_name):
+        return self.search_index and searchindex.is_narrowed(
+            model_name, attribute_name, relation_name)
+
+    def _get_narrowed_relation(self, relation, model, model_name,
+                               attribute_name, relation_name):
+        """Return ``relation`` or, if searches with it are narrowed via the
+        search index, a relation that also restricts ``model`` to the candidate
+        instances of the search index.
+        """
+        if (relation is None or model is None or
+                not self._is_narrowed(model_name, attribute_name,
+                                      relation_name)):
+            return relation
+        def narrowed_relation(value):
+            filter_expression = relation(value)
+            candidates_filter = searchindex.get_candidates_filter(
+                model, model_name, attribute_name, relation_name, value)
+            if candidates_filter is None:
+                return filter_expression
+            return and_(filter_expression, candidates_filter)
+        return narrowed_relation
+
+    def _get_plan_query(self, plan, params):
+        query = self._get_base_query()
+        query = query.filter(plan.filter_expression)
+        query = query.order_by(plan.order_by_expression)
+        for join in plan.joins:
+            query = query.outerjoin(join[0], join[1])
+        return query.params(**params)
+
     def get_SQLA_filter(self, python):
         """Return the SQLAlchemy filter expression generable by the input Python
         data structure or raise an OLDSearchParseError if the data structure is
@@ -1093,8 +1313,24 @@ class SQLAQueryBuilder(object):
                 value = [value_converter(li) for li in value]
             else:
                 value = value_converter(value)
+        if self._plan_slots is not None:
+            value = self._get_bound_value(
+                value, model_name, attribute_name, relation_name)
         return value
 
+    def _get_bound_value(self, value, *slot):
+        """Return the bound parameter(s) standing in for ``value`` in a query
+        plan.
+        """
+        index = len(self._plan_slots)
+        self._plan_slots.append(slot)
+        if isinstance(value, list):
+            return [bindparam('search_%d_%d' % (index, index_))
+                    for index_ in range(len(value))]
+        if value is None:
+            return value
+        return bindparam('search_%d' % index)
+
     ############################################################################
     # Filter expression getters
     ############################################################################
@@ -1238,8 +1474,10 @@ class SQLAQueryBuilder(object):
                 args[3], model_name, attribute_name, relation_name)
             attribute = self._get_attribute(
                 attribute_name, model, model_name)
-            relation = self._get_relation(
-                relation_name, attribute, attribute_name, model_name)
+            relation = self._get_narrowed_relation(
+                self._get_relation(
+                    relation_name, attribute, attribute_name, model_name),
+                model, model_name, attribute_name, relation_name)
             return self._get_filter_expression(
                 relation, value, model_name, attribute_name, relation_name)
         attribute_model_name = self._get_attribute_model_name(
@@ -1258,9 +1496,12 @@ class SQLAQueryBuilder(object):
         attribute_model_attribute = self._get_attribute(
             attribute_model_attribute_name, attribute_model,
             attribute_model_name)
-        relation = self._get_relation(
-            relation_name, attribute_model_attribute,
-            attribute_model_attribute_name, attribute_model_name)
+        relation = self._get_narrowed_relation(
+            self._get_relation(
+                relation_name, attribute_model_attribute,
+                attribute_model_attribute_name, attribute_model_name),
+            attribute_model, attribute_model_name,
+            attribute_model_attribute_name, relation_name)
         return self._get_filter_expression(
             relation, value, model_name, attribute_name, relation_name,
             attribute=attribute, attribute_model_name=attribute_model_name,
@@ -19,7 +19,8 @@ RSRC_TO_DIR = {
     'morphologicalparser': 'morphological_parsers',
     'morpheme_language_models': 'morpheme_language_models',
     'morphemelanguagemodels': 'morpheme_language_models',
-    'morphemelanguagemodel': 'morpheme_language_models'
+    'morphemelanguagemodel': 'morpheme_language_models',
+    'imports': 'imports'
 }
 
 
@@ -152,6 +153,87 @@ MORPHOLOGICAL_PARSER_COMPILE_TIMEOUT = 60 * 60
 
 MORPHEME_LANGUAGE_MODEL_GENERATE_TIMEOUT = 60 * 15
 
+
+# Bulk parse requests parse the unique words of their input in batches of this
+# many words and may ask for at most this many scored candidates per word.
+BULK_PARSE_BATCH_SIZE = 1000
+BULK_PARSE_MAX_CANDIDATES = 10
+
+
+# Bulk form imports (POST /forms/bulk) validate and insert their forms in
+# batches of this many; a failed import reports the first this many invalid
+# lines.
+BULK_IMPORT_BATCH_SIZE = 500
+BULK_IMPORT_MAX_ERRORS = 3
+
+
+# Keyset-paginated requests read the counts of their queries from a
+# process-wide cache (cf. old/lib/dbutils.py) whose counts may be up to this
+# many seconds old.
+PAGINATION_COUNT_CACHE_TTL = 60
+PAGINATION_COUNT_CACHE_MAX_ENTRIES = 1000
+
+
+# Unpaginated requests for all forms are streamed as JSON: the dicts of the
+# forms are built in batches of this many from one query per relation (cf.
+# ``Form.get_dicts``).
+GET_DICTS_BATCH_SIZE = 500
+
+
+# Exports (GET /<collection>/export) stream the ids of the exported resources
+# and serialize their dicts in batches of this many, in one of these formats.
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+# The maximum numbers of SQL statements that requests on these routes may
+# execute, independently of how many models they return (cf.
+# ``old.lib.querybudget``).
+QUERY_BUDGETS = {
+    'index_forms': 12,
+    'search_forms': 12,
+    'search_forms_post': 12,
+    'show_form': 10
+}
+
+
+# The current application settings of each OLD and what input validation
+# derives from them are cached (cf. ``old.lib.dbutils.APP_SETTINGS_CACHE``).
+# Changes made in this process invalidate the cache at once, those made by
+# other processes (e.g., other web server workers) after this many seconds.
+APP_SETTINGS_CACHE_TTL = 60
+
+
+# The process-wide LRU of cached parses (cf. old/models/morphologicalparser.py)
+# holds at most this many parses, summed over all morphological parsers.
+PARSE_CACHE_MAX_ENTRIES = 100000
+
+
+# The statuses of a job (cf. old/models/job.py). A pending job is waiting in
+# the queue of the foma worker, a running job is being run in a worker process
+# and the remaining statuses are final.
+JOB_STATUSES = (
+    'pending',
+    'running',
+    'succeeded',
+    'failed',
+    'cancelled'
+)
+
+JOB_FINAL_STATUSES = (
+    'succeeded',
+    'failed',
+    'cancelled'
+)
+
+
+# Default number of worker processes that run jobs concurrently; override with
+# the ``jobs.pool_size`` setting.
+JOB_POOL_SIZE = 2
+
 # The word boundary symbol is used in foma FST scripts to denote the beginning
 # or end of a word, i.e., it can be referred to in phonological rules, e.g.,
 # define semivowelDrop glides -> 0 || "#" _;$ The system will wrap inputs in
@@ -165,6 +247,15 @@ MORPHOLOGY_SCRIPT_TYPES = (
 )
 
 
+# Backends that a morphological parser can use to look up words in its
+# compiled morphophonology: 'flookup' runs foma's flookup utility, 'python'
+# uses the in-process transducer of old/lib/foma_lookup.py.
+FST_LOOKUP_BACKENDS = (
+    'flookup',
+    'python'
+)
+
+
 # String to use when a morpheme's category cannot be determined
 UNKNOWN_CATEGORY = '?'
 
@@ -3,17 +3,28 @@ that involves the SQLA session should be moved here.
 
 """
 
-from collections import namedtuple
+import base64
+from collections import namedtuple, OrderedDict
+import datetime
+import json
 import re
+import threading
+import time
 from uuid import UUID
 
+from formencode import Invalid
+from formencode.api import FancyValidator
 from formencode.schema import Schema
 from formencode.validators import Int
-from sqlalchemy.orm import subqueryload, joinedload
-from sqlalchemy.sql import or_, not_, desc, asc
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.sql import and_, or_, not_, desc, asc, false, operators
+from sqlalchemy.sql.elements import UnaryExpression
 
+import old.lib.constants as oldc
 from old.lib.utils import esc_RE_meta_chars
 import old.models as old_models
+from old.models.applicationsettings import APP_SETTINGS_VERSIONS, Inventory
 from old.models.meta import Base
 
 
@@ -24,135 +35,109 @@ class PaginatorSchema(Schema):
     page = Int(not_empty=True, min=1)
 
 
+class Cursor(FancyValidator):
+    """An opaque keyset pagination cursor: the URL-safe base64 encoding of a
+    JSON array of the ORDER BY values of the last item of the previous page.
+    An empty cursor requests the first page.
+    """
+
+    messages = {'invalid': 'The cursor is invalid.'}
+
+    def _convert_to_python(self, value, state):
+        if not value:
+            return None
+        try:
+            values = json.loads(
+                base64.urlsafe_b64decode(value.encode('ascii')).decode('utf8'))
+            return [_decode_cursor_value(v) for v in values]
+        except (TypeError, ValueError, UnicodeError):
+            raise Invalid(self.message('invalid', state), value, state)
+
+
+class KeysetPaginatorSchema(Schema):
+    allow_extra_fields = True
+    filter_extra_fields = False
+    items_per_page = Int(not_empty=True, min=1)
+    cursor = Cursor(if_missing=None)
+
+
 ##########################################################################
 # Eager loading of model queries
 ##########################################################################
 
-# It appears that SQLAlchemy does not query the db to retrieve a relational
-# scalar when the foreign key id col value is NULL. Therefore, eager loading
-# on relational scalars is pointless if not wasteful. However, collections
-# that will always be accessed should always be eager loaded.
-
-
-def get_eagerloader(model_name):
-    return locals().get('eagerload_' + model_name, lambda x: x)
+# The relations to eager load, by model name and view action: ``list`` for
+# index and search requests, ``show`` for requests on a single model and
+# ``minimal`` for ``minimal_model`` representations. They are the relations
+# that the models' ``get_dict`` (or, for ``show``, ``get_full_dict``) methods
+# access; a dotted path names a relation of a related model, e.g., the crossref
+# source in a source's mini-dict. ``show`` defaults to ``list`` and ``minimal``
+# to nothing.
+EAGERLOADS = {
+    'ApplicationSettings': {
+        'list': ('storage_orthography', 'input_orthography',
+                 'output_orthography', 'unrestricted_users')},
+    'Collection': {
+        'list': ('speaker', 'source', 'source.crossref_source', 'elicitor',
+                 'enterer', 'modifier', 'tags', 'files'),
+        'show': ('speaker', 'source', 'source.crossref_source', 'elicitor',
+                 'enterer', 'modifier', 'tags', 'files', 'forms')},
+    'Corpus': {
+        'list': ('enterer', 'modifier', 'form_search', 'tags', 'files')},
+    'File': {
+        'list': ('enterer', 'elicitor', 'speaker', 'parent_file', 'tags',
+                 'forms')},
+    'Form': {
+        'list': ('elicitor', 'enterer', 'modifier', 'verifier', 'speaker',
+                 'elicitation_method', 'syntactic_category', 'source',
+                 'source.crossref_source', 'translations', 'files', 'tags')},
+    'FormSearch': {'list': ('enterer',)},
+    'Job': {'list': ('enterer',)},
+    'Keyboard': {'list': ('enterer', 'modifier')},
+    'MorphemeLanguageModel': {
+        'list': ('corpus', 'enterer', 'modifier', 'vocabulary_morphology')},
+    'MorphologicalParser': {
+        'list': ('phonology', 'morphology', 'language_model', 'enterer',
+                 'modifier')},
+    'Morphology': {
+        'list': ('lexicon_corpus', 'rules_corpus', 'enterer', 'modifier')},
+    'Phonology': {'list': ('enterer', 'modifier')},
+    'Source': {'list': ('file', 'crossref_source')},
+    'User': {'list': ('input_orthography', 'output_orthography')},
+}
+
+
+def get_eagerloader(model_name, action='list'):
+    """Return a function that adds the eager loading options of
+    ``EAGERLOADS[model_name][action]`` to a query. Many-to-one relations are
+    joined into the query; each collection is loaded by one extra SELECT with
+    an IN clause over the parent ids, which, unlike a join, does not multiply
+    the rows that LIMIT and keyset pagination count.
+    """
+    relations = EAGERLOADS.get(model_name, {})
+    paths = relations.get(
+        action, () if action == 'minimal' else relations.get('list', ()))
+    if not paths:
+        return lambda query: query
+    options = [_get_eagerload_option(getattr(old_models, model_name), path)
+               for path in paths]
+    return lambda query: query.options(*options)
+
+
+def _get_eagerload_option(model_cls, path):
+    option = None
+    for name in path.split('.'):
+        attr = getattr(model_cls, name)
+        if attr.property.uselist:
+            loader = selectinload if option is None else option.selectinload
+        else:
+            loader = joinedload if option is None else option.joinedload
+        option = loader(attr)
+        model_cls = attr.property.mapper.class_
+    return option
 
 
 def eagerload_form(query):
-    return query.options(
-        #subqueryload(old_models.Form.elicitor),
-        subqueryload(old_models.Form.enterer),   # All forms *should* have enterers
-        subqueryload(old_models.Form.modifier),
-        #subqueryload(old_models.Form.verifier),
-        #subqueryload(old_models.Form.speaker),
-        #subqueryload(old_models.Form.elicitation_method),
-        #subqueryload(old_models.Form.syntactic_category),
-        #subqueryload(old_models.Form.source),
-        joinedload(old_models.Form.translations),
-        joinedload(old_models.Form.files),
-        joinedload(old_models.Form.tags))
-
-
-def eagerload_application_settings(query):
-    return query.options(
-        subqueryload(old_models.ApplicationSettings.input_orthography),
-        subqueryload(old_models.ApplicationSettings.output_orthography),
-        subqueryload(old_models.ApplicationSettings.storage_orthography)
-    )
-
-
-def eagerload_collection(query, eagerload_forms=False):
-    """Eagerload the relational attributes of collections most likely to
-    have values.
-    subqueryload(old_models.Collection.speaker),
-    subqueryload(old_models.Collection.elicitor),
-    subqueryload(old_models.Collection.source),
-    """
-    if eagerload_forms:
-        return query.options(
-            subqueryload(old_models.Collection.enterer),
-            subqueryload(old_models.Collection.modifier),
-            subqueryload(old_models.Collection.forms),
-            joinedload(old_models.Collection.tags),
-            joinedload(old_models.Collection.files))
-    return query.options(
-        subqueryload(old_models.Collection.enterer),
-        subqueryload(old_models.Collection.modifier),
-        joinedload(old_models.Collection.tags),
-        joinedload(old_models.Collection.files))
-
-
-def eagerload_corpus(query, eagerload_forms=False):
-    """Eagerload the relational attributes of corpora most likely to have
-    values.
-    """
-    if eagerload_forms:
-        return query.options(
-            subqueryload(old_models.Corpus.enterer),
-            subqueryload(old_models.Corpus.modifier),
-            subqueryload(old_models.Corpus.forms),
-            joinedload(old_models.Corpus.tags))
-    return query.options(
-        subqueryload(old_models.Corpus.enterer),
-        subqueryload(old_models.Corpus.modifier),
-        joinedload(old_models.Corpus.tags))
-
-
-def eagerload_file(query):
-    return query.options(
-        subqueryload(old_models.File.enterer),
-        subqueryload(old_models.File.elicitor),
-        subqueryload(old_models.File.speaker),
-        subqueryload(old_models.File.parent_file),
-        joinedload(old_models.File.tags),
-        joinedload(old_models.File.forms))
-
-
-def eagerload_form_search(query):
-    # return query.options(subqueryload(old_models.FormSearch.enterer))
-    return query
-
-
-def eagerload_phonology(query):
-    return query.options(
-        subqueryload(old_models.Phonology.enterer),
-        subqueryload(old_models.Phonology.modifier))
-
-
-def eagerload_morpheme_language_model(query):
-    return query.options(
-        subqueryload(old_models.MorphemeLanguageModel.corpus),
-        subqueryload(
-            old_models.MorphemeLanguageModel.vocabulary_morphology),
-        subqueryload(old_models.MorphemeLanguageModel.enterer),
-        subqueryload(old_models.MorphemeLanguageModel.modifier))
-
-
-def eagerload_morphological_parser(query):
-    return query.options(
-        subqueryload(old_models.MorphologicalParser.phonology),
-        subqueryload(old_models.MorphologicalParser.morphology),
-        subqueryload(old_models.MorphologicalParser.language_model),
-        subqueryload(old_models.MorphologicalParser.enterer),
-        subqueryload(old_models.MorphologicalParser.modifier))
-
-
-def eagerload_morphology(query):
-    return query.options(
-        subqueryload(old_models.Morphology.lexicon_corpus),
-        subqueryload(old_models.Morphology.rules_corpus),
-        subqueryload(old_models.Morphology.enterer),
-        subqueryload(old_models.Morphology.modifier))
-
-
-def eagerload_user(query):
-    """
-    return query.options(
-        #subqueryload(old_models.User.input_orthography),
-        #subqueryload(old_models.User.output_orthography)
-    )
-    """
-    return query
+    return get_eagerloader('Form')(query)
 
 
 def minimal(models_array):
@@ -187,7 +172,55 @@ def get_paginated_query_results(query, paginator):
     }
 
 
+def get_keyset_paginated_query_results(query, paginator, cursor):
+    """Return the page of results of ``query`` that follows the row with
+    ORDER BY values ``cursor`` (the decoded cursor of ``paginator``) and a
+    cursor to the next page (``None`` on the last page).
+
+    Rather than skipping ``OFFSET`` rows, the page is selected by filtering
+    for rows whose ORDER BY values (plus the primary key as a tiebreaker) come
+    after those encoded in the cursor, so deep pages are as fast as the first.
+    The count is read from ``COUNTS``.
+    """
+    if 'count' not in paginator:
+        paginator['count'] = COUNTS.get_count(query)
+    query, order = _add_keyset_tiebreaker(query)
+    if cursor is not None:
+        if len(cursor) != len(order):
+            raise Invalid(
+                'The cursor is invalid.', paginator['cursor'], None,
+                error_dict={'cursor': 'The cursor is invalid.'})
+        query = query.filter(_get_keyset_filter(order, cursor))
+    items_per_page = paginator['items_per_page']
+    rows = query.add_columns(
+        *[column for column, _ in order]).limit(items_per_page + 1).all()
+    paginator['next_cursor'] = None
+    if len(rows) > items_per_page:
+        rows = rows[:items_per_page]
+        paginator['next_cursor'] = _encode_cursor(rows[-1][1:])
+    items = [row[0] for row in rows]
+    if paginator.get('minimal'):
+        items = minimal(items)
+    else:
+        items = [mod.get_dict() for mod in items]
+    return {
+        'paginator': paginator,
+        'items': items
+    }
+
+
 def add_pagination(query, paginator):
+    """Paginate ``query`` according to ``paginator``. If it has a ``cursor``
+    key (its value is empty for the first page), keyset pagination is used;
+    otherwise, if it has ``page`` and ``items_per_page`` keys, offset
+    pagination is used.
+    """
+    if (paginator and 'cursor' in paginator and
+            paginator.get('items_per_page') is not None):
+        python_paginator = KeysetPaginatorSchema.to_python(paginator)
+        return get_keyset_paginated_query_results(
+            query, dict(python_paginator, cursor=paginator['cursor'] or None),
+            python_paginator['cursor'])
     if (paginator and paginator.get('page') is not None and
             paginator.get('items_per_page') is not None):
         # raises formencode.Invalid if paginator is invalid
@@ -199,6 +232,48 @@ def add_pagination(query, paginator):
         return query.all()
 
 
+def is_unpaginated(paginator):
+    """Return ``True`` if ``add_pagination`` returns all of the results of a
+    query, as models, given ``paginator``.
+    """
+    if not paginator:
+        return True
+    return (paginator.get('items_per_page') is None or
+            ('cursor' not in paginator and paginator.get('page') is None)) and (
+                not paginator.get('minimal'))
+
+
+def get_dicts_batches(session_factory, ids_query, model_cls,
+                      batch_size=oldc.EXPORT_BATCH_SIZE, unique=False):
+    """Yield the dicts (cf. ``Model.get_dicts``) of the ``model_cls`` models
+    whose ids ``ids_query`` selects, in its order, in batches of
+    ``batch_size``. The ids are streamed with a server-side cursor in one db
+    session and the dicts are built in another, so memory use does not grow
+    with the number of models. If ``unique`` is true, ids repeated by the
+    joins of the query are skipped.
+    """
+    ids_session = session_factory()
+    dicts_session = session_factory()
+    try:
+        seen = set()
+        batch = []
+        for id_, in ids_query.with_session(ids_session).yield_per(batch_size):
+            if unique:
+                if id_ in seen:
+                    continue
+                seen.add(id_)
+            batch.append(id_)
+            if len(batch) == batch_size:
+                yield model_cls.get_dicts(dicts_session, batch)
+                dicts_session.expunge_all()
+                batch = []
+        if batch:
+            yield model_cls.get_dicts(dicts_session, batch)
+    finally:
+        ids_session.close()
+        dicts_session.close()
+
+
 def get_model_names():
     return [mn for mn in dir(old_models) if mn[0].isupper()
             and mn not in ('LOGGER', 'Model', 'Base', 'Session', 'Engine')]
@@ -222,6 +297,244 @@ def _get_start_and_end_from_paginator(paginator):
     return (start, start + paginator['items_per_page'])
 
 
+class CountCache(object):
+    """Process-wide cache of the counts of paginated queries keyed by the
+    database URL, the SQL and the bound parameters of the query. Counts are
+    approximate in that they may be up to ``ttl`` seconds old.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_count(self, query):
+        query = query.order_by(None)
+        compiled = query.statement.compile()
+        key = (str(query.session.get_bind().url), str(compiled),
+               repr(sorted(compiled.params.items())))
+        now = time.monotonic()
+        with self.lock:
+            timestamp, count = self.counts.get(key, (None, None))
+            if timestamp is not None and now - timestamp < self.ttl:
+                self.counts.move_to_end(key)
+                return count
+        count = query.count()
+        with self.lock:
+            self.counts[key] = (now, count)
+            self.counts.move_to_end(key)
+            while len(self.counts) > self.max_entries:
+                self.counts.popitem(last=False)
+        return count
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+COUNTS = CountCache(oldc.PAGINATION_COUNT_CACHE_TTL,
+                    oldc.PAGINATION_COUNT_CACHE_MAX_ENTRIES)
+
+
+ForeignWordTranscriptions = namedtuple(
+    'FWTrans', ['narrow_phonetic', 'broad_phonetic', 'orthographic',
+                'morpheme_break'])
+
+
+class AppSettingsSnapshot(object):
+    """The current application settings of an OLD together with what input
+    validation derives from them and from its tags and foreign words: the
+    restricted and foreign word tag ids, the foreign word transcriptions and
+    the (compiled) transcription inventories. All are plain values that do
+    not depend on the db session they were read in.
+    """
+
+    transcription_types = ('orthographic', 'narrow_phonetic', 'broad_phonetic',
+                           'morpheme_break')
+
+    def __init__(self, dbsession):
+        tag_ids = {}
+        for name, id_ in dbsession.query(
+                old_models.Tag.name, old_models.Tag.id).filter(
+                    old_models.Tag.name.in_(('restricted', 'foreign word')))\
+                .order_by(desc(old_models.Tag.id)):
+            tag_ids[name] = id_
+        self.restricted_tag_id = tag_ids.get('restricted')
+        self.foreign_word_tag_id = tag_ids.get('foreign word')
+        self.foreign_word_transcriptions = self._get_foreign_word_transcriptions(
+            dbsession)
+        app_set = dbsession.query(old_models.ApplicationSettings).order_by(
+            desc(old_models.ApplicationSettings.id)).first()
+        self.values = {}
+        self.grammaticalities = []
+        self.morpheme_delimiters = ''
+        self.morpheme_delimiters_list = []
+        self.unrestricted_user_ids = frozenset()
+        self.inventories = {}
+        if app_set:
+            self.values = {
+                column.key: getattr(app_set, column.key) for column in
+                old_models.ApplicationSettings.__table__.columns}
+            self.grammaticalities = self._derive(
+                app_set, 'grammaticalities_list', [])
+            self.morpheme_delimiters = app_set.morpheme_delimiters
+            self.morpheme_delimiters_list = self._derive(
+                app_set, 'morpheme_delimiters_list', [])
+            self.unrestricted_user_ids = frozenset(
+                user.id for user in app_set.unrestricted_users)
+            for type_ in self.transcription_types:
+                try:
+                    self.inventories[type_] = Inventory(
+                        app_set.get_transcription_graphemes(
+                            type_, self.foreign_word_transcriptions))
+                except (AttributeError, TypeError):
+                    pass
+
+    @staticmethod
+    def _derive(app_set, attr, default):
+        """Return ``getattr(app_set, attr)`` or ``default`` if the settings
+        lack a value that ``attr`` is derived from. (Settings without, e.g.,
+        grammaticalities only raise where the derived value is used.)
+        """
+        try:
+            return getattr(app_set, attr)
+        except (AttributeError, TypeError):
+            return default
+
+    def _get_foreign_word_transcriptions(self, dbsession):
+        fwt = ForeignWordTranscriptions([], [], [], [])
+        if self.foreign_word_tag_id is None:
+            return fwt
+        form = old_models.Form
+        for narrow_phonetic, broad_phonetic, morpheme_break, transcription in\
+                dbsession.query(
+                    form.narrow_phonetic_transcription,
+                    form.phonetic_transcription, form.morpheme_break,
+                    form.transcription).filter(form.tags.any(
+                        old_models.Tag.id == self.foreign_word_tag_id))\
+                .order_by(asc(form.id)):
+            if narrow_phonetic:
+                fwt.narrow_phonetic.append(narrow_phonetic)
+            if broad_phonetic:
+                fwt.broad_phonetic.append(broad_phonetic)
+            if morpheme_break:
+                fwt.morpheme_break.append(morpheme_break)
+            fwt.orthographic.append(transcription)
+        return fwt
+
+
+class AppSettingsCache(object):
+    """Process-wide cache of the ``AppSettingsSnapshot`` of each OLD, keyed by
+    database URL. An entry is used as long as the OLD's application settings
+    version (cf. ``old.models.applicationsettings.APP_SETTINGS_VERSIONS``) is
+    the one it was built at, and for at most ``ttl`` seconds, which bounds how
+    long changes made by other processes go unnoticed.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get_snapshot(self, dbsession):
+        key = str(dbsession.get_bind().url)
+        version = APP_SETTINGS_VERSIONS.get(key)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[0] == version and now - entry[1] < self.ttl:
+            return entry[2]
+        snapshot = AppSettingsSnapshot(dbsession)
+        # Building the snapshot may have flushed changes, and another thread
+        # may have committed some, in the meantime.
+        if APP_SETTINGS_VERSIONS.get(key) == version:
+            with self.lock:
+                self.entries[key] = (version, now, snapshot)
+        return snapshot
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+APP_SETTINGS_CACHE = AppSettingsCache(oldc.APP_SETTINGS_CACHE_TTL)
+
+
+def _get_order_by_clauses(query):
+    # SQLAlchemy < 1.4 exposes the ORDER BY clauses of a query as
+    # ``_order_by``, later versions as ``_order_by_clauses``.
+    clauses = getattr(query, '_order_by_clauses', None)
+    if clauses is None:
+        clauses = getattr(query, '_order_by', None)
+    return list(clauses or ())
+
+
+def _add_keyset_tiebreaker(query):
+    """Return ``query`` ordered additionally by its primary key (unless it
+    is already ordered by it last) and a list of its ORDER BY (column,
+    descending) pairs.
+    """
+    order = []
+    for clause in _get_order_by_clauses(query):
+        if (isinstance(clause, UnaryExpression) and
+                clause.modifier in (operators.asc_op, operators.desc_op)):
+            order.append((clause.element,
+                          clause.modifier is operators.desc_op))
+        else:
+            order.append((clause, False))
+    primary_key = inspect(
+        query.column_descriptions[0]['entity']).primary_key[0]
+    if not (order and order[-1][0].compare(primary_key)):
+        query = query.order_by(asc(primary_key))
+        order.append((primary_key, False))
+    return query, order
+
+
+def _get_keyset_filter(order, values):
+    """Return a filter expression matching the rows that come after a row
+    with ORDER BY values ``values``. NULLs are taken to sort before all other
+    values, as they do in MySQL and SQLite.
+    """
+    disjuncts = []
+    for index, ((column, descending), value) in enumerate(zip(order, values)):
+        equals = [prev_column.is_(None) if prev_value is None else
+                  prev_column == prev_value for (prev_column, _), prev_value in
+                  zip(order[:index], values[:index])]
+        if descending:
+            if value is None:
+                continue
+            after = or_(column < value, column.is_(None))
+        else:
+            after = column.isnot(None) if value is None else column > value
+        disjuncts.append(and_(*(equals + [after])))
+    return or_(*disjuncts) if disjuncts else false()
+
+
+def _encode_cursor(values):
+    values = [_encode_cursor_value(value) for value in values]
+    return base64.urlsafe_b64encode(
+        json.dumps(values).encode('utf8')).decode('ascii')
+
+
+def _encode_cursor_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'date': value.isoformat()}
+    return value
+
+
+def _decode_cursor_value(value):
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            return datetime.datetime.fromisoformat(value['datetime'])
+        return datetime.date.fromisoformat(value['date'])
+    if isinstance(value, list):
+        raise ValueError('Not a cursor value: {}'.format(value))
+    return value
+
+
 def _filter_restricted_models_from_query(model_name, query, user):
     model_ = getattr(old_models, model_name)
     if model_name in ('FormBackup', 'CollectionBackup'):
@@ -248,7 +561,7 @@ class DBUtils:
         else:
             self.settings = {}
         self._current_app_set = None
-        self._foreign_word_transcriptions = None
+        self._cached_app_set = None
 
     @property
     def current_app_set(self):
@@ -259,6 +572,17 @@ class DBUtils:
             self._current_app_set = self.get_current_app_set()
         return self._current_app_set
 
+    @property
+    def cached_app_set(self):
+        """The ``AppSettingsSnapshot`` of the current application settings,
+        from the process-wide cache. Use this instead of ``current_app_set``
+        where plain values suffice.
+        """
+        if not self._cached_app_set:
+            self._cached_app_set = APP_SETTINGS_CACHE.get_snapshot(
+                self.dbsession)
+        return self._cached_app_set
+
     def get_current_app_set(self):
         """Use this to get the current application settings, without
         in-thread/memory caching.
@@ -268,17 +592,23 @@ class DBUtils:
                 desc(old_models.ApplicationSettings.id)).first()
 
     def get_object_language_id(self):
-        return getattr(self.current_app_set, 'object_language_id', 'old')
+        return self.cached_app_set.values.get('object_language_id', 'old')
 
     def get_grammaticalities(self):
-        return getattr(self.current_app_set, 'grammaticalities_list', [])
+        return self.cached_app_set.grammaticalities
 
     def get_morpheme_delimiters(self, type_='list'):
         """Return the morpheme delimiters from app settings as an object of
         type ``type_``."""
         if type_ == 'list':
-            return getattr(self.current_app_set, 'morpheme_delimiters_list', [])
-        return getattr(self.current_app_set, 'morpheme_delimiters', '')
+            return self.cached_app_set.morpheme_delimiters_list
+        return self.cached_app_set.morpheme_delimiters
+
+    def get_transcription_inventory(self, type_):
+        """Return the (cached) ``Inventory`` of the transcription type
+        ``type_``; cf. ``ApplicationSettings.get_transcription_inventory``.
+        """
+        return self.cached_app_set.inventories.get(type_)
 
     def get_unrestricted_users(self):
         """Return the list of unrestricted users in the current application
@@ -296,9 +626,9 @@ class DBUtils:
         """
         if user.role == 'administrator':
             return True
-        if not self.get_restricted_tag():
+        if self.cached_app_set.restricted_tag_id is None:
             return True
-        if user in self.get_unrestricted_users():
+        if user.id in self.cached_app_set.unrestricted_user_ids:
             return True
         return False
 
@@ -318,7 +648,10 @@ class DBUtils:
             old_models.Tag.name=='foreign word').first()
 
     def get_foreign_word_tag_id(self):
-        return self.get_foreign_word_tag().id
+        """Return the id of the foreign word tag or ``None`` if there is
+        none.
+        """
+        return self.cached_app_set.foreign_word_tag_id
 
     @property
     def foreign_word_transcriptions(self):
@@ -329,33 +662,7 @@ class DBUtils:
         transcriptions (narrow phonetic, broad phonetic, orthographic,
         morphemic) of foreign words.
         """
-        if not self._foreign_word_transcriptions:
-            foreign_words = self.get_foreign_words()
-            foreign_word_narrow_phonetic_transcriptions = []
-            foreign_word_broad_phonetic_transcriptions = []
-            foreign_word_orthographic_transcriptions = []
-            foreign_word_morphemic_transcriptions = []
-            for fw in foreign_words:
-                if fw.narrow_phonetic_transcription:
-                    foreign_word_narrow_phonetic_transcriptions.append(
-                        fw.narrow_phonetic_transcription)
-                if fw.phonetic_transcription:
-                    foreign_word_broad_phonetic_transcriptions.append(
-                        fw.phonetic_transcription)
-                if fw.morpheme_break:
-                    foreign_word_morphemic_transcriptions.append(fw.morpheme_break)
-                foreign_word_orthographic_transcriptions.append(fw.transcription)
-            FWTrans = namedtuple('FWTrans', ['narrow_phonetic',
-                                             'broad_phonetic',
-                                             'orthographic',
-                                             'morpheme_break'])
-            self._foreign_word_transcriptions = FWTrans(
-                foreign_word_narrow_phonetic_transcriptions,
-                foreign_word_broad_phonetic_transcriptions,
-                foreign_word_orthographic_transcriptions,
-                foreign_word_morphemic_transcriptions
-            )
-        return self._foreign_word_transcriptions
+        return self.cached_app_set.foreign_word_transcriptions
 
     ###########################################################################
     # Convenience getters for resource collections
@@ -0,0 +1,365 @@
+# Copyright 2016 Joel Dunham
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""In-process lookup against compiled foma transducers.
+
+This module provides an alternative to running foma's ``flookup`` utility as a
+subprocess. A ``Transducer`` loads the (gzipped) binary file written by foma's
+``save stack`` command (or an AT&T-format dump of the same network written by
+foma's ``write att`` command) into flat ``array`` buffers and performs apply up
+and apply down directly in Python. Transitions out of a state are indexed by
+input symbol the first time they are needed and memoized thereafter.
+
+The output of ``Transducer.lookup`` mimics that of ``flookup``, i.e., a list of
+tab-delimited input/output lines with ``+?`` as the output of an input that the
+transducer does not accept, so that callers can keep using
+``FomaFST.foma_output_file2dict`` to interpret it.
+
+Networks that use flag diacritics or that consist of more than one network on
+the stack are not supported; loading them raises
+``UnsupportedTransducerError`` and callers should fall back to flookup.
+
+Usage:
+
+    >>> from old.lib.foma_lookup import Transducer
+    >>> transducer = Transducer.from_foma_binary('phonology.foma')
+    >>> transducer.apply_up('cbd')
+    ['cad', 'cbd']
+    >>> transducer.apply_down('cad')
+    ['cbd']
+
+"""
+
+from array import array
+import gzip
+import logging
+import os
+import re
+import threading
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class UnsupportedTransducerError(Exception):
+    pass
+
+
+# foma reserves the first three symbol numbers for these special symbols.
+EPSILON = 0
+UNKNOWN = 1
+IDENTITY = 2
+UNKNOWN_OUTPUT = '?'
+
+FLAG_DIACRITIC_PATT = re.compile(r'^@[PNRDCU]\.[^@]*@$')
+
+# Token id used for input characters that are not in the network's alphabet.
+OOV = -1
+
+
+class Transducer:
+    """An array-backed, in-memory foma transducer.
+
+    Arcs are stored in the parallel arrays ``arc_upper``, ``arc_lower`` and
+    ``arc_target``, sorted by source state; the arcs of state ``s`` occupy
+    indices ``state_offsets[s]`` up to (but not including)
+    ``state_offsets[s + 1]``. State 0 is the start state.
+    """
+
+    def __init__(self, sigma, finals, state_offsets, arc_upper, arc_lower,
+                 arc_target):
+        self.sigma = sigma
+        self.finals = finals
+        self.state_offsets = state_offsets
+        self.arc_upper = arc_upper
+        self.arc_lower = arc_lower
+        self.arc_target = arc_target
+        for symbol in sigma.values():
+            if FLAG_DIACRITIC_PATT.match(symbol):
+                raise UnsupportedTransducerError(
+                    'Flag diacritics are not supported')
+        self.symbol2id = {symbol: id_ for id_, symbol in sigma.items()
+                          if id_ > IDENTITY}
+        self.max_symbol_length = max(
+            [len(symbol) for symbol in self.symbol2id] or [1])
+        # Memoized transitions: {direction: {(state, token): [(output_id,
+        # target, consumes), ...]}}
+        self._transitions = {'up': {}, 'down': {}}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_foma_binary(cls, path):
+        """Load the gzipped foma binary file at ``path``."""
+        with gzip.open(path, 'rt', encoding='utf8') as filei:
+            lines = filei.read().split('\n')
+        if lines.count('##foma-net 1.0##') != 1:
+            raise UnsupportedTransducerError(
+                'Only files containing exactly one network are supported')
+        sigma = {}
+        section = None
+        states = []
+        for line in lines:
+            if line.startswith('##'):
+                section = line
+                continue
+            if section == '##sigma##':
+                id_, symbol = line.split(' ', 1)
+                sigma[int(id_)] = symbol
+            elif section == '##states##':
+                items = [int(item) for item in line.split()]
+                if items == [-1, -1, -1, -1, -1]:
+                    section = None
+                    continue
+                states.append(items)
+        # Each line of the states section has 2, 3, 4 or 5 items: "in target",
+        # "in out target", "state in target final" or "state in out target
+        # final", where the lines with 4 or 5 items begin a new state.
+        arcs = []
+        finals = set()
+        state = None
+        for items in states:
+            if len(items) == 2:
+                upper, target = items
+                lower = upper
+            elif len(items) == 3:
+                upper, lower, target = items
+            elif len(items) == 4:
+                state, upper, target, final = items
+                lower = upper
+                if final:
+                    finals.add(state)
+            else:
+                state, upper, lower, target, final = items
+                if final:
+                    finals.add(state)
+            if target != -1:
+                arcs.append((state, upper, lower, target))
+        return cls.from_arcs(sigma, finals, arcs)
+
+    @classmethod
+    def from_att(cls, path, epsilon_symbol='@0@'):
+        """Load the AT&T-format dump of a network (as written by foma's
+        ``write att`` command) at ``path``. The file may be gzipped.
+        """
+        try:
+            with gzip.open(path, 'rt', encoding='utf8') as filei:
+                lines = filei.read().split('\n')
+        except OSError:
+            with open(path, encoding='utf8') as filei:
+                lines = filei.read().split('\n')
+        sigma = {EPSILON: '@_EPSILON_SYMBOL_@',
+                 UNKNOWN: '@_UNKNOWN_SYMBOL_@',
+                 IDENTITY: '@_IDENTITY_SYMBOL_@'}
+        symbol2id = {symbol: id_ for id_, symbol in sigma.items()}
+        symbol2id[epsilon_symbol] = EPSILON
+
+        def get_id(symbol):
+            try:
+                return symbol2id[symbol]
+            except KeyError:
+                id_ = symbol2id[symbol] = len(sigma)
+                sigma[id_] = symbol
+                return id_
+
+        arcs = []
+        finals = set()
+        for line in lines:
+            fields = line.split('\t')
+            if len(fields) >= 4:
+                arcs.append((int(fields[0]), get_id(fields[2]),
+                             get_id(fields[3]), int(fields[1])))
+            elif fields[0].strip():
+                finals.add(int(fields[0]))
+        return cls.from_arcs(sigma, finals, arcs)
+
+    @classmethod
+    def from_arcs(cls, sigma, finals, arcs):
+        """Build a transducer from ``(state, upper, lower, target)`` arc
+        tuples. The relative order of the arcs of each state is preserved.
+        """
+        state_count = max([arc[0] for arc in arcs] +
+                          [arc[3] for arc in arcs] + list(finals) + [0]) + 1
+        arcs = sorted(arcs, key=lambda arc: arc[0])
+        state_offsets = array('i', [0] * (state_count + 1))
+        for arc in arcs:
+            state_offsets[arc[0] + 1] += 1
+        for index in range(1, state_count + 1):
+            state_offsets[index] += state_offsets[index - 1]
+        return cls(
+            sigma,
+            frozenset(finals),
+            state_offsets,
+            array('i', [arc[1] for arc in arcs]),
+            array('i', [arc[2] for arc in arcs]),
+            array('i', [arc[3] for arc in arcs]))
+
+    def tokenize(self, word):
+        """Split ``word`` into a list of ``(token_id, string)`` pairs using
+        longest match against the alphabet, as foma does. Characters that are
+        not in the alphabet become ``OOV`` tokens.
+        """
+        tokens = []
+        index = 0
+        length = len(word)
+        while index < length:
+            for size in range(min(self.max_symbol_length, length - index), 0,
+                              -1):
+                symbol = word[index:index + size]
+                id_ = self.symbol2id.get(symbol)
+                if id_ is not None:
+                    tokens.append((id_, symbol))
+                    index += size
+                    break
+            else:
+                tokens.append((OOV, word[index]))
+                index += 1
+        return tokens
+
+    def transitions(self, direction, state, token):
+        """Return the ``(output_id, target, consumes)`` triples for the arcs
+        out of ``state`` that can be followed on input ``token`` (or without
+        consuming input, if ``consumes`` is false), in arc order.
+        """
+        key = (state, token)
+        memo = self._transitions[direction]
+        try:
+            return memo[key]
+        except KeyError:
+            pass
+        if direction == 'up':
+            inputs, outputs = self.arc_lower, self.arc_upper
+        else:
+            inputs, outputs = self.arc_upper, self.arc_lower
+        result = []
+        for index in range(self.state_offsets[state],
+                           self.state_offsets[state + 1]):
+            input_ = inputs[index]
+            output = outputs[index]
+            target = self.arc_target[index]
+            if input_ == EPSILON:
+                result.append((output, target, False))
+            elif token is None:
+                continue
+            elif input_ == token:
+                result.append((output, target, True))
+            elif token == OOV and input_ in (IDENTITY, UNKNOWN):
+                result.append((output, target, True))
+        with self._lock:
+            memo[key] = result
+        return result
+
+    def apply(self, direction, word):
+        """Return the list of outputs of ``word`` when the transducer is
+        applied in ``direction`` ('up' or 'down').
+        """
+        tokens = self.tokenize(word)
+        token_count = len(tokens)
+        finals = self.finals
+        sigma = self.sigma
+        results = []
+        # Depth-first search; each stack item is (state, input position,
+        # output so far, states entered via epsilon arcs at this position).
+        # Like foma, we allow an epsilon cycle to be traversed at most once
+        # per input position.
+        stack = [(0, 0, (), frozenset())]
+        while stack:
+            state, position, output, visited = stack.pop()
+            if position == token_count:
+                token, string = None, None
+                if state in finals:
+                    results.append(''.join(output))
+            else:
+                token, string = tokens[position]
+            pending = []
+            for output_id, target, consumes in self.transitions(
+                    direction, state, token):
+                if consumes:
+                    new_position = position + 1
+                    new_visited = frozenset()
+                else:
+                    if target in visited:
+                        continue
+                    new_position = position
+                    new_visited = visited | {target}
+                if output_id == EPSILON:
+                    new_output = output
+                elif output_id == IDENTITY:
+                    new_output = output + (string,)
+                elif output_id == UNKNOWN:
+                    new_output = output + (UNKNOWN_OUTPUT,)
+                else:
+                    new_output = output + (sigma[output_id],)
+                pending.append((target, new_position, new_output, new_visited))
+            # Push in reverse so that arcs are explored in arc order.
+            stack.extend(reversed(pending))
+        return results
+
+    def apply_up(self, word):
+        return self.apply('up', word)
+
+    def apply_down(self, word):
+        return self.apply('down', word)
+
+    def lookup(self, inputs, direction='up',
+               no_output='+?'):
+        """Return flookup-style tab-delimited input/output lines for the
+        strings in ``inputs``.
+        """
+        lines = []
+        for input_ in inputs:
+            for line in input_.split('\n'):
+                outputs = self.apply(direction, line)
+                if outputs:
+                    lines.extend('%s\t%s' % (line, output)
+                                 for output in outputs)
+                else:
+                    lines.append('%s\t%s' % (line, no_output))
+        return lines
+
+
+class TransducerRegistry:
+    """Process-wide registry of loaded ``Transducer`` instances keyed by the
+    path to a compiled foma binary. A transducer is reloaded when the
+    modification time of its binary changes. Binaries that cannot be loaded
+    are remembered (for that modification time) as ``None`` so that callers
+    can fall back to flookup without retrying the load on every call.
+    """
+
+    def __init__(self):
+        self.transducers = {}
+        self.lock = threading.Lock()
+
+    def get_transducer(self, binary_path):
+        mtime = os.path.getmtime(binary_path)
+        with self.lock:
+            cached_mtime, transducer = self.transducers.get(
+                binary_path, (None, None))
+            if cached_mtime == mtime:
+                return transducer
+            try:
+                transducer = Transducer.from_foma_binary(binary_path)
+            except Exception as error:
+                LOGGER.info('Unable to load %s in-process (%s %s); using'
+                            ' flookup instead.', binary_path,
+                            error.__class__.__name__, error)
+                transducer = None
+            self.transducers[binary_path] = (mtime, transducer)
+            return transducer
+
+    def recycle(self, binary_path):
+        with self.lock:
+            self.transducers.pop(binary_path, None)
+
+
+TRANSDUCERS = TransducerRegistry()
@@ -12,41 +12,50 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-"""This module contains some multithreading worker and queue logic plus the
-functionality -- related to foma compilation ang LM estimation -- that the
-worther thread initiates.
-
-The the foma worker compiles foma FST phonology, morphology and morphophonology
-scripts and estimates morpheme language models.  Having a worker perform these
-tasks in a separate thread from that processing the HTTP request allows us to
-immediately respond to the user.
+"""This module contains the job queue and worker logic plus the
+functionality -- related to foma compilation and LM estimation -- that the
+worker runs.
+
+The foma worker compiles foma FST phonology, morphology and morphophonology
+scripts, estimates morpheme language models and imports forms in bulk (cf.
+:mod:`old.lib.formimport`).  Having a worker perform these tasks outside of
+the process handling the HTTP request allows us to immediately respond to the
+user.
+
+Each request for such work is recorded as a job (a row in the ``job`` table;
+see :mod:`old.models.job`) and placed in a priority queue. A configurable
+number of dispatcher threads (the ``jobs.pool_size`` setting) take jobs from
+the queue and run each one in its own child process, so that foma and MITLM
+jobs can use multiple cores. Clients can follow a job's status, progress and
+estimated time remaining via ``GET /jobs/{id}`` and cancel it via
+``DELETE /jobs/{id}``. Enqueueing a job that is identical to a job that is
+still pending returns the pending job instead of creating a new one.
 
 The foma worker can only run a callable that is a global in
 :mod:`old.lib.foma_worker` and which takes keyword
 arguments.  Example usage::
 
-    from old.lib.foma_worker import FOMA_WORKER_Q
-    FOMA_WORKER_Q.put({
-        'id': h.generate_salt(),
-        'func': 'compile_foma_script',
-        'args': {
-            'model_name': 'Phonology',
-            'model_id': phonology.id,
-            'script_dir_path': phonology_dir_path,
+    from old.lib.foma_worker import enqueue_job
+    job = enqueue_job(
+        'compile_phonology',
+        {
+            'phonology_id': phonology.id,
             'user_id': session['user'].id,
-            'verification_string': 'defined phonology: ',
-            'timeout': h.phonology_compile_timeout
-        }
-    })
-
-Cf. http://www.chrismoos.com/2009/03/04/pylons-worker-threads.
+            'timeout': h.phonology_compile_timeout,
+            'settings': settings
+        },
+        model_name='Phonology',
+        model_id=phonology.id)
 
-For an introduction to Python threading, see
-http://www.ibm.com/developerworks/aix/library/au-threadingpython/.
 """
 
+from hashlib import md5
+import json
 import logging
+import multiprocessing
+import os
 import queue
+import socket
 import threading
 from uuid import uuid4
 
@@ -56,6 +65,7 @@ import old.lib.constants as oldc
 import old.lib.helpers as h
 import old.models as old_models
 from old.models.morphologicalparser import Cache
+from old.lib.parser import Command, FLOOKUP_POOLS
 
 LOGGER = logging.getLogger(__name__)
 HANDLER = logging.FileHandler('fomaworker.log')
@@ -66,37 +76,314 @@ LOGGER.setLevel(logging.DEBUG)
 
 
 ################################################################################
-# WORKER THREAD & QUEUE
+# JOB QUEUE & DISPATCHER THREADS
 ################################################################################
 
 
-FOMA_WORKER_Q = queue.Queue(1)
+# Items are (-priority, sequence number, job id, job UUID, func, kwargs)
+# tuples.
+JOB_Q = queue.PriorityQueue()
+JOB_SEQUENCE = iter(range(1, 2**63))
+
+# Jobs are run in freshly spawned (not forked) processes: the web server
+# process is multithreaded and holds flookup coprocesses, locks, etc. that a
+# forked child must not inherit.
+MP_CONTEXT = multiprocessing.get_context('spawn')
+
+# job id -> child process, for the jobs run by this process's dispatchers.
+RUNNING = {}
+RUNNING_LOCK = threading.Lock()
+
+# Ids of the jobs that are in ``JOB_Q``.
+QUEUED = set()
+
+# Job arguments that are not part of a job's identity and are not stored in the
+# job table: the settings (which contain database credentials), the path to
+# the config file and the requesting user (who is the job's enterer).
+PRIVATE_JOB_ARGS = ('settings', 'config_path', 'user_id')
+
+
+def get_worker_id():
+    """Return the identifier of this process as recorded in ``Job.worker``.
+    This is computed on each call because web server processes may be forked
+    after this module is imported.
+    """
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def get_job_signature(func, model_name, model_id, args):
+    """Return a hash identifying a job, ignoring who requested it."""
+    args = {key: val for key, val in args.items()
+            if key not in PRIVATE_JOB_ARGS}
+    return md5(json.dumps([func, model_name, model_id, args],
+                          sort_keys=True).encode('utf8')).hexdigest()
+
+
+def put_job(job, func, args):
+    with RUNNING_LOCK:
+        QUEUED.add(job.id)
+    JOB_Q.put((-job.priority, next(JOB_SEQUENCE), job.id, job.UUID, func,
+               args))
+
+
+def enqueue_job(func, args, model_name=None, model_id=None, priority=0):
+    """Record a job to call ``func(**args)`` in a worker process and put it in
+    the queue. If an identical job is still pending in this process's queue,
+    return that job instead. ``args`` must contain the Pyramid settings (under
+    'settings') and may contain the id of the requesting user (under
+    'user_id').
+
+    :returns: the ``Job`` model.
+    """
+    settings = dict(args['settings'])
+    args = dict(args, settings=settings)
+    signature = get_job_signature(func, model_name, model_id, args)
+    dbsession = get_dbsession_from_settings(settings)()
+    try:
+        worker = get_worker_id()
+        with RUNNING_LOCK:
+            queued = list(QUEUED)
+        job = queued and dbsession.query(old_models.Job).filter(
+            old_models.Job.signature == signature).filter(
+                old_models.Job.status == 'pending').filter(
+                    old_models.Job.worker == worker).filter(
+                        old_models.Job.id.in_(queued)).first()
+        if job:
+            LOGGER.info('Job %s is identical to pending job %d.', func, job.id)
+            if priority > job.priority:
+                job.priority = priority
+                put_job(job, func, args)
+            dbsession.commit()
+            job.enterer  # Load the enterer before the job is detached.
+            return job
+        now = h.now()
+        job = old_models.Job(
+            UUID=str(uuid4()),
+            func=func,
+            model_name=model_name,
+            model_id=model_id,
+            signature=signature,
+            args=json.dumps({key: val for key, val in args.items()
+                             if key not in PRIVATE_JOB_ARGS}),
+            status='pending',
+            priority=priority,
+            progress=0.0,
+            worker=worker,
+            enterer_id=args.get('user_id'),
+            datetime_entered=now,
+            datetime_modified=now)
+        dbsession.add(job)
+        dbsession.commit()
+        put_job(job, func, args)
+        LOGGER.info('Enqueued job %d (%s).', job.id, func)
+        job.enterer  # Load the enterer before the job is detached.
+        return job
+    finally:
+        dbsession.close()
+
+
+def update_job(settings, job_id, **values):
+    """Set the attributes in ``values`` on the job with id ``job_id``.
+    Return the (detached) job, or ``None`` if there is no such job.
+    """
+    if not job_id:
+        return None
+    dbsession = get_dbsession_from_settings(settings)()
+    try:
+        job = dbsession.query(old_models.Job).get(job_id)
+        if job:
+            for key, val in values.items():
+                setattr(job, key, val)
+            if values:
+                job.datetime_modified = h.now()
+                dbsession.commit()
+                dbsession.refresh(job)
+            dbsession.expunge(job)
+        return job
+    finally:
+        dbsession.close()
+
+
+def report_progress(kwargs, progress, message=None):
+    """Called by the job functions below to record the progress (a float
+    between 0 and 1) of the job they are running, if any.
+    """
+    values = {'progress': progress}
+    if message:
+        values['message'] = message[:255]
+    try:
+        update_job(kwargs['settings'], kwargs.get('job_id'), **values)
+    except Exception as error:
+        LOGGER.warning('Unable to report job progress: %s %s',
+                       error.__class__.__name__, error)
+
+
+def run_job(func, kwargs):
+    """The target of the worker child processes."""
+    try:
+        LOGGER.debug('Worker process trying to call %s', func)
+        FLOOKUP_POOLS.configure(kwargs['settings'])
+        globals()[func](**kwargs)
+    except Exception as error:
+        LOGGER.warning('Unable to process in worker process: %s %s',
+                       error.__class__.__name__, error)
+        raise
+
+
+def cancel_job(settings, job_id):
+    """Cancel the job with id ``job_id``: mark it as cancelled and, if it is
+    running, kill its worker process (and that process's children).
+    :returns: the (detached) job, or ``None`` if there is no such job. Jobs
+        that have already finished are returned unchanged.
+    """
+    dbsession = get_dbsession_from_settings(settings)()
+    try:
+        job = dbsession.query(old_models.Job).get(job_id)
+        if not job or job.status in oldc.JOB_FINAL_STATUSES:
+            return job
+        was_running = job.status == 'running'
+        now = h.now()
+        job.status = 'cancelled'
+        job.message = 'Cancelled.'
+        job.datetime_finished = now
+        job.datetime_modified = now
+        dbsession.commit()
+        job.enterer  # Load the enterer before the job is detached.
+        with RUNNING_LOCK:
+            process = RUNNING.get(job_id)
+        if process is None and was_running and job.pid:
+            # The job is running in another web server process.
+            process = job.pid
+        if process is not None:
+            LOGGER.info('Killing process %s of cancelled job %d.',
+                        getattr(process, 'pid', process), job_id)
+            Command.kill_process(process)
+        return job
+    finally:
+        dbsession.close()
 
 
 class FomaWorkerThread(threading.Thread):
-    """Define the foma worker."""
+    """A job dispatcher: takes jobs from ``JOB_Q`` and runs each in a child
+    process, recording the outcome in the job table.
+    """
 
     def run(self):
         while True:
-            msg = FOMA_WORKER_Q.get()
+            _, _, job_id, job_uuid, func, kwargs = JOB_Q.get()
+            with RUNNING_LOCK:
+                QUEUED.discard(job_id)
             try:
-                LOGGER.debug('FomaWorkerThread trying to call %s',
-                             msg.get('func'))
-                globals()[msg.get('func')](**msg.get('args'))
+                self.run_job(job_id, job_uuid, func, kwargs)
             except Exception as error:
-                LOGGER.warning('Unable to process in worker thread: %s %s',
-                               error.__class__.__name__, error)
-            FOMA_WORKER_Q.task_done()
+                LOGGER.warning('Unable to process job %s in worker thread: %s'
+                               ' %s', job_id, error.__class__.__name__, error)
+            JOB_Q.task_done()
+
+    @staticmethod
+    def run_job(job_id, job_uuid, func, kwargs):
+        settings = kwargs['settings']
+        job = update_job(settings, job_id)
+        # The job may have been cancelled, deduplicated with a higher
+        # priority (hence queued twice) or deleted.
+        if not job or job.UUID != job_uuid or job.status != 'pending':
+            return
+        process = MP_CONTEXT.Process(
+            target=run_job, args=(func, dict(kwargs, job_id=job_id)),
+            daemon=True)
+        with RUNNING_LOCK:
+            process.start()
+            RUNNING[job_id] = process
+        job = update_job(settings, job_id)
+        if job and job.status == 'cancelled':
+            # Cancelled while we were starting it.
+            Command.kill_process(process)
+        else:
+            update_job(settings, job_id, status='running', pid=process.pid,
+                       datetime_started=h.now())
+        LOGGER.debug('FomaWorkerThread running %s as job %s in process %s',
+                     func, job_id, process.pid)
+        process.join()
+        with RUNNING_LOCK:
+            RUNNING.pop(job_id, None)
+        job = update_job(settings, job_id)
+        if not job or job.status == 'cancelled':
+            return
+        if process.exitcode == 0:
+            update_job(settings, job_id, status='succeeded', progress=1.0,
+                       datetime_finished=h.now())
+        else:
+            update_job(settings, job_id, status='failed',
+                       datetime_finished=h.now(),
+                       message=job.message or
+                       'Worker process exited with code %s.' % process.exitcode)
+
+
+WORKERS = []
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def fail_orphaned_jobs(settings):
+    """Mark as failed the pending and running jobs that were queued by web
+    server processes on this host that no longer exist (or by a previous
+    process with this process's pid). Such jobs would otherwise stay pending
+    (or running) forever, since job queues are held in memory.
+    """
+    hostname = socket.gethostname()
+    this_worker = get_worker_id()
+    dbsession = get_dbsession_from_settings(settings)()
+    try:
+        jobs = dbsession.query(old_models.Job).filter(
+            old_models.Job.status.in_(('pending', 'running'))).all()
+        now = h.now()
+        for job in jobs:
+            host, _, pid = (job.worker or '').rpartition(':')
+            if job.worker and (host != hostname or (
+                    job.worker != this_worker and process_exists(int(pid)))):
+                continue
+            LOGGER.info('Job %d was orphaned by process %s.', job.id,
+                        job.worker)
+            job.status = 'failed'
+            job.message = ('The server process that queued this job exited'
+                           ' before the job finished.')
+            job.datetime_finished = now
+            job.datetime_modified = now
+        dbsession.commit()
+    finally:
+        dbsession.close()
 
 
-def start_foma_worker():
-    """Called in ``main`` of :mod:`old.__init__.py`."""
-    foma_worker = FomaWorkerThread()
-    foma_worker.setDaemon(True)
-    foma_worker.start()
-    foma_worker2 = FomaWorkerThread()
-    foma_worker2.setDaemon(True)
-    foma_worker2.start()
+def start_foma_worker(settings=None):
+    """Called in ``main`` of :mod:`old.__init__.py`. Start dispatcher threads
+    until there are ``jobs.pool_size`` of them. When the first thread is
+    started, jobs orphaned by dead web server processes are marked as failed.
+    """
+    settings = settings or {}
+    try:
+        pool_size = int(settings.get('jobs.pool_size') or oldc.JOB_POOL_SIZE)
+    except ValueError:
+        pool_size = oldc.JOB_POOL_SIZE
+    if not WORKERS and 'sqlalchemy.url' in settings:
+        try:
+            fail_orphaned_jobs(settings)
+        except Exception as error:
+            # E.g., the job table has not been created yet.
+            LOGGER.warning('Unable to check for orphaned jobs: %s %s',
+                           error.__class__.__name__, error)
+    while len(WORKERS) < pool_size:
+        foma_worker = FomaWorkerThread()
+        foma_worker.daemon = True
+        foma_worker.start()
+        WORKERS.append(foma_worker)
 
 
 def get_dbsession_from_settings(settings):
@@ -124,6 +411,7 @@ def compile_phonology(**kwargs):
         dbsession = get_dbsession_from_settings(kwargs['settings'])()
         phonology = dbsession.query(
             old_models.Phonology).get(kwargs['phonology_id'])
+        report_progress(kwargs, 0.1, 'Compiling the phonology.')
         phonology.compile(kwargs['timeout'])
         phonology.datetime_modified = h.now()
         phonology.modifier_id = kwargs['user_id']
@@ -157,6 +445,7 @@ def generate_and_compile_morphology(**kwargs):
             LOGGER.error('Exception when calling `write` on morphology: %s %s',
                          error.__class__.__name__, error)
         if kwargs.get('compile', True):
+            report_progress(kwargs, 0.5, 'Compiling the morphology.')
             try:
                 morphology.compile(kwargs['timeout'])
             except Exception as error:
@@ -199,18 +488,21 @@ def generate_language_model(**kwargs):
             LOGGER.error('Exception when calling `write_corpus` on language'
                          ' model: %s %s', error.__class__.__name__, error)
             langmod.generate_message = 'Error writing the corpus file. %s' % error
+        report_progress(kwargs, 0.25, 'Writing the vocabulary file.')
         try:
             langmod.write_vocabulary()
         except Exception as error:
             LOGGER.error('Exception when calling `write_vocabulary` on language'
                          ' model: %s %s', error.__class__.__name__, error)
             langmod.generate_message = 'Error writing the vocabulary file. %s' % error
+        report_progress(kwargs, 0.3, 'Estimating the ARPA file.')
         try:
             langmod.write_arpa(kwargs['timeout'])
         except Exception as error:
             LOGGER.error('Exception when calling `write_arpa` on language'
                          ' model: %s %s', error.__class__.__name__, error)
             langmod.generate_message = 'Error writing the ARPA file. %s' % error
+        report_progress(kwargs, 0.8, 'Generating the LM trie.')
         try:
             langmod.generate_trie()
         except Exception as error:
@@ -279,6 +571,7 @@ def generate_and_compile_parser(**kwargs):
         parser.write()
         dbsession.commit()
         if kwargs.get('compile', True):
+            report_progress(kwargs, 0.3, 'Compiling the morphophonology.')
             parser.compile(kwargs['timeout'])
         parser.modifier_id = kwargs['user_id']
         parser.datetime_modified = h.now()
@@ -289,3 +582,39 @@ def generate_and_compile_parser(**kwargs):
     finally:
         dbsession.commit()
         dbsession.close()
+
+
+################################################################################
+# BULK FORM IMPORT
+################################################################################
+
+def import_forms(**kwargs):
+    """Import the forms of an NDJSON file uploaded via ``POST /forms/bulk`` and
+    delete the file.
+    :param str kwargs['file_name']: name of the file in the imports directory
+        of the OLD.
+    :param int kwargs['forms']: the number of forms in the file.
+    :param int kwargs['user_id']: id of the user importing the forms, who
+        becomes their enterer.
+    """
+    # Imported here because old.lib.formimport imports the views, which import
+    # this module.
+    # pylint: disable=import-outside-toplevel
+    from old.lib.formimport import FormImporter, FormImportError
+    settings = kwargs['settings']
+    path = os.path.join(h.get_old_directory_path('imports', settings),
+                        kwargs['file_name'])
+    dbsession = get_dbsession_from_settings(settings)()
+    try:
+        importer = FormImporter(
+            dbsession, settings, kwargs['user_id'],
+            lambda progress, message: report_progress(
+                kwargs, progress, message))
+        report_progress(kwargs, 1.0, importer.import_file(
+            path, kwargs.get('forms')))
+    except FormImportError as error:
+        update_job(settings, kwargs.get('job_id'), message=str(error)[:255])
+        raise
+    finally:
+        dbsession.close()
+        os.remove(path)
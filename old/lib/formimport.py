@@ -0,0 +1,373 @@
+"""Bulk form imports.
+
+``POST /forms/bulk`` saves its NDJSON request body (one form per line, in the
+format of ``POST /forms`` request bodies) to the imports directory of the OLD
+and enqueues an ``import_forms`` job (cf. :mod:`old.lib.foma_worker`), which
+runs a ``FormImporter`` on the file.
+
+Creating forms one at a time is slow mostly because each new lexical item is
+percolated to the forms containing it via ``REGEXP`` queries over the whole
+form table. The importer instead validates the forms in batches (against the
+cached inventories of the application settings) and inserts each batch with
+Core bulk inserts. Then it reads the morpheme break, gloss and category of
+every form once into a ``MorphemeIndex`` (cf. :mod:`old.views.forms`), from
+which it compiles the morphological analyses (``morpheme_break_ids``,
+``morpheme_gloss_ids``, ``syntactic_category_string`` and
+``break_gloss_category``) of the imported forms and of the existing forms that
+contain one of their morpheme breaks or glosses as a morpheme.
+
+An import is a single transaction: if any of its forms is invalid, none are
+imported.
+"""
+
+from itertools import islice
+import json
+import logging
+from types import SimpleNamespace
+from uuid import uuid4
+
+from formencode.validators import Invalid
+from sqlalchemy import bindparam
+from sqlalchemy.sql import func
+
+import old.lib.constants as oldc
+from old.lib.dbutils import DBUtils, eagerload_form
+import old.lib.helpers as h
+from old.lib.schemata import FormSchema
+from old.models import (
+    Form,
+    FormBackup,
+    Translation,
+    User
+)
+from old.models.form import FormFile, FormTag
+from old.models.searchtrigram import add_to_search_index
+from old.views.forms import (
+    MORPH_ATTRS,
+    MorphemeIndex,
+    _split,
+    get_break_gloss_category,
+    get_category_from_partial_match,
+    get_user_data,
+    morphemic_analysis_is_consistent
+)
+from old.views.resources import SchemaState
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FormImportError(Exception):
+    pass
+
+
+def compile_morphemic_analysis(morpheme_break, morpheme_gloss,
+                               morpheme_delimiters, index,
+                               bgc_delimiter=oldc.DEFAULT_DELIMITER):
+    """Return the values of the morphological analysis-related attributes (cf.
+    ``MORPH_ATTRS``) of a form with ``morpheme_break`` and ``morpheme_gloss``,
+    looking its morphemes up in the ``MorphemeIndex`` ``index``. The values
+    are those that ``Forms.compile_morphemic_analysis`` computes from the
+    database, including the four ``None`` values that it returns on error.
+    """
+    try:
+        return _compile_morphemic_analysis(
+            morpheme_break, morpheme_gloss, morpheme_delimiters, index,
+            bgc_delimiter)
+    except Exception as error:
+        LOGGER.debug('compile_morphemic_analysis raised an error (%s) on'
+                     ' "%s"/"%s".', error, morpheme_break, morpheme_gloss)
+        return None, None, None, None
+
+
+def _compile_morphemic_analysis(morpheme_break, morpheme_gloss,
+                                morpheme_delimiters, index, bgc_delimiter):
+    if [md for md in morpheme_delimiters if md]:
+        morpheme_splitter = '[%s]' % ''.join(
+            [h.esc_RE_meta_chars(d) for d in morpheme_delimiters])
+    else:
+        morpheme_splitter = ''
+    mb_words = morpheme_break.split()
+    mg_words = morpheme_gloss.split()
+    if not morphemic_analysis_is_consistent(
+            morpheme_delimiters=morpheme_delimiters,
+            morpheme_break=morpheme_break, morpheme_gloss=morpheme_gloss,
+            mb_words=mb_words, mg_words=mg_words,
+            morpheme_splitter=morpheme_splitter):
+        return json.dumps(None), json.dumps(None), None, None
+    morpheme_and_delimiter_splitter = '(%s)' % morpheme_splitter
+    morpheme_break_ids = []
+    morpheme_gloss_ids = []
+    syntactic_category_string = []
+    for i, mb_word in enumerate(mb_words):
+        mb_word_analysis = []
+        mg_word_analysis = []
+        mb_word_morphemes_list = _split(
+            morpheme_and_delimiter_splitter, mb_word)[::2]
+        mg_word_morphemes_list = _split(
+            morpheme_and_delimiter_splitter, mg_words[i])[::2]
+        sc_word_analysis = _split(morpheme_and_delimiter_splitter, mb_word)
+        for j, morpheme in enumerate(mb_word_morphemes_list):
+            gloss = mg_word_morphemes_list[j]
+            perfect_matches = index.get_perfect_matches(morpheme, gloss)
+            if perfect_matches:
+                mb_word_analysis.append(
+                    [(f.id, f.morpheme_gloss,
+                      getattr(f.syntactic_category, 'name', None))
+                     for f in perfect_matches])
+                mg_word_analysis.append(
+                    [(f.id, f.morpheme_break,
+                      getattr(f.syntactic_category, 'name', None))
+                     for f in perfect_matches])
+                sc_word_analysis[j * 2] = getattr(
+                    perfect_matches[0].syntactic_category, 'name',
+                    oldc.UNKNOWN_CATEGORY)
+            else:
+                morpheme_matches = index.get_partial_matches(
+                    morpheme=morpheme)
+                mb_word_analysis.append(
+                    [(f.id, f.morpheme_gloss,
+                      getattr(f.syntactic_category, 'name', None))
+                     for f in morpheme_matches])
+                gloss_matches = index.get_partial_matches(gloss=gloss)
+                mg_word_analysis.append(
+                    [(f.id, f.morpheme_break,
+                      getattr(f.syntactic_category, 'name', None))
+                     for f in gloss_matches])
+                sc_word_analysis[j * 2] = get_category_from_partial_match(
+                    morpheme_matches, gloss_matches)
+        morpheme_break_ids.append(mb_word_analysis)
+        morpheme_gloss_ids.append(mg_word_analysis)
+        syntactic_category_string.append(''.join(sc_word_analysis))
+    syntactic_category_string = ' '.join(syntactic_category_string)
+    break_gloss_category = get_break_gloss_category(
+        morpheme_delimiters, morpheme_break, morpheme_gloss,
+        syntactic_category_string, bgc_delimiter)
+    return (
+        json.dumps(morpheme_break_ids),
+        json.dumps(morpheme_gloss_ids),
+        syntactic_category_string,
+        break_gloss_category
+    )
+
+
+class FormImporter(object):
+    """Import the forms of an NDJSON file on behalf of the user with id
+    ``user_id``, who becomes their enterer. ``report`` is called with the
+    progress of the import (a float between 0 and 1) and a message.
+
+    The forms are validated against the application settings, inventories,
+    etc. as they are when the import starts.
+    """
+
+    def __init__(self, dbsession, settings, user_id, report=None):
+        self.dbsession = dbsession
+        self.settings = settings
+        self.db = DBUtils(dbsession, settings)
+        self.user = dbsession.query(User).get(user_id)
+        self.report = report or (lambda progress, message: None)
+        self.now = h.now()
+        # (id, morpheme_break, morpheme_gloss) triples of the imported forms.
+        self.forms = []
+        self.invalid = 0
+        self.errors = []
+
+    def import_file(self, path, count=None):
+        """Import the forms in the file at ``path``, which holds ``count``
+        forms (used only to report progress), and commit.
+        :returns: a message summarizing the import.
+        :raises FormImportError: if a form is invalid; nothing is imported.
+        """
+        done = 0
+        schema = FormSchema()
+        forms = _read_forms(path)
+        batch = list(islice(forms, oldc.BULK_IMPORT_BATCH_SIZE))
+        while batch:
+            user_datas = self._validate(schema, batch)
+            if not self.invalid:
+                self._insert(user_datas)
+            done += len(batch)
+            self._report(0.7 * done / max(count or 0, done),
+                         'Validated {} of {} forms.'.format(
+                             done, max(count or 0, done)))
+            batch = list(islice(forms, oldc.BULK_IMPORT_BATCH_SIZE))
+        if self.invalid:
+            self.dbsession.rollback()
+            raise FormImportError(
+                '{} of the {} forms are invalid so none were imported; {}'
+                .format(self.invalid, done, '; '.join(self.errors)))
+        self._report(0.7, 'Compiling the morphological analyses.')
+        updated = self._update_morpheme_references()
+        self.dbsession.commit()
+        LOGGER.info('Imported %d forms.', len(self.forms))
+        return ('Imported {} forms and updated the morphological analyses of'
+                ' {} other forms.'.format(len(self.forms), updated))
+
+    def _report(self, progress, message):
+        # SQLite locks the database from the first insert of the import to its
+        # commit, so the progress cannot be recorded in the meantime.
+        if not (self.forms and
+                h.get_RDBMS_name(self.settings) == 'sqlite'):
+            self.report(progress, message)
+
+    def _validate(self, schema, batch):
+        """Return the attribute values of the valid forms of ``batch``, a list
+        of (line number, JSON object) pairs, recording the errors of the
+        invalid ones.
+        """
+        user_datas = []
+        for line_number, values in batch:
+            state = SchemaState(
+                full_dict=values, db=self.db, logged_in_user=self.user)
+            try:
+                user_datas.append(get_user_data(
+                    schema.to_python(values, state)))
+            except Invalid as error:
+                self.invalid += 1
+                if len(self.errors) < oldc.BULK_IMPORT_MAX_ERRORS:
+                    self.errors.append('line {}: {}'.format(
+                        line_number, json.dumps(error.unpack_errors())))
+        return user_datas
+
+    def _insert(self, user_datas):
+        """Insert forms with the attribute values in ``user_datas``, their
+        translations, tags and files and index them for search.
+        """
+        if not user_datas:
+            return
+        rows = [self._get_row(user_data) for user_data in user_datas]
+        max_id = self.dbsession.query(func.max(Form.id)).scalar() or 0
+        self.dbsession.execute(Form.__table__.insert(), rows)
+        ids = dict(self.dbsession.query(Form.UUID, Form.id)
+                   .filter(Form.id > max_id)
+                   .filter(Form.UUID.in_([row['UUID'] for row in rows])))
+        translations = []
+        form_tags = []
+        form_files = []
+        for row, user_data in zip(rows, user_datas):
+            row['id'] = id_ = ids[row['UUID']]
+            self.forms.append(
+                (id_, row['morpheme_break'], row['morpheme_gloss']))
+            translations += [
+                {'form_id': id_,
+                 'transcription': translation.transcription,
+                 'grammaticality': translation.grammaticality,
+                 'datetime_modified': self.now}
+                for translation in user_data['translations']]
+            form_tags += [
+                {'form_id': id_, 'tag_id': tag.id,
+                 'datetime_modified': self.now}
+                for tag in user_data['tags']]
+            form_files += [
+                {'form_id': id_, 'file_id': file_.id,
+                 'datetime_modified': self.now}
+                for file_ in user_data['files']]
+        for table, table_rows in ((Translation.__table__, translations),
+                                  (FormTag.__table__, form_tags),
+                                  (FormFile.__table__, form_files)):
+            if table_rows:
+                self.dbsession.execute(table.insert(), table_rows)
+        add_to_search_index(self.dbsession, 'Form',
+                            [SimpleNamespace(**row) for row in rows])
+        add_to_search_index(
+            self.dbsession, 'Translation',
+            self.dbsession.query(Translation.id, Translation.transcription)
+            .filter(Translation.form_id.in_(list(ids.values()))))
+
+    def _get_row(self, user_data):
+        row = {key: user_data[key] for key in (
+            'transcription', 'phonetic_transcription',
+            'narrow_phonetic_transcription', 'morpheme_break',
+            'morpheme_gloss', 'comments', 'speaker_comments', 'syntax',
+            'semantics', 'grammaticality', 'status', 'date_elicited')}
+        for column, key in (('elicitationmethod_id', 'elicitation_method'),
+                            ('syntacticcategory_id', 'syntactic_category'),
+                            ('source_id', 'source'),
+                            ('elicitor_id', 'elicitor'),
+                            ('verifier_id', 'verifier'),
+                            ('speaker_id', 'speaker')):
+            row[column] = getattr(user_data[key], 'id', None)
+        row.update({
+            'UUID': str(uuid4()),
+            'enterer_id': self.user.id,
+            'modifier_id': self.user.id,
+            'datetime_entered': self.now,
+            'datetime_modified': self.now
+        })
+        return row
+
+    def _update_morpheme_references(self):
+        """Compile the morphological analyses of the imported forms and of the
+        existing forms that contain one of their morpheme breaks or glosses as
+        a morpheme. The latter are backed up before they are updated.
+        :returns: the number of existing forms whose analyses changed.
+        """
+        morpheme_delimiters = self.db.get_morpheme_delimiters()
+        index = MorphemeIndex(morpheme_delimiters)
+        new_ids = {id_ for id_, _, _ in self.forms}
+        new_breaks = {mb for _, mb, _ in self.forms if mb}
+        new_glosses = {mg for _, _, mg in self.forms if mg}
+        affected = []
+        for id_, morpheme_break, morpheme_gloss, category_name in (
+                MorphemeIndex.get_rows(self.dbsession)):
+            index.add(id_, morpheme_break, morpheme_gloss, category_name)
+            if id_ not in new_ids and (
+                    not new_breaks.isdisjoint(
+                        index.separator.split(morpheme_break or '')) or
+                    not new_glosses.isdisjoint(
+                        index.separator.split(morpheme_gloss or ''))):
+                affected.append(id_)
+        self._update_forms([
+            dict(zip(MORPH_ATTRS, compile_morphemic_analysis(
+                morpheme_break, morpheme_gloss, morpheme_delimiters, index)),
+                 id_=id_)
+            for id_, morpheme_break, morpheme_gloss in self.forms])
+        updated = 0
+        for done, ids in enumerate(
+                h.chunker(affected, oldc.BULK_IMPORT_BATCH_SIZE), 1):
+            rows = []
+            for form in eagerload_form(self.dbsession.query(Form)).filter(
+                    Form.id.in_(ids)):
+                values = compile_morphemic_analysis(
+                    form.morpheme_break, form.morpheme_gloss,
+                    morpheme_delimiters, index)
+                if values == tuple(getattr(form, attr) for attr in MORPH_ATTRS):
+                    continue
+                form_backup = FormBackup()
+                form_backup.vivify(form.get_dict())
+                self.dbsession.add(form_backup)
+                rows.append(dict(zip(MORPH_ATTRS, values), id_=form.id,
+                                 modifier_id=self.user.id,
+                                 datetime_modified=self.now))
+            self.dbsession.flush()
+            self._update_forms(rows)
+            updated += len(rows)
+            self._report(
+                0.7 + 0.3 * min(done * oldc.BULK_IMPORT_BATCH_SIZE,
+                                len(affected)) / len(affected),
+                'Updated the morphological analyses of {} forms.'.format(
+                    updated))
+        return updated
+
+    def _update_forms(self, rows):
+        """Update the forms with ids ``row['id_']`` with the other values of
+        the dicts in ``rows``, which all have the same keys.
+        """
+        if not rows:
+            return
+        table = Form.__table__
+        self.dbsession.execute(
+            table.update().where(table.c.id == bindparam('id_')).values(
+                **{key: bindparam(key) for key in rows[0] if key != 'id_'}),
+            rows)
+
+
+def _read_forms(path):
+    """Yield the (line number, JSON object) pairs of the NDJSON file at
+    ``path``, skipping blank lines.
+    """
+    with open(path, encoding='utf8') as filei:
+        for line_number, line in enumerate(filei, 1):
+            line = line.strip()
+            if line:
+                yield line_number, json.loads(line)
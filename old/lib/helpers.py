@@ -6,6 +6,7 @@ from .orthography import (
 )
 from .utils import (
     FakeForm,
+    JSONOLDEncoder,
     ZipFile,
     OLDSendEmailError,
     camel_case2lower_space,
@@ -29,6 +30,10 @@ from .utils import (
     foma_installed,
     foma_output_file2dict,
     generate_password,
+    get_csv_chunks,
+    get_gzipped_chunks,
+    get_json_array_chunks,
+    get_ndjson_chunks,
     generate_salt,
     get_HTML_from_contents,
     get_RDBMS_name,
@@ -70,6 +75,7 @@ from .utils import (
 __all__ = (
     'CustomSorter',
     'FakeForm',
+    'JSONOLDEncoder',
     'Orthography',
     'OrthographyCompatibilityError',
     'OrthographyTranslator',
@@ -97,6 +103,10 @@ __all__ = (
     'foma_output_file2dict',
     'generate_password',
     'generate_salt',
+    'get_csv_chunks',
+    'get_gzipped_chunks',
+    'get_json_array_chunks',
+    'get_ndjson_chunks',
     'get_HTML_from_contents',
     'get_RDBMS_name',
     'get_file_length',
@@ -97,6 +97,7 @@ def get_parser():
         parent_directory = SCRIPT_DIR,
         word_boundary_symbol = get_config()['parser']['word_boundary_symbol'],
         morpheme_delimiters = get_config()['parser']['morpheme_delimiters'],
+        lookup_backend = get_config()['parser'].get('lookup_backend', 'flookup'),
         phonology = get_phonology(),
         morphology = get_morphology(),
         language_model = get_language_model(),
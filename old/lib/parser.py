@@ -21,40 +21,56 @@ the MITLM program for language model creation and interaction. The classes are:
 
     - Command                        -- general-purpose functionality for
                                         interfacing to a command-line program
-    - FomaFST(Command)               -- interface to foma
+    - FlookupProcess                 -- a long-lived flookup coprocess
+    - FlookupPool                    -- a bounded pool of flookup coprocesses
+                                        for a single compiled foma binary
+    - FomaFST(Command)               -- interface to foma; lookups are
+                                        served by flookup or, optionally, by
+                                        the in-process transducers of
+                                        ``old.lib.foma_lookup``
     - Phonology(FomaFST)             -- phonology-specific interface to foma
     - Morphology(FomaFST)            -- morphology-specific interface to foma
-    - LanguageModel(Command)         -- interface to LM toolkits (only MITLM at
-                                        present)
+    - LanguageModel(Command)         -- interface to LM toolkits (MITLM or
+                                        the in-process estimator of
+                                        ``old.lib.simplelm.ngramlm``)
+    - RulesTrie                      -- a trie of a morphology's category
+                                        sequences, used in disambiguation
+    - DictionaryRegistry             -- process-wide, mtime-invalidated cache
+                                        of morphology dictionaries
     - MorphologicalParser(FomaFST)   -- basically a morphophonology foma FST
                                         that has a LM object
 
-The last four classes are used as superclasses for the relevant OLD
-(SQLAlchemy) model objects.  The model classes implement OLD-specific
-functionality that generates the scripts, compilers, log files, corpus files,
-vocabulary files, etc. of the FSTs and LMs.  The functionality implemented here
-should be reusable in OLD-external programs.
+The Phonology, Morphology, LanguageModel and MorphologicalParser classes are
+used as superclasses for the relevant OLD (SQLAlchemy) model objects.  The
+model classes implement OLD-specific functionality that generates the scripts,
+compilers, log files, corpus files, vocabulary files, etc. of the FSTs and
+LMs.  The functionality implemented here should be reusable in OLD-external
+programs.
 
 """
 
 import codecs
+from collections import OrderedDict
 import errno
-from itertools import product
+from functools import lru_cache
 import logging
 import os
 import pickle
+import queue
 import re
 from shutil import (
     copyfile,
     rmtree
 )
 from signal import SIGKILL
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, DEVNULL
 import threading
+import time
 import unicodedata
 from uuid import uuid4
 
 from old.lib import simplelm
+from old.lib.foma_lookup import TRANSDUCERS
 
 
 LOGGER = logging.getLogger(__name__)
@@ -368,26 +384,33 @@ class Command:
             stdout = ''
         return self.process.returncode, stdout
 
-    def kill_process(self, process):
-        """Kill ``process`` and all its child processes."""
-        pid = process.pid
+    @classmethod
+    def kill_process(cls, process):
+        """Kill ``process`` (a process object or a pid) and all its descendant
+        processes.
+        """
+        pid = getattr(process, 'pid', process)
         pids = [pid]
-        pids.extend(self.get_process_children(pid))
+        index = 0
+        while index < len(pids):
+            pids.extend(cls.get_process_children(pids[index]))
+            index += 1
         for pid in pids:
             try:
                 os.kill(pid, SIGKILL)
             except OSError:
                 pass
 
-    def get_process_children(self, pid):
+    @classmethod
+    def get_process_children(cls, pid):
         """Return list of pids of child processes of ``pid``.
 
         Note that Linux and Mac use different ps interfaces, hence the fork.
 
         """
         if os.uname()[0] == 'Darwin':
-            return self.get_process_children_mac(pid)
-        return self.get_process_children_linux(pid)
+            return cls.get_process_children_mac(pid)
+        return cls.get_process_children_linux(pid)
 
     @staticmethod
     def get_process_children_mac(pid):
@@ -441,6 +464,261 @@ class Command:
                 copyfile(path, os.path.join(dst, name))
 
 
+class FlookupProcess:
+    """A long-lived flookup coprocess that has loaded a single compiled foma
+    binary and that answers lookup requests over its stdin/stdout pipes.
+
+    flookup is run with the ``-b`` (unbuffered) flag so that the outputs for
+    each input line are flushed immediately. flookup terminates the outputs
+    for each input with an empty line, which is how we know when to stop
+    reading.
+    """
+
+    def __init__(self, binary_path, direction='up'):
+        self.binary_path = binary_path
+        self.direction = direction
+        cmd = ['flookup', '-b']
+        if direction != 'up':
+            cmd.append('-i')
+        cmd.append(binary_path)
+        self.process = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def lookup(self, input_):
+        """Return the list of tab-delimited input/output lines that flookup
+        writes for the (single line) string ``input_``.
+        """
+        self.process.stdin.write(input_.encode('utf8') + b'\n')
+        self.process.stdin.flush()
+        lines = []
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise EOFError('flookup terminated unexpectedly')
+            line = line.decode('utf8').rstrip('\r\n')
+            if not line:
+                return lines
+            lines.append(line)
+
+    def close(self):
+        """Terminate the flookup process."""
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except Exception:
+                pass
+        try:
+            self.process.kill()
+            self.process.wait()
+        except Exception:
+            pass
+
+
+class FlookupPool:
+    """A bounded pool of ``FlookupProcess`` instances for one compiled foma
+    binary and one direction of application.
+
+    At most ``size`` lookups run concurrently; further callers block until a
+    coprocess is returned to the pool. Coprocesses that have died are replaced
+    transparently. The pool remembers the modification time of the binary it
+    was created for so that ``FlookupPoolRegistry`` can recycle it when
+    ``FomaFST.compile`` writes a new binary. Coprocesses are started on demand
+    and ``reap`` terminates those that have been idle for too long.
+    """
+
+    def __init__(self, binary_path, direction='up', size=4):
+        self.binary_path = binary_path
+        self.direction = direction
+        self.size = size
+        self.mtime = os.path.getmtime(binary_path)
+        self.closed = False
+        self.last_used = time.monotonic()
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+
+    def lookup(self, inputs):
+        """Return a list of the tab-delimited input/output lines that flookup
+        writes for the strings in ``inputs``.
+        """
+        lines = []
+        with self._slots:
+            process = self._checkout()
+            try:
+                for input_ in inputs:
+                    for line in input_.split('\n'):
+                        process, outputs = self._lookup_one(process, line)
+                        lines.extend(outputs)
+            finally:
+                self._checkin(process)
+        return lines
+
+    def _lookup_one(self, process, input_):
+        """Look up ``input_`` using ``process``, replacing the coprocess once
+        if it turns out to have died. Return the (possibly new) process and the
+        output lines.
+        """
+        try:
+            return process, process.lookup(input_)
+        except (OSError, EOFError, ValueError):
+            LOGGER.warning('flookup coprocess for %s died; restarting it',
+                           self.binary_path)
+            process.close()
+            process = FlookupProcess(self.binary_path, self.direction)
+            return process, process.lookup(input_)
+
+    def _checkout(self):
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                return FlookupProcess(self.binary_path, self.direction)
+            if process.alive:
+                return process
+            process.close()
+
+    def _checkin(self, process):
+        process.last_used = self.last_used = time.monotonic()
+        if self.closed or not process.alive:
+            process.close()
+        else:
+            self._idle.put(process)
+
+    @property
+    def idle_count(self):
+        return self._idle.qsize()
+
+    def reap(self, idle_timeout):
+        """Terminate the idle coprocesses that have not been used in the last
+        ``idle_timeout`` seconds.
+        """
+        now = time.monotonic()
+        keep = []
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if process.alive and now - process.last_used < idle_timeout:
+                keep.append(process)
+            else:
+                process.close()
+        # Re-add the most recently used last, since the idle queue is LIFO.
+        for process in sorted(keep, key=lambda p: p.last_used):
+            self._idle.put(process)
+
+    def close(self):
+        """Terminate all idle coprocesses; busy ones are terminated when they
+        are checked back in.
+        """
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class FlookupPoolRegistry:
+    """Process-wide registry of ``FlookupPool`` instances, keyed by the path
+    to a compiled foma binary and the direction of application.
+
+    A pool is replaced with a fresh one whenever the modification time of its
+    binary changes, i.e., after a recompile. Since every coprocess holds a
+    whole FST in memory, resident coprocesses are bounded: each pool holds at
+    most ``size`` of them, at most ``max_pools`` pools are kept (the least
+    recently used pool is closed to make room for a new one) and a reaper
+    thread terminates coprocesses that have been idle for ``idle_timeout``
+    seconds. These are configured from the ``flookup.pool_size``,
+    ``flookup.max_pools`` and ``flookup.idle_timeout`` settings.
+    """
+
+    def __init__(self, size=4, max_pools=16, idle_timeout=300):
+        self.size = size
+        self.max_pools = max_pools
+        self.idle_timeout = idle_timeout
+        self.pools = OrderedDict()
+        self.lock = threading.Lock()
+        self._reaper = None
+
+    def configure(self, settings):
+        """Set the pool parameters from the Pyramid ``settings``."""
+        for attr, setting in (('size', 'flookup.pool_size'),
+                              ('max_pools', 'flookup.max_pools'),
+                              ('idle_timeout', 'flookup.idle_timeout')):
+            try:
+                setattr(self, attr, max(int(settings[setting]), 1))
+            except (KeyError, TypeError, ValueError):
+                pass
+
+    def get_pool(self, binary_path, direction='up'):
+        mtime = os.path.getmtime(binary_path)
+        key = (binary_path, direction)
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool and pool.mtime != mtime:
+                self.pools.pop(key).close()
+                pool = None
+            if pool:
+                self.pools.move_to_end(key)
+            else:
+                while len(self.pools) >= self.max_pools:
+                    _, lru_pool = self.pools.popitem(last=False)
+                    lru_pool.close()
+                pool = self.pools[key] = FlookupPool(
+                    binary_path, direction, self.size)
+                self._start_reaper()
+            return pool
+
+    def reap(self, idle_timeout=None):
+        """Terminate idle coprocesses that have not been used in the last
+        ``idle_timeout`` seconds and forget the pools that are left empty.
+        """
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        now = time.monotonic()
+        with self.lock:
+            for key, pool in list(self.pools.items()):
+                pool.reap(idle_timeout)
+                if (not pool.idle_count and
+                        now - pool.last_used >= idle_timeout):
+                    self.pools.pop(key).close()
+
+    def _start_reaper(self):
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap_forever, daemon=True)
+        self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 2, 1))
+            try:
+                self.reap()
+            except Exception as error:
+                LOGGER.warning('Unable to reap flookup coprocesses: %s %s',
+                               error.__class__.__name__, error)
+
+    def recycle(self, binary_path):
+        """Close and forget all pools serving the binary at ``binary_path``."""
+        with self.lock:
+            for key in [k for k in self.pools if k[0] == binary_path]:
+                self.pools.pop(key).close()
+
+    def clear(self):
+        """Close and forget all pools."""
+        with self.lock:
+            for pool in self.pools.values():
+                pool.close()
+            self.pools = OrderedDict()
+
+
+FLOOKUP_POOLS = FlookupPoolRegistry()
+
+
 class FomaFST(Command):
     """Represents a foma finite-state transducer.
 
@@ -501,6 +779,15 @@ class FomaFST(Command):
     def generate_salt():
         return str(uuid4().hex)
 
+    def remove_directory(self):
+        """Terminate any flookup coprocesses serving this FST's binary before
+        removing its directory.
+        """
+        binary_path = self.get_file_path('binary')
+        FLOOKUP_POOLS.recycle(binary_path)
+        TRANSDUCERS.recycle(binary_path)
+        super(FomaFST, self).remove_directory()
+
     def applyup(self, input_, boundaries=None):
         return self.apply('up', input_)
 
@@ -510,11 +797,17 @@ class FomaFST(Command):
     def apply(self, direction, input_, boundaries=None):
         """Foma-apply the inputs in the direction of ``direction``.
 
-        The method used is to write two files -- inputs.txt containing a newline-delimited
-        list thereof and apply.sh which is a shell script that invokes flookup on inputs.txt
-        to create outputs.txt -- and then parse the foma/flookup-generated outputs.txt file
-        and then delete the three temporary files.  A more efficient implementation might be
-        possible.
+        The inputs are written, one per line, to a long-lived flookup
+        coprocess drawn from the process-wide ``FLOOKUP_POOLS`` registry. The
+        pool for the compiled binary is recycled automatically when the binary
+        is recompiled, so this avoids re-spawning flookup and re-loading the
+        FST from disk on every call.
+
+        If ``self.lookup_backend`` is 'python', the compiled binary is instead
+        loaded into an in-process ``old.lib.foma_lookup.Transducer`` and the
+        lookups are performed without any IPC. Binaries that the in-process
+        transducer cannot handle (e.g., those with flag diacritics) fall back
+        to flookup.
 
         :param str direction: 'up' or 'down', i.e., the direction in which to use the transducer
         :param str/list input_: a transcription string or list thereof.
@@ -522,70 +815,42 @@ class FomaFST(Command):
             them from the outputs.
         :returns: a dictionary: ``{input1: [output1, output2, ...], input2: [...], ...}``
         """
-        LOGGER.debug('in apply')
         boundaries = boundaries if boundaries is not None else getattr(
             self, 'boundaries', False)
-        LOGGER.debug('in apply got boundaries: %s', boundaries)
         if isinstance(input_, str):
             inputs = [input_]
         elif isinstance(input_, (list, tuple)):
             inputs = list(input_)
         else:
-            LOGGER.debug('in apply; returning None, bad type %s', type(input))
+            LOGGER.debug('in apply; returning None, bad type %s', type(input_))
             return None
-        LOGGER.debug('in apply ensured input_ is a list')
-        directory = self.directory
-        LOGGER.debug('in apply got directory')
-        random_string = self.generate_salt()
-        LOGGER.debug('in apply generated salt')
-        inputs_file_path = os.path.join(
-            directory, 'inputs_%s.txt' % random_string)
-        outputs_file_path = os.path.join(
-            directory, 'outputs_%s.txt' % random_string)
-        apply_file_path = os.path.join(
-            directory, 'apply_%s.sh' % random_string)
+        if boundaries:
+            inputs = [input_.join([self.word_boundary_symbol,
+                                   self.word_boundary_symbol])
+                      for input_ in inputs]
         binary_path = self.get_file_path('binary')
-        LOGGER.debug('in apply got paths')
-        # Write the inputs to an '\n'-delimited file
-        with codecs.open(inputs_file_path, 'w', 'utf8') as f:
-            if boundaries:
-                f.write(
-                    '\n'.join(
-                        input_.join([self.word_boundary_symbol,
-                                     self.word_boundary_symbol])
-                        for input_ in inputs))
+        direction = 'up' if direction == 'up' else 'down'
+        try:
+            transducer = None
+            if self.lookup_backend == 'python':
+                transducer = TRANSDUCERS.get_transducer(binary_path)
+            if transducer:
+                lines = transducer.lookup(inputs, direction,
+                                          self.flookup_no_output)
             else:
-                f.write('\n'.join(inputs))
-        LOGGER.debug('in apply wrote inputs to disk')
-        # Write the shell script that pipes the input file into flookup
-        with codecs.open(apply_file_path, 'w', 'utf8') as f:
-            f.write('#!/bin/sh\ncat %s | flookup %s%s' % (
-                inputs_file_path,
-                {'up': '', 'down': '-i '}.get(direction, '-i '),
-                binary_path))
-        LOGGER.debug('in apply wrote apply shell script')
-        os.chmod(apply_file_path, 0o744)
-        LOGGER.debug('in apply made executable')
-        # Execute the shell script and pipe its output to the output file
-        with open(os.devnull, 'w') as devnull:
-            with codecs.open(outputs_file_path, 'w', 'utf8') as outfile:
-                p = Popen(apply_file_path, shell=False, stdout=outfile, stderr=devnull)
-        p.communicate()
-        LOGGER.debug('in apply called the apply shell script')
-        # Parse the output file, clean up and return the parsed outputs
-        with codecs.open(outputs_file_path, 'r', 'utf8') as f:
-            result = self.foma_output_file2dict(f, remove_word_boundaries=boundaries)
-        LOGGER.debug('in apply wrote result to output file')
-        os.remove(inputs_file_path)
-        os.remove(outputs_file_path)
-        os.remove(apply_file_path)
-        LOGGER.debug('in apply remove tmp files and about to return result')
-        return result
+                pool = FLOOKUP_POOLS.get_pool(binary_path, direction)
+                lines = pool.lookup(inputs)
+        except (OSError, EOFError) as error:
+            LOGGER.warning('Unable to apply %s %s: %s %s', self.object_type,
+                           direction, error.__class__.__name__, error)
+            return {}
+        return self.foma_output_file2dict(
+            lines, remove_word_boundaries=boundaries)
 
     def foma_output_file2dict(self, file_, remove_word_boundaries=True):
-        """Return the output file of a flookup apply request into a dictionary.
-        :param file file_: utf8-encoded file object with tab-delimited i/o
-            pairs.
+        """Return the output of a flookup apply request as a dictionary.
+        :param iterable file_: utf8-encoded file object (or any other iterable
+            of lines) with tab-delimited i/o pairs.
         :param bool remove_word_boundaries: toggles whether word boundaries are
             removed in the output
         :returns: dictionary of the form ``{i1: [01, 02, ...], i2: [...],
@@ -629,6 +894,9 @@ class FomaFST(Command):
     # This is the string that flookup returns when an input has no output.
     flookup_no_output = '+?'
 
+    # 'flookup' or 'python'; see ``apply``.
+    lookup_backend = 'flookup'
+
     default_word_boundary_symbol = '#'
 
     foma_reserved_symbols_patt = re.compile('[%s]' % ''.join(foma_reserved_symbols))
@@ -703,6 +971,8 @@ class FomaFST(Command):
         if self.compile_succeeded:
             LOGGER.debug('in compile compile succeeded')
             os.chmod(binary_path, 0o744)
+            FLOOKUP_POOLS.recycle(binary_path)
+            TRANSDUCERS.recycle(binary_path)
         else:
             LOGGER.debug('in compile compile failed')
             try:
@@ -858,23 +1128,113 @@ class MorphologyFST(FomaFST, Parse):
         self._file_type2extension.update({
             'lexicon': '.pickle',
             'dictionary': '_dictionary.pickle',
+            'rules_script': '_rules.script',
         })
         return self._file_type2extension
 
+    def remove_directory(self):
+        """Evict this morphology's dictionary from ``DICTIONARIES`` before
+        removing its directory.
+        """
+        DICTIONARIES.recycle(self.get_file_path('dictionary'))
+        super(MorphologyFST, self).remove_directory()
+
+    @property
+    def fragments_directory(self):
+        """Return the path to the directory of the morphology's lexicon
+        fragments, i.e., the per-category lexica of a regex morphology, each
+        written to a foma script named by the MD5 hash of its content and
+        compiled to a binary with the same name.
+        """
+        return os.path.join(self.directory, 'lexicon_fragments')
+
+    def get_fragment_path(self, fragment_hash, binary=False):
+        """Return the path to the script (or binary) of a lexicon fragment."""
+        return os.path.join(self.fragments_directory, '%s%s' % (
+            fragment_hash, '.foma' if binary else '.script'))
+
+    def prune_fragments(self, fragment_hashes):
+        """Remove the files of the lexicon fragments whose hashes are not in
+        ``fragment_hashes``.
+        """
+        if not os.path.isdir(self.fragments_directory):
+            return
+        for file_name in os.listdir(self.fragments_directory):
+            if file_name.split('.', 1)[0] not in fragment_hashes:
+                try:
+                    os.remove(os.path.join(self.fragments_directory, file_name))
+                except OSError:
+                    pass
+
+    def compile_fragments(self, timeout=30*60):
+        """Compile each lexicon fragment script that has no binary yet.
+
+        Since fragments are named by the hash of their content, a fragment
+        whose binary exists needs no recompilation: after a change to the
+        lexicon corpus only the lexica of the affected categories are
+        recompiled.
+
+        :param float/int timeout: how long to wait for all of the fragments
+            to compile.
+        :returns: ``True`` if every fragment has a binary, else ``False``.
+        """
+        if not os.path.isdir(self.fragments_directory):
+            return True
+        deadline = time.time() + timeout
+        for file_name in sorted(os.listdir(self.fragments_directory)):
+            fragment_hash, extension = os.path.splitext(file_name)
+            if extension != '.script':
+                continue
+            binary_path = self.get_fragment_path(fragment_hash, binary=True)
+            if os.path.isfile(binary_path):
+                continue
+            tmp_path = '%s.tmp' % binary_path
+            returncode, _ = self.run(
+                ['foma', '-e', 'source %s' % self.get_fragment_path(
+                    fragment_hash),
+                 '-e', 'save stack %s' % tmp_path, '-e', 'quit'],
+                max(deadline - time.time(), 0))
+            if returncode != 0 or not os.path.isfile(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                return False
+            os.replace(tmp_path, binary_path)
+        return True
+
+    def compile(self, timeout=30*60, verification_string=None):
+        """Compile any new lexicon fragments and then the morphology itself,
+        whose compiler loads the fragment binaries.
+        """
+        start = time.time()
+        if not self.compile_fragments(timeout):
+            self.compile_succeeded = False
+            self.compile_message = (
+                'Compilation of a lexicon fragment of the morphology failed.')
+            try:
+                os.remove(self.get_file_path('binary'))
+            except OSError:
+                pass
+            self.compile_attempt = str(uuid4())
+            return
+        super(MorphologyFST, self).compile(
+            max(timeout - (time.time() - start), 0), verification_string)
+
 
 class LanguageModel(Command, Parse):
     """Represents ngram language model objects.
     This class assumes that the elements of the model are morphemes, not words.
     Basically an interface to an LM toolkit that is mediated by Python
-    subprocess control.
-    Primary read methods are ``get_probabilities`` and ``get_probability_one``.
+    subprocess control or, for the ``simplelm`` toolkit, to the in-process
+    estimator of ``simplelm.ngramlm``.
+    Primary read methods are ``get_probabilities``, ``get_probability_one``
+    and ``get_probability_many``.
     Primary write methods are ``write_arpa`` and ``generate_trie``, which
     should be called in that order and which assume appropriate values for
     ``self.n`` and ``self.smoothing`` as well as a corpus (and possibly a
     vocabulary) file written at ``self.get_file_path('corpus')`` (and at
     ``self.get_file_path('vocabulary')``).
-    .. note::
-        At present, only support for the MITLM toolkit is implemented.
     .. note::
         The second superclass ``Parse`` provides the ``morpheme_only_splitter`` property
     """
@@ -894,6 +1254,10 @@ class LanguageModel(Command, Parse):
                 # cf. http://code.google.com/p/mitlm/wiki/Tutorial
                 'ML', 'FixKN', 'FixModKN', 'FixKNn', 'KN', 'ModKN', 'KNn'],
             'verification_string_getter': lambda x: 'Saving LM to %s' % x
+        },
+        'simplelm': {
+            'executable': None,
+            'smoothing_algorithms': list(simplelm.SMOOTHING_ALGORITHMS),
         }
     }
 
@@ -909,6 +1273,13 @@ class LanguageModel(Command, Parse):
     def executable(self):
         return self.toolkits[self.toolkit]['executable']
 
+    def remove_directory(self):
+        """Unmap this LM's trie before removing its directory so that the
+        disk space of the trie file is freed.
+        """
+        simplelm.LM_TRIES.recycle(self.get_file_path('trie'))
+        super(LanguageModel, self).remove_directory()
+
     @property
     def file_type2extension(self):
         try:
@@ -918,7 +1289,7 @@ class LanguageModel(Command, Parse):
             self._file_type2extension.update({
                 'corpus': '.txt',
                 'arpa': '.lm',
-                'trie': '.pickle',
+                'trie': '.lmtrie',
                 'vocabulary': '.vocab'
             })
             return self._file_type2extension
@@ -945,18 +1316,20 @@ class LanguageModel(Command, Parse):
              [self.start_symbol] + splitter.split(morpheme_sequence) +
              [self.end_symbol])
             for morpheme_sequence in morpheme_sequences]
-        trie = self.trie
-        return {morpheme_sequence:
-                self.get_probability_one(morpheme_sequence_list, trie)
-                for morpheme_sequence, morpheme_sequence_list in
-                morpheme_sequences}
+        probabilities = self.get_probability_many(
+            [morpheme_sequence_list for _, morpheme_sequence_list in
+             morpheme_sequences])
+        return {morpheme_sequence: probability
+                for (morpheme_sequence, _), probability in
+                zip(morpheme_sequences, probabilities)}
 
     def get_probability_one(self, morpheme_sequence_list, trie=None):
         """Return the log probability of the input list of morphemes.
 
         :param list morpheme_sequence_list: a list of strings/unicode obejcts, each
             representing a morpheme.
-        :param instance trie: a simplelm.LMTree instance encoding the LM.
+        :param instance trie: a simplelm.CompactLMTree instance encoding the
+            LM.
         :returns: the log prob of the morpheme sequence.
 
         """
@@ -964,6 +1337,23 @@ class LanguageModel(Command, Parse):
             trie = self.trie
         return simplelm.compute_sentence_prob(trie, morpheme_sequence_list)
 
+    def get_probability_many(self, morpheme_sequence_lists, trie=None):
+        """Return the log probabilities of the input lists of morphemes.
+
+        This is equivalent to calling ``get_probability_one`` on each list,
+        except that the n-grams of prefixes shared by several lists are scored
+        only once.
+
+        :param list morpheme_sequence_lists: a list of lists of strings, each
+            representing a morpheme.
+        :param instance trie: a simplelm.CompactLMTree instance encoding the
+            LM.
+        :returns: a list of the log probs of the morpheme sequences, in order.
+        """
+        if not trie:
+            trie = self.trie
+        return trie.compute_sentence_probs(morpheme_sequence_lists)
+
     def write_arpa(self, timeout):
         """Write ARPA-formatted LM file to disk.
 
@@ -977,7 +1367,9 @@ class LanguageModel(Command, Parse):
             been written.
 
         """
-
+        if self.toolkit == 'simplelm':
+            self.estimate_lm().write_arpa(self.get_file_path('arpa'))
+            return
         verification_string = self.verification_string
         arpa_path = self.get_file_path('arpa')
         arpa_mod_time = self.get_modification_time(arpa_path)
@@ -1006,6 +1398,21 @@ class LanguageModel(Command, Parse):
                 cmd += ['-v', self.get_file_path('vocabulary')]
         return cmd
 
+    def estimate_lm(self, corpus_path=None):
+        """Estimate the LM of the corpus file at ``corpus_path`` (by default,
+        the LM's corpus) in process, using ``simplelm.ngramlm``, and return it
+        as a ``simplelm.NGramLM``. The LM of the LM's own corpus is kept so that
+        ``generate_trie`` can build the trie from it directly. The vocabulary
+        file is not used: words absent from the corpus get no probability
+        mass and score like unknown words.
+        """
+        lm = simplelm.estimate_file(
+            corpus_path or self.get_file_path('corpus'), self.order,
+            self.smoothing or 'ModKN', self.start_symbol, self.end_symbol)
+        if corpus_path is None:
+            self._estimated_lm = lm
+        return lm
+
     @property
     def vocabulary(self):
         """Return ``True`` if we have a vocabulary file."""
@@ -1015,32 +1422,110 @@ class LanguageModel(Command, Parse):
 
     def generate_trie(self):
         """Load the contents of an ARPA-formatted LM file into a
-        ``simplelm.LMTree`` instance and pickle it.
+        ``simplelm.CompactLMTree`` instance and save it.
         :returns: None; if successful, ``self.get_file_path('trie')`` points to
-            a pickled ``simplelm.LMTree`` instance.
+            a saved ``simplelm.CompactLMTree`` instance.
         """
-        self._trie = simplelm.load_arpa(self.get_file_path('arpa'), 'utf8')
-        with open(self.get_file_path('trie'), 'wb') as fileo:
-            pickle.dump(self._trie, fileo)
+        lm = getattr(self, '_estimated_lm', None)
+        if lm is None:
+            trie = simplelm.CompactLMTree.from_arpa(
+                self.get_file_path('arpa'), 'utf8')
+        else:
+            trie = lm.to_trie()
+            self._estimated_lm = None
+        trie_path = self.get_file_path('trie')
+        trie.save(trie_path)
+        # Remove the pickled ``LMTree`` that earlier versions saved instead.
+        try:
+            os.remove('%s.pickle' % os.path.splitext(trie_path)[0])
+        except OSError:
+            pass
 
     @property
     def trie(self):
-        """Return the ``simplelm.LMTree`` instance representing a trie
+        """Return the ``simplelm.CompactLMTree`` instance representing a trie
         interface to the LM if one is available or can be generated.
+
+        The trie file is memory-mapped and shared via the process-wide
+        ``simplelm.LM_TRIES`` registry, which re-maps it if it has been
+        rewritten (e.g., by ``generate_trie``) since it was last mapped.
         """
-        if isinstance(getattr(self, '_trie', None), simplelm.LMTree):
-            return self._trie
-        else:
+        trie_path = self.get_file_path('trie')
+        try:
+            return simplelm.LM_TRIES.get_trie(trie_path)
+        except (FileNotFoundError, ValueError):
             try:
-                with open(self.get_file_path('trie'), 'rb') as filei:
-                    self._trie = pickle.load(filei)
-                return self._trie
-            except (FileNotFoundError, pickle.UnpicklingError):
-                try:
-                    self.generate_trie()
-                    return self._trie
-                except Exception:
-                    return None
+                self.generate_trie()
+                return simplelm.LM_TRIES.get_trie(trie_path)
+            except Exception:
+                return None
+
+
+class RulesTrie:
+    """A character trie of the category sequences (e.g., 'N-Phi') in a
+    morphology's ``rules_generated`` value. Disambiguation walks it one
+    category or delimiter at a time so that a partial disambiguation can be
+    abandoned as soon as no rule begins with its category sequence.
+    """
+
+    def __init__(self, rules):
+        self.root = {}
+        for rule in rules:
+            node = self.root
+            for char in rule:
+                node = node.setdefault(char, {})
+            node[None] = True
+
+    @classmethod
+    @lru_cache(maxsize=64)
+    def get(cls, rules_generated):
+        """Return the (cached) trie for a space-delimited string of rules."""
+        return cls(rules_generated.split())
+
+    @staticmethod
+    def walk(node, string):
+        """Return the node reached from ``node`` by reading ``string`` or
+        ``None`` if no rule continues that way.
+        """
+        for char in string:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def is_final(node):
+        return None in node
+
+
+class DictionaryRegistry:
+    """Process-wide registry of unpickled morphology dictionaries (mappings
+    from morpheme forms to lists of (gloss, category) pairs) keyed by the path
+    to the pickle file. A dictionary is reloaded when the modification time of
+    its file changes.
+    """
+
+    def __init__(self):
+        self.dictionaries = {}
+        self.lock = threading.Lock()
+
+    def get_dictionary(self, path):
+        mtime = os.path.getmtime(path)
+        with self.lock:
+            cached_mtime, dictionary = self.dictionaries.get(path, (None, None))
+            if cached_mtime == mtime:
+                return dictionary
+            with open(path, 'rb') as filei:
+                dictionary = pickle.load(filei)
+            self.dictionaries[path] = (mtime, dictionary)
+            return dictionary
+
+    def recycle(self, path):
+        with self.lock:
+            self.dictionaries.pop(path, None)
+
+
+DICTIONARIES = DictionaryRegistry()
 
 
 class Cache:
@@ -1055,6 +1540,7 @@ class Cache:
     - ``__setitem__(k, v)``
     - ``__getitem__(k)``
     - ``get(k, default)``
+    - ``prefetch(keys)``
     - ``persist()``
     """
 
@@ -1085,6 +1571,9 @@ class Cache:
     def get(self, k, default=None):
         return self._store.get(k, default)
 
+    def prefetch(self, keys):
+        """All of the cache is in memory already."""
+
     def update(self, dict_, **kwargs):
         old_keys = self._store.keys()
         self._store.update(dict_, **kwargs)
@@ -1151,6 +1640,18 @@ class MorphologicalParser(FomaFST, Parse):
         return 'defined %s: ' % self.object_type2file_name.get(
             self.object_type, self.object_type)
 
+    def remove_directory(self):
+        """Also unmap the trie of the parser's copy of its LM and evict the
+        dictionary of its copy of its morphology; both live in the parser's
+        directory.
+        """
+        if self.my_language_model:
+            simplelm.LM_TRIES.recycle(
+                self.my_language_model.get_file_path('trie'))
+        if self.my_morphology:
+            DICTIONARIES.recycle(self.my_morphology.get_file_path('dictionary'))
+        super(MorphologicalParser, self).remove_directory()
+
     def pretty_parse(self, input_,):
         """A convenience interface to the ``parse`` method which returns
         triplet list representations of parse.
@@ -1177,6 +1678,7 @@ class MorphologicalParser(FomaFST, Parse):
         parsed = {}
         unparsed = []
         LOGGER.debug('in parse set vars')
+        self.cache.prefetch(transcriptions)
         for transcription in transcriptions:
             LOGGER.debug('in parse triaging %s', transcription)
             cached_parse, cached_candidates = self.cache.get(transcription, (False, False))
@@ -1205,6 +1707,45 @@ class MorphologicalParser(FomaFST, Parse):
         LOGGER.debug('in parse returning parsed')
         return parsed
 
+    def parse_stream(self, transcriptions, batch_size=1000, max_candidates=0):
+        """Parse the transcriptions yielded by an iterable in batches.
+
+        Each unique transcription is parsed once: the unique transcriptions
+        are collected into batches of at most ``batch_size`` and each batch is
+        passed to ``parse`` (and thereby to the cache) as a whole. The results
+        of a batch are yielded before the next batch is collected, so the
+        input may be arbitrarily long.
+
+        :param iterable transcriptions: unicode strings representing
+            transcriptions of words.
+        :param int batch_size: max number of transcriptions parsed at once.
+        :param int max_candidates: max number of scored candidates to return.
+        :yields: (transcription, parse, candidates) 3-tuples, where candidates
+            is a list of (candidate, log prob) 2-tuples, most probable first.
+        """
+        seen = set()
+        batch = []
+        for transcription in transcriptions:
+            if transcription in seen:
+                continue
+            seen.add(transcription)
+            batch.append(transcription)
+            if len(batch) >= batch_size:
+                yield from self._parse_batch(batch, max_candidates)
+                batch = []
+        if batch:
+            yield from self._parse_batch(batch, max_candidates)
+
+    def _parse_batch(self, batch, max_candidates):
+        parsed = self.parse(batch)
+        for transcription in batch:
+            parse, candidates = parsed[transcription]
+            if max_candidates:
+                candidates = self.score_candidates(candidates[:max_candidates])
+            else:
+                candidates = []
+            yield transcription, parse, candidates
+
     def get_parse_object(self, parse_string):
         """Return a ``Parse`` instance representation of the parse string that is aware
         of the delimiters of the parser that generated the parse string.
@@ -1226,21 +1767,33 @@ class MorphologicalParser(FomaFST, Parse):
         """
         if not candidates:
             return None, []
-        temp = []
+        sorted_candidates = [
+            candidate for candidate, _ in self.score_candidates(candidates)]
+        return sorted_candidates[0], sorted_candidates
+
+    def score_candidates(self, candidates):
+        """Return the candidate parses paired with their log probabilities
+        according to ``self.my_language_model``.
+
+        :param list candidates: list of unicode strings representing
+            morphological parses, cf. ``get_most_probable``.
+        :returns: list of (candidate, log prob) 2-tuples, most probable first.
+        """
+        if not candidates:
+            return []
+        language_model = self.my_language_model
+        rare_delimiter = self.my_morphology.rare_delimiter
+        lm_inputs = []
         for candidate in candidates:
             lm_input = self.morpheme_splitter(candidate)[::2]
-            if self.my_language_model.categorial:
-                lm_input = [morpheme.split(self.my_morphology.rare_delimiter)[2]
+            if language_model.categorial:
+                lm_input = [morpheme.split(rare_delimiter)[2]
                             for morpheme in lm_input]
-            lm_input = ([self.my_language_model.start_symbol] + lm_input +
-                        [self.my_language_model.end_symbol])
-            temp.append(
-                (candidate,
-                 self.my_language_model.get_probability_one(lm_input)))
-        #return sorted(temp, key=lambda x: x[1])[-1][0]
-        sorted_candidates = [
-            c[0] for c in sorted(temp, key=lambda x: x[1], reverse=True)]
-        return sorted_candidates[0], sorted_candidates
+            lm_inputs.append([language_model.start_symbol] + lm_input +
+                             [language_model.end_symbol])
+        temp = list(zip(candidates,
+                        language_model.get_probability_many(lm_inputs)))
+        return sorted(temp, key=lambda x: x[1], reverse=True)
 
     def get_candidates(self, transcriptions):
         """Returns the morphophonologically valid parses of the input
@@ -1258,7 +1811,12 @@ class MorphologicalParser(FomaFST, Parse):
         LOGGER.debug('in get_candidates returning candidates')
         return candidates
 
-    def disambiguate(self, candidates):
+    # If set to a positive integer, ``disambiguate`` keeps only this many of
+    # the most probable (according to the LM) partial disambiguations of a
+    # candidate after each morpheme.
+    disambiguation_beam_width = None
+
+    def disambiguate(self, candidates, beam_width=None):
         """Return parse candidates with rich representations, i.e.,
         disambiguated.
         Note that this is only necessary when
@@ -1267,80 +1825,91 @@ class MorphologicalParser(FomaFST, Parse):
             strings representing morphological parses.  Since they are being
             disambiguated, we should expect these lists to be morpheme forms
             delimited by the language's delimiters.
+        :param int beam_width: if truthy, prune the partial disambiguations of
+            each candidate to the ``beam_width`` most probable after each
+            morpheme; defaults to ``self.disambiguation_beam_width``.
         :returns: a dict of the same form as the input where the values are
             lists of richly represented morphological parses, i.e., in f|g|c
             format.
         This converts something like {'chiens': 'chien-s'} to
         {'chiens': 'chien|dog|N-s|PL|Phi'}.
+
+        The morphology's dictionary is held in memory by ``DICTIONARIES`` and
+        its rules are compiled into a ``RulesTrie``, so that readings are
+        added one morpheme at a time and any partial disambiguation whose
+        category sequence is not a prefix of some rule is discarded at once.
         """
         LOGGER.debug('in disambiguate:')
-        def get_category(morpheme):
-            if isinstance(morpheme, list):
-                return morpheme[2]
-            return morpheme
-        LOGGER.debug('in disambiguate 2:')
-        def get_morpheme(morpheme):
-            if isinstance(morpheme, list):
-                return self.my_morphology.rare_delimiter.join(morpheme)
-            return morpheme
-        LOGGER.debug('in disambiguate 3:')
-        LOGGER.debug('self.my_morphology: %s', self.my_morphology)
-        LOGGER.debug('self.morphology_rules_generated: %s',
-                     self.morphology_rules_generated)
-        LOGGER.debug('self.my_morphology.rules_generated: %s',
-                     self.my_morphology.rules_generated)
-        rules = self.my_morphology.rules_generated.split()
-        LOGGER.debug(
-            'in disambiguate: called split on my_morphology.rules_generated'
-            ' %s', self.my_morphology.rules_generated)
+        if beam_width is None:
+            beam_width = self.disambiguation_beam_width
+        rules = RulesTrie.get(self.my_morphology.rules_generated or '')
         dictionary_path = self.my_morphology.get_file_path('dictionary')
-        LOGGER.debug('in disambiguate: got dictionary path')
         try:
-            with open(dictionary_path, 'rb') as filei:
-                dictionary = pickle.load(filei)
-            LOGGER.debug('in disambiguate: pickle-loaded dictionary')
-            result = {}
-            for transcription, candidate_list in candidates.items():
-                LOGGER.debug(
-                    'in disambiguate: working on transcription %s and'
-                    ' candidates', transcription)
-                new_candidates = set()
-                for candidate in candidate_list:
-                    LOGGER.debug(
-                        'in disambiguate: working on candidate'
-                        ' %s', candidate)
-                    temp = []
-                    morphemes = self.morpheme_splitter(candidate)
-                    for index, morpheme in enumerate(morphemes):
-                        LOGGER.debug(
-                            'in disambiguate: looking at morpheme'
-                            ' %s', morpheme)
-                        if index % 2 == 0:
-                            homographs = [[morpheme, gloss, category]
-                                          for gloss, category in
-                                          dictionary[morpheme]]
-                            temp.append(homographs)
-                        else:
-                            temp.append(morpheme) # it's really a delimiter
-                    for candidate2 in product(*temp):
-                        LOGGER.debug(
-                            'in disambiguate: looking at "candidate"'
-                            ' %s', candidate2)
-                        # Only add a disambiguated candidate if its category
-                        # sequence accords with the morphology's rules
-                        if ''.join(get_category(x) for x in candidate2) in rules:
-                            new_candidates.add(
-                                ''.join(get_morpheme(x) for x in candidate2))
-                result[transcription] = list(new_candidates)
-            LOGGER.debug('in disambiguate: done: returning result.')
-            return result
+            dictionary = DICTIONARIES.get_dictionary(dictionary_path)
         except Exception as error:
-            LOGGER.debug(
-                'in disambiguate: error: %s', error.__class__.__name__)
             LOGGER.warning(
-                'some kind of exception occured in morphologicalparsers.py'
-                ' disambiguate_candidates: %s', error)
+                'Unable to load the morphology dictionary at %s for'
+                ' disambiguation: %s %s', dictionary_path,
+                error.__class__.__name__, error)
             return dict((k, []) for k in candidates)
+        result = {}
+        for transcription, candidate_list in candidates.items():
+            new_candidates = []
+            seen = set()
+            for candidate in candidate_list:
+                for disambiguated in self.disambiguate_candidate(
+                        candidate, dictionary, rules, beam_width):
+                    if disambiguated not in seen:
+                        seen.add(disambiguated)
+                        new_candidates.append(disambiguated)
+            result[transcription] = new_candidates
+        LOGGER.debug('in disambiguate: done: returning result.')
+        return result
+
+    def disambiguate_candidate(self, candidate, dictionary, rules,
+                               beam_width=None):
+        """Return the disambiguations of the impoverished parse ``candidate``
+        whose category sequences are in ``rules``, a ``RulesTrie``.
+        """
+        rare_delimiter = self.my_morphology.rare_delimiter
+        language_model = self.my_language_model
+        categorial = getattr(language_model, 'categorial', False)
+        # Each path is (rules trie node, parse parts, LM input).
+        paths = [(rules.root, [], [])]
+        for index, morpheme in enumerate(self.morpheme_splitter(candidate)):
+            new_paths = []
+            if index % 2 == 0:
+                readings = dictionary.get(morpheme, ())
+                for node, parts, lm_input in paths:
+                    for gloss, category in readings:
+                        next_node = rules.walk(node, category)
+                        if next_node is not None:
+                            rich_morpheme = rare_delimiter.join(
+                                [morpheme, gloss, category])
+                            new_paths.append((
+                                next_node,
+                                parts + [rich_morpheme],
+                                lm_input + [category if categorial
+                                            else rich_morpheme]))
+                if beam_width and len(new_paths) > beam_width:
+                    probabilities = language_model.get_probability_many(
+                        [[language_model.start_symbol] + lm_input
+                         for _, _, lm_input in new_paths])
+                    ranked = sorted(zip(probabilities, range(len(new_paths))),
+                                    key=lambda x: x[0], reverse=True)
+                    new_paths = [new_paths[index_] for _, index_ in
+                                 sorted(ranked[:beam_width],
+                                        key=lambda x: x[1])]
+            else: # it's really a delimiter
+                for node, parts, lm_input in paths:
+                    node = rules.walk(node, morpheme)
+                    if node is not None:
+                        new_paths.append((node, parts + [morpheme], lm_input))
+            paths = new_paths
+            if not paths:
+                return []
+        return [''.join(parts) for node, parts, _ in paths
+                if rules.is_final(node)]
 
     # A parser's morphology and language_model objects should always be
     # accessed via the ``my_``-prefixed properties defined below. These
@@ -1416,7 +1985,8 @@ class MorphologicalParser(FomaFST, Parse):
                 'word_boundary_symbol': getattr(
                     self, 'word_boundary_symbol', '#'),
                 'morpheme_delimiters': getattr(
-                    self, 'morpheme_delimiters', None)
+                    self, 'morpheme_delimiters', None),
+                'lookup_backend': getattr(self, 'lookup_backend', 'flookup')
             }
         }
 
@@ -0,0 +1,105 @@
+"""SQL statement budgets for requests.
+
+The ``query_budget_tween_factory`` tween counts the SQL statements that each
+request executes and compares the count with the budget of the request's route,
+which is the ``query_budget.<route_name>`` setting, the built-in budget of
+``old.lib.constants.QUERY_BUDGETS`` or else the ``query_budget`` setting (0
+means no budget). A request that exceeds its budget is logged or, when
+testing or if ``query_budget.strict`` is on, raises ``QueryBudgetExceeded``,
+which the error view turns into a 500 response. This catches N+1 query
+patterns, e.g., relations that ``get_dict`` lazy loads for every model of a
+list because they are missing from ``old.lib.dbutils.EAGERLOADS``.
+
+Counting is on when testing or when a default budget is set; the count is then
+also returned in the ``X-OLD-Query-Count`` response header. Statements that a
+streamed response body executes after the view returns are not counted.
+"""
+
+import logging
+import threading
+
+from pyramid.settings import asbool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import old.lib.constants as oldc
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+QUERY_COUNT_HEADER = 'X-OLD-Query-Count'
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter(threading.local):
+    """The number of SQL statements executed in this thread since ``start``
+    was called, or ``None`` if not counting.
+    """
+
+    count = None
+
+    def start(self):
+        self.count = 0
+
+    def stop(self):
+        count, self.count = self.count, None
+        return count
+
+
+QUERY_COUNTER = QueryCounter()
+
+
+def count_statement(conn, cursor, statement, parameters, context,
+                    executemany):
+    # pylint: disable=unused-argument,too-many-arguments
+    if QUERY_COUNTER.count is not None:
+        QUERY_COUNTER.count += 1
+
+
+def get_query_budgets(settings):
+    """Return the default query budget and a dict from route names to the
+    query budgets that the Pyramid settings set for them.
+    """
+    budgets = {}
+    for key, value in settings.items():
+        if key.startswith('query_budget.') and key != 'query_budget.strict':
+            budgets[key[len('query_budget.'):]] = int(value)
+    return int(settings.get('query_budget') or 0), budgets
+
+
+def query_budget_tween_factory(handler, registry):
+    settings = registry.settings
+    testing = asbool(settings.get('testing', False))
+    default, budgets = get_query_budgets(settings)
+    if not (testing or default):
+        return handler
+    strict = testing or asbool(settings.get('query_budget.strict', False))
+    if not event.contains(Engine, 'before_cursor_execute', count_statement):
+        event.listen(Engine, 'before_cursor_execute', count_statement)
+
+    def query_budget_tween(request):
+        QUERY_COUNTER.start()
+        try:
+            response = handler(request)
+        finally:
+            count = QUERY_COUNTER.stop()
+        route = request.matched_route
+        budget = default
+        if route:
+            budget = budgets.get(
+                route.name, oldc.QUERY_BUDGETS.get(route.name, default))
+        if budget and count > budget:
+            msg = ('{} {} executed {} SQL statements; the budget of route {}'
+                   ' is {}.'.format(request.method, request.path, count,
+                                    route.name if route else None, budget))
+            if strict:
+                raise QueryBudgetExceeded(msg)
+            LOGGER.warning(msg)
+        response.headers[QUERY_COUNT_HEADER] = str(count)
+        return response
+
+    return query_budget_tween
@@ -211,7 +211,8 @@ class ValidMorphemeBreakTranscription(UnicodeString):
     def _validate_python(self, value, state):
         transcription = h.to_single_space(h.normalize(value))
         morpheme_break_is_orthographic = (
-            state.db.current_app_set.morpheme_break_is_orthographic)
+            state.db.cached_app_set.values.get(
+                'morpheme_break_is_orthographic'))
         inventory = 'phonemic inventory'
         if morpheme_break_is_orthographic:
             inventory = 'storage orthography'
@@ -233,10 +234,7 @@ def form_is_foreign_word(form_dict, db):
     """
     tag_ids = [h.get_int(id) for id in form_dict.get('tags', [])]
     tag_ids = [id for id in tag_ids if id]
-    try:
-        foreign_word_tag_id = db.get_foreign_word_tag().id
-    except AttributeError:
-        foreign_word_tag_id = None
+    foreign_word_tag_id = db.get_foreign_word_tag_id()
     if foreign_word_tag_id in tag_ids:
         return True
     return False
@@ -251,8 +249,8 @@ def transcription_is_valid(db, transcription, validation_name, inventory_name):
     attribute of the Application Settings meta object whose value is the
     appropriate Inventory object for the transcription.
     """
-    if getattr(db.current_app_set, validation_name, None) == 'Error':
-        inv = db.current_app_set.get_transcription_inventory(inventory_name, db)
+    if db.cached_app_set.values.get(validation_name) == 'Error':
+        inv = db.get_transcription_inventory(inventory_name)
         return inv.string_is_valid(transcription)
     return True
 
@@ -1387,6 +1385,8 @@ class MorphologicalParserSchema(Schema):
     morphology = ValidOLDModelObject(model_name='Morphology', not_empty=True)
     language_model = ValidOLDModelObject(model_name='MorphemeLanguageModel',
                                          not_empty=True)
+    lookup_backend = OneOf(oldc.FST_LOOKUP_BACKENDS, if_empty='flookup',
+                           if_missing='flookup')
 
 
 class ValidSmoothing(FancyValidator):
@@ -0,0 +1,163 @@
+"""Search index utilities for :mod:`old.lib.SQLAQueryBuilder`.
+
+A ``like`` or ``regexp`` pattern can only match a value that contains the
+literal parts of the pattern, and hence all of their trigrams. Given the
+trigram index of :mod:`old.models.searchtrigram`, a filter on an indexed
+attribute can therefore be conjoined with a filter restricting the model's ids
+to those whose indexed value has all of those trigrams. The conjunction is
+equivalent to the original filter (also under negation) as long as the index is
+complete; it merely lets the database skip the rows that cannot match.
+"""
+
+from sqlalchemy.sql import and_, bindparam, distinct, func, or_, select
+from sqlalchemy.sql.elements import BindParameter
+from sqlalchemy.types import Integer
+
+from old.models.searchtrigram import (
+    INDEXED_ATTRIBUTES,
+    SearchTrigram,
+    get_trigrams
+)
+
+
+NARROWED_RELATIONS = ('like', 'regexp')
+
+
+def is_narrowed(model_name, attribute_name, relation_name):
+    """Return True if searches on ``model_name.attribute_name`` with the
+    relation ``relation_name`` are narrowed via the search index.
+    """
+    return (relation_name in NARROWED_RELATIONS and
+            attribute_name in INDEXED_ATTRIBUTES.get(model_name, ()))
+
+
+def get_pattern_trigrams(relation_name, pattern):
+    """Return the set of trigrams that every value matching ``pattern`` (a
+    ``like`` or ``regexp`` pattern) contains.
+    """
+    if not isinstance(pattern, str):
+        return set()
+    if relation_name == 'like':
+        literals = _get_like_literals(pattern)
+    else:
+        literals = _get_regexp_literals(pattern)
+    trigrams = set()
+    for literal in literals:
+        trigrams |= get_trigrams(literal)
+    return trigrams
+
+
+def get_candidates_filter(model, model_name, attribute_name, relation_name,
+                          value):
+    """Return a filter restricting ``model`` to the instances whose
+    ``attribute_name`` value contains all of the trigrams of the pattern
+    ``value`` or ``None`` if the pattern has no trigrams.
+
+    If ``value`` is a bound parameter (i.e., a query plan is being built), the
+    trigrams and their count are bound parameters too, named
+    ``<value.key>_trigrams`` and ``<value.key>_ntrigrams``; cf.
+    ``get_candidates_params``.
+    """
+    if isinstance(value, BindParameter):
+        count = bindparam(value.key + '_ntrigrams', type_=Integer)
+        candidates = _get_candidates_select(
+            model_name, attribute_name,
+            bindparam(value.key + '_trigrams', expanding=True), count)
+        return or_(count == 0, model.id.in_(candidates))
+    trigrams = get_pattern_trigrams(relation_name, value)
+    if not trigrams:
+        return None
+    return model.id.in_(_get_candidates_select(
+        model_name, attribute_name, sorted(trigrams), len(trigrams)))
+
+
+def get_candidates_params(key, relation_name, value):
+    """Return the values of the bound parameters of a candidates filter built
+    for the bound parameter ``key``.
+    """
+    trigrams = get_pattern_trigrams(relation_name, value)
+    return {key + '_trigrams': sorted(trigrams),
+            key + '_ntrigrams': len(trigrams)}
+
+
+def _get_candidates_select(model_name, attribute_name, trigrams, count):
+    table = SearchTrigram.__table__
+    return select([table.c.model_id]).where(and_(
+        table.c.model_name == model_name,
+        table.c.attribute_name == attribute_name,
+        table.c.trigram.in_(trigrams))).group_by(table.c.model_id).having(
+            func.count(distinct(table.c.trigram)) == count)
+
+
+def _get_like_literals(pattern):
+    """Return the literal runs of a LIKE pattern, i.e., the strings between
+    its wildcards. A backslash may escape the following character so the two
+    end a run.
+    """
+    literals = []
+    run = []
+    escaped = False
+    for char in pattern:
+        if escaped or char in '%_\\':
+            literals.append(''.join(run))
+            run = []
+            escaped = char == '\\' and not escaped
+        else:
+            run.append(char)
+    literals.append(''.join(run))
+    return literals
+
+
+def _get_regexp_literals(pattern):
+    """Return strings that every match of the regular expression ``pattern``
+    contains, i.e., the runs of plain characters at its top level. This is
+    conservative: anything inside groups, brackets or after an escape ends a
+    run, a quantified character is dropped from its run and a top-level
+    alternation or an inline flag (e.g., the verbose flag ``(?x)``) means that
+    nothing is required.
+    """
+    if '(?' in pattern:
+        return []
+    literals = []
+    run = []
+    depth = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            literals.append(''.join(run))
+            run = []
+            index += 2
+            continue
+        if char == '[':
+            literals.append(''.join(run))
+            run = []
+            index += 1
+            # A ] right after [ or [^ is a literal member of the class.
+            if pattern[index:index + 1] == '^':
+                index += 1
+            if pattern[index:index + 1] == ']':
+                index += 1
+            while index < len(pattern) and pattern[index] != ']':
+                index += 2 if pattern[index] == '\\' else 1
+            index += 1
+            continue
+        if char == '|' and depth == 0:
+            return []
+        if char in '*?{':
+            if run:
+                run.pop()
+            literals.append(''.join(run))
+            run = []
+            if char == '{':
+                while index < len(pattern) and pattern[index] != '}':
+                    index += 1
+        elif char in '()+.^$|]}':
+            depth += {'(': 1, ')': -1}.get(char, 0)
+            literals.append(''.join(run))
+            run = []
+        elif depth == 0:
+            run.append(char)
+        index += 1
+    literals.append(''.join(run))
+    return literals
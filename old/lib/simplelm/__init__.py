@@ -29,5 +29,10 @@
 # Python package out of Novak's SimpleLM project. 
 
 from .evaluatelm import load_arpa, compute_sentence_prob, LMTree
+from .compactlm import CompactLMTree, LM_TRIES
+from .ngramlm import (NGramCounts, NGramLM, SMOOTHING_ALGORITHMS,
+                      compute_perplexity, estimate, estimate_file)
 
-__all__ = ['load_arpa', 'compute_sentence_prob', 'LMTree']
+__all__ = ['load_arpa', 'compute_sentence_prob', 'LMTree', 'CompactLMTree',
+           'LM_TRIES', 'NGramCounts', 'NGramLM', 'SMOOTHING_ALGORITHMS',
+           'compute_perplexity', 'estimate', 'estimate_file']
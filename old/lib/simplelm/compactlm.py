@@ -0,0 +1,451 @@
+# Copyright 2016 Joel Dunham
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Compact, array-backed n-gram language model trie.
+
+``CompactLMTree`` is a drop-in replacement for ``evaluatelm.LMTree`` as far as
+``compute_sentence_prob`` is concerned: it implements ``get_ngram_p`` with
+exactly the same semantics, but it stores the model in a handful of flat
+buffers instead of one Python object (with its own ``children`` dict) per
+n-gram:
+
+- the vocabulary is interned: every word is mapped to an integer id;
+- the n-grams of each order are sorted by (prefix, word id), so that the
+  children of any node form a contiguous range of the next order's arrays;
+- for each order ``k`` there is an int array of word ids, two double arrays of
+  (log_10) probabilities and backoff weights, and (for ``k < max_order``) an
+  int array of offsets into the arrays of order ``k + 1``.
+
+Looking up an n-gram is a binary search over a child range per word.
+
+The trie is saved to disk in a flat binary format (see ``save``) whose
+sections are 8-byte aligned so that they can be used in place, via
+``memoryview.cast``. ``load`` memory-maps the file read-only, so all of the
+processes that load the same file share one copy of it in the OS page cache.
+The file begins with a format version and a hash of its contents; the
+process-wide ``LM_TRIES`` registry uses these to detect that a file has been
+rewritten (``save`` always replaces files atomically, so existing mappings of
+the old file remain valid) and to share one mapping between identical copies
+of a file.
+
+Usage:
+
+    >>> from old.lib.simplelm import (CompactLMTree, LM_TRIES,
+    ...     compute_sentence_prob)
+    >>> trie = CompactLMTree.from_arpa('morpheme_language_model.lm', 'utf8')
+    >>> trie.save('morpheme_language_model.lmtrie')
+    >>> trie = LM_TRIES.get_trie('morpheme_language_model.lmtrie')
+    >>> compute_sentence_prob(trie, ['<s>', 'chien', 's', '</s>'])
+    -4.2934
+
+"""
+
+from array import array
+from bisect import bisect_left
+import codecs
+from hashlib import blake2b
+import mmap
+import os
+import re
+import threading
+from uuid import uuid4
+
+
+# Word id used for words that are not in the vocabulary.
+OOV_ID = -1
+
+MAGIC = b'OLDLMTRI'
+VERSION = 2
+DIGEST_SIZE = 16
+
+NGRAM_COUNT_PATT = re.compile(r'^ngram\s+(\d+)=.*$')
+ORDER_PATT = re.compile(r'^\\(\d+)')
+
+
+def iter_arpa(arpa_file, encoding=None):
+    """Yield ``(words, prob, bow)`` triples for the n-grams in the ARPA file
+    at ``arpa_file``. The file is interpreted exactly as
+    ``evaluatelm.load_arpa`` interprets it. The last item yielded is the
+    maximum n-gram order (an int).
+    """
+    order = max_order = 0
+    with codecs.open(arpa_file, encoding=encoding) as filei:
+        for line in filei:
+            line = line.strip()
+            match = NGRAM_COUNT_PATT.match(line)
+            if match:
+                max_order = int(match.group(1))
+            if order > 0 and not line.startswith('\\') and not line == '':
+                parts = line.split('\t')
+                words = parts[1].split(' ')
+                if order < max_order and len(parts) == 3:
+                    yield words, float(parts[0]), float(parts[-1])
+                else:
+                    yield words, float(parts[0]), 0.0
+            match = ORDER_PATT.match(line)
+            if match:
+                order = int(match.group(1))
+    yield max_order
+
+
+def _pad(length, size=8):
+    return (size - length % size) % size
+
+
+class CompactLMTree:
+    """An n-gram LM trie stored in flat arrays.
+
+    ``words[k]``, ``probs[k]`` and ``bows[k]`` hold the word ids, probabilities
+    and backoff weights of the n-grams of order ``k + 1``; ``offsets[k]`` holds,
+    for each n-gram of order ``k`` (order 0 being the root, i.e., the empty
+    n-gram), the index into ``words[k]`` of its first child. The children of
+    the ``i``th n-gram of order ``k`` are therefore the n-grams at indices
+    ``offsets[k][i]`` up to (but not including) ``offsets[k][i + 1]`` of
+    ``words[k]``, sorted by word id.
+    """
+
+    # The root of an ``LMTree`` has a prob and bow of 0.0.
+    root_prob = 0.0
+    root_bow = 0.0
+
+    def __init__(self, vocabulary, max_order, words, probs, bows, offsets,
+                 digest=None):
+        self.vocabulary = vocabulary
+        self.word2id = {word: id_ for id_, word in enumerate(vocabulary)}
+        self.max_order = max_order
+        self.words = words
+        self.probs = probs
+        self.bows = bows
+        self.offsets = offsets
+        # Hex digest of the saved file's contents, if saved or loaded.
+        self.digest = digest
+
+    @classmethod
+    def from_arpa(cls, arpa_file, encoding=None):
+        """Build a ``CompactLMTree`` from the ARPA file at ``arpa_file``."""
+        vocabulary = []
+        word2id = {}
+        # ngrams[k] maps tuples of k + 1 word ids to (prob, bow) pairs.
+        ngrams = []
+        max_order = 0
+        for item in iter_arpa(arpa_file, encoding):
+            if isinstance(item, int):
+                max_order = item
+                break
+            words, prob, bow = item
+            key = []
+            for word in words:
+                id_ = word2id.get(word)
+                if id_ is None:
+                    id_ = word2id[word] = len(vocabulary)
+                    vocabulary.append(word)
+                key.append(id_)
+            key = tuple(key)
+            while len(ngrams) < len(key):
+                ngrams.append({})
+            # As in ``LMTree.add_child``, missing prefixes are created with a
+            # prob and bow of 0.0 and the first occurrence of an n-gram wins.
+            for length in range(1, len(key)):
+                ngrams[length - 1].setdefault(key[:length], (0.0, 0.0))
+            ngrams[len(key) - 1].setdefault(key, (prob, bow))
+        return cls.from_ngrams(vocabulary, max_order, ngrams)
+
+    @classmethod
+    def from_ngrams(cls, vocabulary, max_order, ngrams):
+        """Build a ``CompactLMTree`` from the list of words ``vocabulary``
+        and ``ngrams``, whose ``k``th item maps each n-gram of order ``k + 1``
+        (a tuple of indices into ``vocabulary``) to its probability and backoff
+        weight. The prefixes of each n-gram must be in ``ngrams`` too.
+        """
+        words = []
+        probs = []
+        bows = []
+        offsets = []
+        parent_index = {(): 0}
+        for order_ngrams in ngrams:
+            keys = sorted(order_ngrams)
+            order_offsets = array('i', [0] * (len(parent_index) + 1))
+            for key in keys:
+                order_offsets[parent_index[key[:-1]] + 1] += 1
+            for index in range(1, len(order_offsets)):
+                order_offsets[index] += order_offsets[index - 1]
+            offsets.append(order_offsets)
+            words.append(array('i', [key[-1] for key in keys]))
+            probs.append(array('d', [order_ngrams[key][0] for key in keys]))
+            bows.append(array('d', [order_ngrams[key][1] for key in keys]))
+            parent_index = {key: index for index, key in enumerate(keys)}
+        return cls(vocabulary, max_order, words, probs, bows, offsets)
+
+    def save(self, path):
+        """Write the trie to ``path``. The layout is:
+
+        - the 8-byte magic string ``MAGIC``;
+        - a ``DIGEST_SIZE``-byte BLAKE2 digest of the rest of the file;
+        - an int32 header: version, max order, number of stored orders,
+          length in bytes of the vocabulary, then the n-gram count of each
+          stored order;
+        - the vocabulary as newline-delimited UTF-8;
+        - for each stored order: its word ids (int32), probabilities
+          (float64), backoff weights (float64) and the child offsets of the
+          previous order (int32).
+
+        Each section is padded to a multiple of 8 bytes. The file is written
+        to a temporary file that then atomically replaces any existing file at
+        ``path``, so that processes which have mapped that file are unaffected.
+        """
+        chunks = self.to_chunks()
+        temp_path = '%s.%s.tmp' % (path, uuid4().hex)
+        try:
+            with open(temp_path, 'wb') as fileo:
+                for chunk in chunks:
+                    fileo.write(chunk)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def to_chunks(self):
+        """Return the list of byte strings that ``save`` writes and set
+        ``self.digest``.
+        """
+        vocabulary = '\n'.join(self.vocabulary).encode('utf8')
+        header = array('i', [VERSION, self.max_order, len(self.words),
+                             len(vocabulary)] +
+                       [len(order_words) for order_words in self.words])
+        chunks = []
+        hash_ = blake2b(digest_size=DIGEST_SIZE)
+        for section in [header.tobytes(), vocabulary] + [
+                buffer_.tobytes()
+                for order in range(len(self.words))
+                for buffer_ in (self.words[order], self.probs[order],
+                                self.bows[order], self.offsets[order])]:
+            for chunk in (section, b'\0' * _pad(len(section))):
+                hash_.update(chunk)
+                chunks.append(chunk)
+        self.digest = hash_.hexdigest()
+        return [MAGIC, hash_.digest()] + chunks
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map the trie saved by ``save`` at ``path`` (read-only)."""
+        with open(path, 'rb') as filei:
+            try:
+                buffer_ = mmap.mmap(filei.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                buffer_ = b''
+        return cls.from_buffer(buffer_)
+
+    @staticmethod
+    def read_digest(path):
+        """Return the hex digest recorded in the header of the trie file at
+        ``path``. Raise ``ValueError`` if it is not a trie file of the current
+        version.
+        """
+        with open(path, 'rb') as filei:
+            header = filei.read(len(MAGIC) + DIGEST_SIZE + 4)
+        if (len(header) != len(MAGIC) + DIGEST_SIZE + 4 or
+                header[:len(MAGIC)] != MAGIC):
+            raise ValueError('Not a compact LM trie file')
+        version = array('i', header[-4:])[0]
+        if version != VERSION:
+            raise ValueError('Unsupported compact LM trie version %s' % version)
+        return header[len(MAGIC):len(MAGIC) + DIGEST_SIZE].hex()
+
+    @classmethod
+    def from_buffer(cls, buffer_, verify=True):
+        """Build a trie whose arrays are views on ``buffer_``, the contents of
+        a file written by ``save``. Raise ``ValueError`` if ``buffer_`` is not
+        such a file or (if ``verify`` is true) if its contents do not match
+        the digest in its header.
+        """
+        view = memoryview(buffer_)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError('Not a compact LM trie file')
+        position = len(MAGIC)
+        digest = bytes(view[position:position + DIGEST_SIZE])
+        position += DIGEST_SIZE
+        header = view[position:position + 16]
+        if len(header) != 16:
+            raise ValueError('Truncated compact LM trie file')
+        version, max_order, order_count, vocabulary_length = header.cast('i')
+        if version != VERSION:
+            raise ValueError('Unsupported compact LM trie version %s' % version)
+        if verify and blake2b(
+                view[position:], digest_size=DIGEST_SIZE).digest() != digest:
+            raise ValueError('Corrupt compact LM trie file')
+        position += 16
+        counts = view[position:position + 4 * order_count].cast('i').tolist()
+        position += 4 * order_count
+        position += _pad(16 + 4 * order_count)
+
+        def take(length, format_=None):
+            nonlocal position
+            section = view[position:position + length]
+            if len(section) != length:
+                raise ValueError('Truncated compact LM trie file')
+            position += length + _pad(length)
+            return section.cast(format_) if format_ else section
+
+        vocabulary = str(take(vocabulary_length), 'utf8')
+        vocabulary = vocabulary.split('\n') if vocabulary else []
+        words = []
+        probs = []
+        bows = []
+        offsets = []
+        parent_count = 1
+        for count in counts:
+            words.append(take(4 * count, 'i'))
+            probs.append(take(8 * count, 'd'))
+            bows.append(take(8 * count, 'd'))
+            offsets.append(take(4 * (parent_count + 1), 'i'))
+            parent_count = count
+        return cls(vocabulary, max_order, words, probs, bows, offsets,
+                   digest.hex())
+
+    def get_ngram_p(self, ngram, i=0):
+        """Return the probability of ``ngram[i:]`` if it is in the model;
+        otherwise return the backoff weight of its longest prefix that is in
+        the model. Also return a boolean indicating whether the first value is
+        a probability; cf. ``LMTree.get_ngram_p``.
+        """
+        word2id = self.word2id
+        return self.get_id_ngram_p([word2id.get(word, OOV_ID)
+                                    for word in ngram[i:]])
+
+    def get_id_ngram_p(self, ids):
+        """Like ``get_ngram_p`` except that the n-gram is a sequence of word
+        ids (``OOV_ID`` for words that are not in the vocabulary).
+        """
+        order = 0
+        index = 0
+        bow = self.root_bow
+        prob = self.root_prob
+        for id_ in ids:
+            if id_ == OOV_ID or order == len(self.words):
+                return bow, False
+            order_offsets = self.offsets[order]
+            order_words = self.words[order]
+            low = order_offsets[index]
+            high = order_offsets[index + 1]
+            index = bisect_left(order_words, id_, low, high)
+            if index == high or order_words[index] != id_:
+                return bow, False
+            prob = self.probs[order][index]
+            bow = self.bows[order][index]
+            order += 1
+        return prob, True
+
+    def compute_sentence_probs(self, sentences):
+        """Return the list of log_10 probabilities of the word sequences in
+        ``sentences``. Each value is identical to what
+        ``compute_sentence_prob(self, sentence)`` returns, but the sentences
+        are integer-encoded and organized into a prefix tree so that the
+        n-gram lookups of a prefix shared by several sentences are performed
+        only once; n-gram lookups are also memoized across sentences.
+        """
+        word2id = self.word2id
+        lookups = {}
+        # Maps (prefix node, word id) to the node for the extended prefix;
+        # each node is a (ngram stack, log prob so far) pair.
+        prefixes = {}
+        result = []
+        for sentence in sentences:
+            if not sentence:
+                result.append(0.0)
+                continue
+            ids = [word2id.get(word, OOV_ID) for word in sentence]
+            node = prefixes.get((None, ids[0]))
+            if node is None:
+                node = prefixes[(None, ids[0])] = ((ids[0],), 0.0)
+            for id_ in ids[1:]:
+                key = (node, id_)
+                next_node = prefixes.get(key)
+                if next_node is None:
+                    ngram, total = node
+                    ngram = ngram + (id_,)
+                    while True:
+                        try:
+                            p, is_prob = lookups[ngram]
+                        except KeyError:
+                            p, is_prob = lookups[ngram] = self.get_id_ngram_p(
+                                ngram)
+                        total += p
+                        if is_prob:
+                            break
+                        ngram = ngram[1:]
+                    next_node = prefixes[key] = (ngram, total)
+                node = next_node
+            result.append(node[1])
+        return result
+
+
+class LMTrieRegistry:
+    """Process-wide registry of memory-mapped ``CompactLMTree`` instances keyed
+    by file path.
+
+    A path's trie is re-mapped when the file's identity (device, inode, size
+    and modification time) changes, i.e., when it has been rewritten. Tries
+    are also indexed by the digest in their file headers so that identical
+    copies of a file (e.g., the LM trie of a morphological parser, which is
+    replicated from its morpheme language model) share a single mapping.
+    """
+
+    def __init__(self):
+        # path -> (file identity, trie)
+        self.tries = {}
+        # digest -> trie
+        self.digests = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_identity(path):
+        stat = os.stat(path)
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def get_trie(self, path):
+        """Return the trie saved at ``path``. Raise ``FileNotFoundError`` if
+        there is no file there or ``ValueError`` if it is not a valid trie
+        file.
+        """
+        identity = self.get_identity(path)
+        with self.lock:
+            cached_identity, trie = self.tries.get(path, (None, None))
+            if cached_identity == identity:
+                return trie
+            digest = CompactLMTree.read_digest(path)
+            trie = self.digests.get(digest)
+            if trie is None:
+                trie = CompactLMTree.load(path)
+                self.digests[trie.digest] = trie
+            self.tries[path] = (identity, trie)
+            self._prune()
+            return trie
+
+    def recycle(self, path):
+        with self.lock:
+            self.tries.pop(path, None)
+            self._prune()
+
+    def _prune(self):
+        """Forget the tries that no path refers to any longer; their mappings
+        are closed once nothing else references them.
+        """
+        live = {id(trie) for _, trie in self.tries.values()}
+        for digest, trie in list(self.digests.items()):
+            if id(trie) not in live:
+                del self.digests[digest]
+
+
+LM_TRIES = LMTrieRegistry()
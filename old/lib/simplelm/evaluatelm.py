@@ -268,7 +268,7 @@ def lm_is_normalized(arpalm_file, delta=1e-6, encoding=None):
         raise ValueError("The unigram model is not fully normalized!")
 
     total = 0.0
-    for line in codecs.open(arpalm_file, encoding):
+    for line in codecs.open(arpalm_file, encoding=encoding):
         line = line.strip()
         if order > 0 and not line.startswith("\\") and not line == "":
             parts = line.split("\t")
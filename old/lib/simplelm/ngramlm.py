@@ -0,0 +1,282 @@
+# Copyright 2016 Joel Dunham
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""In-process n-gram language model estimation.
+
+This module estimates the interpolated, backoff-form LMs that the
+``SimpleModKN``, ``SimpleKN`` and ``SimpleAbs`` scripts of this package write
+(and that MITLM's ``estimate-ngram -s FixModKN``/``FixKN`` write, to within
+rounding), without their per-n-gram string keys and without a subprocess:
+
+- ``NGramCounts`` interns the words of a corpus as integers and counts the
+  n-grams of each order as tuples of word ids in one pass;
+- ``estimate`` turns the counts into an ``NGramLM`` using one of the
+  ``SMOOTHING_ALGORITHMS``: modified Kneser-Ney (three discounts per order),
+  Kneser-Ney (one discount per order), absolute discounting (Kneser-Ney's
+  discounts without its continuation counts) or maximum likelihood;
+- an ``NGramLM`` can be written as an ARPA file and converted directly to a
+  ``CompactLMTree``, so that generating an LM's trie does not require writing
+  and re-parsing the ARPA file;
+- ``compute_perplexity`` evaluates a trie on held-out sentences.
+
+As in the SimpleLM scripts, the discounts are Chen & Goodman's estimates from
+the counts of counts of each order, unigrams are not discounted, and the
+lower orders of the Kneser-Ney models are estimated from continuation counts
+(except for the n-grams that begin with the sentence-begin symbol).
+
+Usage:
+
+    >>> from old.lib.simplelm.ngramlm import NGramCounts, estimate
+    >>> counts = NGramCounts(3)
+    >>> counts.add_file('corpus.txt')
+    >>> lm = estimate(counts, 'ModKN')
+    >>> lm.write_arpa('morpheme_language_model.lm')
+    >>> lm.to_trie().save('morpheme_language_model.lmtrie')
+
+"""
+
+from collections import Counter
+from math import log10
+
+from .compactlm import CompactLMTree
+
+
+SMOOTHING_ALGORITHMS = ('ModKN', 'KN', 'Abs', 'ML')
+
+# The log_10 probability written for events with probability 0.
+LOG_ZERO = -99.0
+
+START_ID = 0
+END_ID = 1
+
+
+class NGramCounts:
+    """The raw counts of the n-grams of orders 1 to ``order`` in a corpus of
+    sentences, each padded with ``start_symbol`` and ``end_symbol``.
+
+    ``vocabulary`` lists the words in order of their ids (the start and end
+    symbols have ids 0 and 1); ``counts[k]`` maps the tuples of ``k + 1``
+    word ids that occur to their counts. The start symbol is not counted as
+    a unigram.
+    """
+
+    def __init__(self, order, start_symbol='<s>', end_symbol='</s>'):
+        if order < 1:
+            raise ValueError('The order of an n-gram LM must be positive.')
+        self.order = order
+        self.vocabulary = [start_symbol, end_symbol]
+        self.word2id = {start_symbol: START_ID, end_symbol: END_ID}
+        self.counts = [Counter() for _ in range(order)]
+
+    def add_sentence(self, words):
+        word2id = self.word2id
+        vocabulary = self.vocabulary
+        ids = [START_ID]
+        for word in words:
+            id_ = word2id.get(word)
+            if id_ is None:
+                id_ = word2id[word] = len(vocabulary)
+                vocabulary.append(word)
+            ids.append(id_)
+        ids.append(END_ID)
+        ids = tuple(ids)
+        length = len(ids)
+        self.counts[0].update((id_,) for id_ in ids[1:])
+        for index in range(1, self.order):
+            self.counts[index].update(
+                ids[start:start + index + 1]
+                for start in range(length - index))
+
+    def add_file(self, path, encoding='utf8'):
+        """Count the sentences of the corpus file at ``path``, which has one
+        sentence of space-delimited words per line. Blank lines are skipped.
+        """
+        with open(path, encoding=encoding) as filei:
+            for line in filei:
+                words = line.split()
+                if words:
+                    self.add_sentence(words)
+
+
+class NGramLM:
+    """An n-gram LM in backoff form: ``ngrams[k]`` maps the tuples of ``k +
+    1`` word ids of the model to their (log_10) probabilities and backoff
+    weights; the backoff weight is ``None`` for n-grams that are not the
+    history of any other n-gram.
+    """
+
+    def __init__(self, vocabulary, order, ngrams):
+        self.vocabulary = vocabulary
+        self.order = order
+        self.ngrams = ngrams
+
+    def write_arpa(self, path, encoding='utf8'):
+        vocabulary = self.vocabulary
+        with open(path, 'w', encoding=encoding) as fileo:
+            fileo.write('\\data\\\n')
+            for index, order_ngrams in enumerate(self.ngrams):
+                fileo.write('ngram %d=%d\n' % (index + 1, len(order_ngrams)))
+            for index, order_ngrams in enumerate(self.ngrams):
+                fileo.write('\n\\%d-grams:\n' % (index + 1))
+                for key in sorted(order_ngrams):
+                    prob, bow = order_ngrams[key]
+                    words = ' '.join(vocabulary[id_] for id_ in key)
+                    if bow is None:
+                        fileo.write('%0.7f\t%s\n' % (prob, words))
+                    else:
+                        fileo.write('%0.7f\t%s\t%0.7f\n' % (prob, words, bow))
+            fileo.write('\n\\end\\\n')
+
+    def to_trie(self):
+        """Return the model as a ``CompactLMTree``, which is what
+        ``CompactLMTree.from_arpa`` would build from its ARPA file, except
+        that its values are not rounded.
+        """
+        return CompactLMTree.from_ngrams(
+            self.vocabulary, self.order,
+            [{key: (prob, 0.0 if bow is None else bow)
+              for key, (prob, bow) in order_ngrams.items()}
+             for order_ngrams in self.ngrams])
+
+
+def estimate(counts, smoothing='ModKN'):
+    """Return the ``NGramLM`` that ``smoothing`` (one of
+    ``SMOOTHING_ALGORITHMS``) estimates from the ``NGramCounts`` ``counts``.
+    """
+    if smoothing not in SMOOTHING_ALGORITHMS:
+        raise ValueError('Unknown smoothing algorithm %s' % smoothing)
+    order = counts.order
+    raw = counts.counts
+    if smoothing in ('ModKN', 'KN'):
+        effective = [_get_continuation_counts(raw[index], raw[index + 1])
+                     for index in range(order - 1)] + [raw[-1]]
+    else:
+        effective = raw
+    # The unigram distribution is not discounted.
+    total = sum(effective[0].values())
+    probs = {key: count / total for key, count in effective[0].items()}
+    ngrams = [{key: [_log10(prob), None] for key, prob in probs.items()}]
+    ngrams[0][(START_ID,)] = [LOG_ZERO, None]
+    for index in range(1, order):
+        discounts = _get_discounts(effective[index], smoothing)
+        denominators, gammas = _get_histories(effective[index], discounts)
+        lower_probs = probs
+        probs = {}
+        for key, count in effective[index].items():
+            history = key[:-1]
+            probs[key] = (
+                (count - discounts[min(count, 3) - 1]) /
+                denominators[history] +
+                gammas[history] * lower_probs[key[1:]])
+        for history, gamma in gammas.items():
+            ngrams[index - 1][history][1] = _log10(gamma)
+        ngrams.append({key: [_log10(prob), None]
+                       for key, prob in probs.items()})
+    # As in the SimpleLM scripts, the end symbol's unigram gets a backoff
+    # weight of zero.
+    if order > 1:
+        ngrams[0][(END_ID,)][1] = LOG_ZERO
+    return NGramLM(list(counts.vocabulary), order,
+                   [{key: tuple(value) for key, value in order_ngrams.items()}
+                    for order_ngrams in ngrams])
+
+
+def estimate_file(path, order, smoothing='ModKN', start_symbol='<s>',
+                  end_symbol='</s>', encoding='utf8'):
+    """Return the ``NGramLM`` estimated from the corpus file at ``path``."""
+    counts = NGramCounts(order, start_symbol, end_symbol)
+    counts.add_file(path, encoding)
+    return estimate(counts, smoothing)
+
+
+def compute_perplexity(trie, sentences):
+    """Return the perplexity of the ``CompactLMTree`` ``trie`` on
+    ``sentences``, lists of words that begin with the start symbol and end
+    with the end symbol, or ``None`` if they contain no words to predict.
+    Words that are not in the vocabulary of the trie are neither predicted
+    nor counted and the word after one is predicted without a history, as
+    with MITLM's ``-eval-perp`` and SRILM's ``ngram -ppl``.
+    """
+    word2id = trie.word2id
+    segments = []
+    predicted = 0
+    for sentence in sentences:
+        segment = sentence[:1]
+        for word in sentence[1:]:
+            if word in word2id:
+                segment.append(word)
+                predicted += 1
+            else:
+                # Scoring a segment that begins with an unknown word predicts
+                # its second word from no history.
+                segments.append(segment)
+                segment = [word]
+        segments.append(segment)
+    if not predicted:
+        return None
+    log_prob = sum(trie.compute_sentence_probs(segments))
+    return 10 ** (-log_prob / predicted)
+
+
+def _log10(value):
+    return log10(value) if value > 0 else LOG_ZERO
+
+
+def _get_continuation_counts(counts, higher_counts):
+    """Return the Kneser-Ney counts of the n-grams in ``counts``: the number
+    of distinct words that precede each n-gram in ``higher_counts`` or, for
+    the n-grams that begin with the start symbol, their raw counts.
+    """
+    result = Counter(key[1:] for key in higher_counts)
+    for key, count in counts.items():
+        if key[0] == START_ID:
+            result[key] = count
+    return result
+
+
+def _get_discounts(counts, smoothing):
+    """Return the discounts of the n-grams in ``counts`` that occur once,
+    twice and three or more times.
+    """
+    if smoothing == 'ML':
+        return (0.0, 0.0, 0.0)
+    counts_of_counts = [0] * 4
+    for count in counts.values():
+        if count <= 4:
+            counts_of_counts[count - 1] += 1
+    n1, n2 = counts_of_counts[:2]
+    y = n1 / (n1 + 2 * n2) if n1 + 2 * n2 else 0.0
+    if smoothing != 'ModKN':
+        return (y, y, y)
+    return tuple(
+        index + 1 - (index + 2) * y * counts_of_counts[index + 1] /
+        counts_of_counts[index] if counts_of_counts[index] else
+        float(index + 1)
+        for index in range(3))
+
+
+def _get_histories(counts, discounts):
+    """Return dicts from the histories (prefixes) of the n-grams in
+    ``counts`` to the sums of their counts and to their interpolation
+    weights, i.e., the discounted mass divided by that sum.
+    """
+    denominators = Counter()
+    discounted = Counter()
+    for key, count in counts.items():
+        history = key[:-1]
+        denominators[history] += count
+        discounted[history] += discounts[min(count, 3) - 1]
+    return denominators, {
+        history: discounted[history] / denominator
+        for history, denominator in denominators.items()}
@@ -22,9 +22,12 @@ A number of functions, classes and constants used throughout the application.
 """
 
 import configparser
+import csv
 import datetime
 import errno
 import gzip
+import io
+import json
 import logging
 import os
 from random import choice, shuffle
@@ -36,12 +39,14 @@ from subprocess import Popen, PIPE
 import unicodedata
 from uuid import uuid4
 import zipfile
+import zlib
 
 from docutils.core import publish_parts
 from markdown import Markdown
 from passlib.hash import pbkdf2_sha512
 
 from old.lib.constants import (
+    ISO_STRFTIME,
     RSRC_TO_DIR,
     RSRC_TO_SUBDIR,
     FORM_REFERENCE_PATTERN,
@@ -108,7 +113,7 @@ def get_model_file_path(model_object, model_directory_path, file_type=None):
         'dictionary': '_dictionary.pickle',
         'lm_corpus': '.txt',
         'arpa': '.lm',
-        'lm_trie': '.pickle',
+        'lm_trie': '.lmtrie',
         'vocabulary': '.vocab'
     }
     tablename = model_object.__tablename__
@@ -125,7 +130,8 @@ def create_OLD_directories(settings):
     """Make all of the required OLD directories."""
     for directory_name in ('files', 'reduced_files', 'users', 'corpora',
                            'phonologies', 'morphologies',
-                           'morpheme_language_models', 'morphological_parsers'):
+                           'morpheme_language_models', 'morphological_parsers',
+                           'imports'):
         make_directory_safely(get_old_directory_path(directory_name, settings))
 
 
@@ -804,3 +810,93 @@ def chunker(sequence, size):
     """
     return (sequence[position:position + size] for position in
             range(0, len(sequence), size))
+
+
+class JSONOLDEncoder(json.JSONEncoder):
+    """JSON encoder that produces the same output as the OLD's JSON renderer
+    (cf. ``old.get_json_renderer``): datetimes and dates are serialized as ISO
+    strings and objects with a ``__json__`` method as its return value.
+    Circular references are not checked for: the values of ``get_dict`` are
+    trees.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('check_circular', False)
+        super().__init__(**kwargs)
+
+    def default(self, o):  # pylint: disable=method-hidden
+        if isinstance(o, datetime.datetime):
+            return o.strftime(ISO_STRFTIME)
+        if isinstance(o, datetime.date):
+            return o.isoformat()
+        if hasattr(o, '__json__'):
+            return o.__json__(None)
+        return super().default(o)
+
+
+def get_json_array_chunks(batches, encoder=None):
+    """Yield the UTF-8 encoded JSON array of the items in ``batches`` (an
+    iterable of lists of items) chunk by chunk, one chunk per batch. The
+    concatenated chunks are identical to ``encoder.encode`` of the list of all
+    of the items.
+    """
+    encoder = encoder or JSONOLDEncoder()
+    separator = '['
+    for batch in batches:
+        if batch:
+            yield (separator + ', '.join(encoder.encode(item)
+                                         for item in batch)).encode('utf8')
+            separator = ', '
+    yield ('[]' if separator == '[' else ']').encode('utf8')
+
+
+def get_ndjson_chunks(batches, encoder=None):
+    """Yield the UTF-8 encoded NDJSON lines of the items in ``batches`` (an
+    iterable of lists of items), one chunk per batch.
+    """
+    encoder = encoder or JSONOLDEncoder()
+    for batch in batches:
+        if batch:
+            yield ''.join(encoder.encode(item) + '\n'
+                          for item in batch).encode('utf8')
+
+
+def get_csv_chunks(batches, encoder=None):
+    """Yield the UTF-8 encoded CSV rows of the dicts in ``batches`` (an
+    iterable of lists of dicts with the same keys), one chunk per batch. The
+    first row is the keys. Dates are ISO strings, ``None`` is empty and dicts
+    and lists are JSON.
+    """
+    encoder = encoder or JSONOLDEncoder()
+
+    def get_cell(value):
+        if value is None:
+            return ''
+        if isinstance(value, (dict, list)):
+            return encoder.encode(value)
+        if isinstance(value, datetime.date):
+            return encoder.default(value)
+        return value
+
+    keys = None
+    for batch in batches:
+        if not batch:
+            continue
+        file_ = io.StringIO()
+        writer = csv.writer(file_)
+        if keys is None:
+            keys = list(batch[0])
+            writer.writerow(keys)
+        for dict_ in batch:
+            writer.writerow([get_cell(dict_.get(key)) for key in keys])
+        yield file_.getvalue().encode('utf8')
+
+
+def get_gzipped_chunks(chunks):
+    """Yield the gzip compression of the concatenated ``chunks``."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
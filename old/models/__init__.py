@@ -6,7 +6,12 @@ from sqlalchemy.orm import configure_mappers, sessionmaker
 
 # import or define all models here to ensure they are attached to the
 # Base.metadata prior to any initialization routines
-from .applicationsettings import ApplicationSettings
+from .applicationsettings import (
+    ApplicationSettings,
+    bump_app_settings_version_on_drop,
+    bump_app_settings_version_on_end,
+    bump_app_settings_version_on_flush
+)
 from .collection import Collection
 from .collectionbackup import CollectionBackup
 from .corpus import Corpus
@@ -16,8 +21,10 @@ from .file import File
 from .form import Form
 from .formbackup import FormBackup
 from .formsearch import FormSearch
+from .job import Job
 from .keyboard import Keyboard
 from .language import Language
+from .meta import Base
 from .model import Model
 from .morphemelanguagemodel import MorphemeLanguageModel
 from .morphemelanguagemodelbackup import MorphemeLanguageModelBackup
@@ -29,6 +36,7 @@ from .orthography import Orthography
 from .page import Page
 from .phonology import Phonology
 from .phonologybackup import PhonologyBackup
+from .searchtrigram import SearchTrigram, update_search_index
 from .source import Source
 from .speaker import Speaker
 from .syntacticcategory import SyntacticCategory
@@ -39,14 +47,22 @@ from .user import User
 # run configure_mappers after defining all of the models to ensure
 # all relationships can be setup
 configure_mappers()
+event.listen(Base.metadata, 'after_drop', bump_app_settings_version_on_drop)
+
+
+_sqlite_patched = []
 
 
 def patch_sqlite(settings):
     """Make SQLite behave how we want it to: regex search and case-sensitive
-    LIKE.
+    LIKE. The listener is added to the ``Engine`` class and hence only needs
+    to be added once per process; adding it on every call would grow the
+    listener collection without bound and mutate it while other threads'
+    connections iterate over it.
     """
     RDBMS_Name, *_ = settings['sqlalchemy.url'].split(':')
-    if RDBMS_Name == 'sqlite':
+    if RDBMS_Name == 'sqlite' and not _sqlite_patched:
+        _sqlite_patched.append(True)
         # pylint: disable=unused-variable
         @event.listens_for(Engine, 'begin')
         def sqlite_patches(dbapi_connection):
@@ -80,4 +96,8 @@ def get_engine(settings, prefix='sqlalchemy.'):
 def get_session_factory(engine):
     factory = sessionmaker()
     factory.configure(bind=engine)
+    event.listen(factory, 'after_flush', update_search_index)
+    event.listen(factory, 'after_flush', bump_app_settings_version_on_flush)
+    event.listen(factory, 'after_commit', bump_app_settings_version_on_end)
+    event.listen(factory, 'after_rollback', bump_app_settings_version_on_end)
     return factory
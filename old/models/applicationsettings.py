@@ -1,12 +1,15 @@
 """ApplicationSettings model"""
 
+from collections import namedtuple
+from itertools import chain
 import logging
-import re
+import threading
 
 from sqlalchemy import Column, Sequence, ForeignKey
 from sqlalchemy.dialects import mysql
 from sqlalchemy.types import Integer, Unicode, UnicodeText, Boolean
 from sqlalchemy.orm import relation
+from sqlalchemy.orm.attributes import get_history
 
 from old.lib.utils import esc_RE_meta_chars, get_names_and_code_points
 from old.models.meta import Base, now
@@ -141,41 +144,105 @@ class ApplicationSettings(Base):
         'morpheme_break'. The ``db`` var (a ``DBUtils`` instance) must be
         supplied.
         """
-        fwt = db.foreign_word_transcriptions
         attr = '_' + type_ + '_inv'
         inv = getattr(self, attr, None)
         if inv:
             return inv
+        setattr(self, attr, Inventory(self.get_transcription_graphemes(
+            type_, db.foreign_word_transcriptions)))
+        return getattr(self, attr)
+
+    def get_transcription_graphemes(self, type_, fwt):
+        """Return the list of graphemes of the inventory of ``type_`` (cf.
+        ``get_transcription_inventory``), given the foreign word transcriptions
+        ``fwt``.
+        """
         if type_ == 'narrow_phonetic':
-            setattr(self, attr, Inventory(
-                getattr(fwt, type_) +
-                [' '] +
-                self.narrow_phonetic_inventory.split(',')))
-        elif type_ == 'broad_phonetic':
-            setattr(self, attr, Inventory(
-                getattr(fwt, type_) +
-                [' '] +
-                self.broad_phonetic_inventory.split(',')))
-        elif type_ == 'orthographic':
-            setattr(self, attr, Inventory(
-                getattr(fwt, type_) +
-                self.punctuation_list +
-                [' '] +
-                self.storage_orthography_list))
-        else:
-            if self.morpheme_break_is_orthographic:
-                setattr(self, attr, Inventory(
-                    getattr(fwt, type_) +
-                    self.morpheme_delimiters_list +
+            return (getattr(fwt, type_) +
+                    [' '] +
+                    self.narrow_phonetic_inventory.split(','))
+        if type_ == 'broad_phonetic':
+            return (getattr(fwt, type_) +
+                    [' '] +
+                    self.broad_phonetic_inventory.split(','))
+        if type_ == 'orthographic':
+            return (getattr(fwt, type_) +
+                    self.punctuation_list +
                     [' '] +
-                    self.storage_orthography_list))
-            else:
-                setattr(self, attr, Inventory(
-                    getattr(fwt, type_) +
+                    self.storage_orthography_list)
+        if self.morpheme_break_is_orthographic:
+            return (getattr(fwt, type_) +
                     self.morpheme_delimiters_list +
                     [' '] +
-                    self.phonemic_inventory.split(',')))
-        return getattr(self, attr)
+                    self.storage_orthography_list)
+        return (getattr(fwt, type_) +
+                self.morpheme_delimiters_list +
+                [' '] +
+                self.phonemic_inventory.split(','))
+
+
+class AppSettingsVersions(object):
+    """Process-wide version counters of the application settings of OLDs,
+    keyed by database URL. A version is bumped whenever a flush, commit or
+    rollback of a db session may have changed what is derived from the
+    application settings: the settings themselves, orthographies, tags (e.g.,
+    the restricted and foreign word tags) or forms tagged as foreign words.
+    Caches of such data (cf. ``old.lib.dbutils.APP_SETTINGS_CACHE``) are valid
+    only as long as the version they were built at.
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return self.versions.get(key, 0)
+
+    def bump(self, key):
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+
+APP_SETTINGS_VERSIONS = AppSettingsVersions()
+
+
+def _changes_app_settings(model):
+    model_name = type(model).__name__
+    if model_name in ('ApplicationSettings', 'Orthography', 'Tag'):
+        return True
+    if model_name == 'Form':
+        return any(tag.name == 'foreign word'
+                   for tag in get_history(model, 'tags').sum())
+    return False
+
+
+def bump_app_settings_version_on_flush(dbsession, flush_context):
+    """Bump the application settings version of the OLD if the flush changed
+    models that it covers. Registered as an ``after_flush`` listener of OLD db
+    sessions. The session is marked so that the version is bumped again when
+    the transaction ends: until then, other sessions could cache data from
+    before the change.
+    """
+    # pylint: disable=unused-argument
+    if any(_changes_app_settings(model) for model in
+           chain(dbsession.new, dbsession.dirty, dbsession.deleted)):
+        dbsession.info['app_settings_changed'] = True
+        APP_SETTINGS_VERSIONS.bump(str(dbsession.get_bind().url))
+
+
+def bump_app_settings_version_on_end(dbsession):
+    """Registered as an ``after_commit`` and ``after_rollback`` listener of
+    OLD db sessions.
+    """
+    if dbsession.info.pop('app_settings_changed', False):
+        APP_SETTINGS_VERSIONS.bump(str(dbsession.get_bind().url))
+
+
+def bump_app_settings_version_on_drop(target, connection, **kwargs):
+    """Registered as an ``after_drop`` listener of the OLD metadata."""
+    # pylint: disable=unused-argument
+    APP_SETTINGS_VERSIONS.bump(str(connection.engine.url))
+
 
 def _get_regex_validator(input_list):
     """Returns a regex that matches only strings composed of zero or more
@@ -185,16 +252,51 @@ def _get_regex_validator(input_list):
     return '^(%s)*$' % disj_patt
 
 
+# The key of the trie nodes that end a grapheme, whose value is the index of
+# the (first) grapheme in the inventory's input list that ends there.
+_END = None
+
+
+def _get_grapheme_trie(input_list):
+    trie = {}
+    for index, grapheme in enumerate(input_list):
+        if not grapheme:
+            continue
+        node = trie
+        for char in grapheme:
+            node = node.setdefault(char, {})
+        node.setdefault(_END, index)
+    return trie
+
+
+InventoryValidation = namedtuple('InventoryValidation',
+                                 ['is_valid', 'invalid_spans'])
+
+
 class Inventory:
     """An inventory is a set of graphemes/polygraphs/characters. Initialization
     requires a list.
+
+    Strings are validated against a trie of the graphemes, built once, in time
+    linear in the length of the string (times that of the longest grapheme),
+    instead of against an alternation regex of all of the graphemes, which is
+    slow to compile and can backtrack heavily when the inventory holds
+    thousands of foreign words. The results are those of the regexes: a string
+    is valid if some concatenation of graphemes yields it, and the invalid
+    spans are what splitting the string on runs of graphemes, each the first
+    listed grapheme that matches, leaves over. (Empty graphemes are ignored.)
     """
     def __init__(self, input_list):
         self.input_list = input_list
-        self.inventory_with_unicode_metadata = [
-            get_names_and_code_points(g) for g in self.input_list]
-        self.regex_validator = _get_regex_validator(input_list)
-        self.compiled_regex_validator = re.compile(self.regex_validator)
+        self.trie = _get_grapheme_trie(input_list)
+
+    @property
+    def inventory_with_unicode_metadata(self):
+        return [get_names_and_code_points(g) for g in self.input_list]
+
+    @property
+    def regex_validator(self):
+        return _get_regex_validator(self.input_list)
 
     def get_input_list(self):
         return self.input_list
@@ -206,18 +308,75 @@ class Inventory:
         """Return a list of substrings of string that are not constructable
         using the inventory.  This is useful for showing invalid substrings.
         """
-        regex = '|'.join([esc_RE_meta_chars(g) for g in self.input_list])
-        regex = '(%s)+' % regex
-        patt = re.compile(regex)
-        list_ = patt.split(string)
-        non_matching_substrings = [
-            esc_RE_meta_chars(x) for x in list_[::2] if x]
-        return non_matching_substrings
+        return [esc_RE_meta_chars(string[start:end]) for start, end in
+                self.validate(string).invalid_spans]
 
     def string_is_valid(self, string):
         """Return False if string cannot be generated by concatenating the
         elements of the orthography; otherwise, return True.
         """
-        if self.compiled_regex_validator.match(string):
-            return True
-        return False
+        return self.validate(string).is_valid
+
+    def validate(self, string):
+        """Validate ``string`` in one pass and return an
+        ``InventoryValidation``: whether the string is valid and the
+        (start, end) spans of its substrings that are not constructable using
+        the inventory.
+        """
+        length = len(string)
+        # reachable[i] is True if string[:i] is a concatenation of graphemes.
+        reachable = [False] * (length + 1)
+        reachable[0] = True
+        invalid_spans = []
+        cursor = 0  # The position after the current run of graphemes.
+        gap_start = None
+        for position in range(length):
+            if not reachable[position] and position != cursor:
+                continue
+            matches = self._get_matches(string, position)
+            if reachable[position]:
+                for _, end in matches:
+                    reachable[end] = True
+            if position == cursor:
+                if matches:
+                    if gap_start is not None:
+                        invalid_spans.append((gap_start, position))
+                        gap_start = None
+                    cursor = min(matches)[1]
+                else:
+                    if gap_start is None:
+                        gap_start = position
+                    cursor = position + 1
+        if gap_start is not None:
+            invalid_spans.append((gap_start, length))
+        # Like the regex's $, a trailing newline is tolerated.
+        is_valid = reachable[length] or (
+            string.endswith('\n') and reachable[length - 1])
+        return InventoryValidation(is_valid, invalid_spans)
+
+    def validate_many(self, strings):
+        """Validate each string in ``strings`` (e.g., the transcriptions of a
+        bulk import) and return the list of their ``InventoryValidation``s.
+        Repeated strings are validated once.
+        """
+        validations = {}
+        result = []
+        for string in strings:
+            if string not in validations:
+                validations[string] = self.validate(string)
+            result.append(validations[string])
+        return result
+
+    def _get_matches(self, string, position):
+        """Return the (input list index, end) pairs of the graphemes that
+        occur in ``string`` at ``position``.
+        """
+        matches = []
+        node = self.trie
+        for index in range(position, len(string)):
+            node = node.get(string[index])
+            if node is None:
+                break
+            if _END in node:
+                matches.append((node[_END], index + 1))
+        return matches
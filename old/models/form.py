@@ -18,6 +18,7 @@ from sqlalchemy import Column, Sequence, ForeignKey
 from sqlalchemy.dialects import mysql
 from sqlalchemy.types import Integer, Unicode, UnicodeText, Date
 from sqlalchemy.orm import relation
+from sqlalchemy.sql import select
 from .meta import Base, now
 
 
@@ -144,6 +145,94 @@ class Form(Base):
             'files': self.get_files_list(self.files)
         }
 
+    # The relations of forms in their dicts, cf. ``get_dicts``.
+    scalar_relations = ('elicitor', 'enterer', 'modifier', 'verifier',
+                        'speaker', 'elicitation_method', 'syntactic_category',
+                        'source')
+    collection_relations = ('translations', 'tags', 'files')
+
+    @classmethod
+    def get_dicts(cls, dbsession, ids):
+        """Return the dicts of the forms with the ids in ``ids``, in that
+        order, as ``get_dict`` would return them. Instead of loading form
+        models and their relations, only the columns that the dicts need are
+        selected, with one query for the forms and one per relation.
+        """
+        table = cls.__table__
+        forms = {row['id']: row for row in dbsession.execute(
+            select([table]).where(table.c.id.in_(ids)))}
+        mini_dicts = {}
+        for name in cls.scalar_relations:
+            prop = getattr(cls, name).property
+            column = list(prop.local_columns)[0]
+            mini_dicts[name] = prop.mapper.class_.get_mini_dicts(
+                dbsession, [row[column.name] for row in forms.values()])
+        lists = {}
+        for name in cls.collection_relations:
+            lists[name] = cls._get_collection_mini_dicts(dbsession, name, ids)
+        dicts = []
+        for id_ in ids:
+            row = forms.get(id_)
+            if row is None:
+                continue
+            form_dict = {
+                'id': row['id'],
+                'UUID': row['UUID'],
+                'transcription': row['transcription'],
+                'phonetic_transcription': row['phonetic_transcription'],
+                'narrow_phonetic_transcription': row['narrow_phonetic_transcription'],
+                'morpheme_break': row['morpheme_break'],
+                'morpheme_gloss': row['morpheme_gloss'],
+                'comments': row['comments'],
+                'speaker_comments': row['speaker_comments'],
+                'grammaticality': row['grammaticality'],
+                'date_elicited': row['date_elicited'],
+                'datetime_entered': row['datetime_entered'],
+                'datetime_modified': row['datetime_modified'],
+                'syntactic_category_string': row['syntactic_category_string'],
+                'morpheme_break_ids': cls.json_loads(row['morpheme_break_ids']),
+                'morpheme_gloss_ids': cls.json_loads(row['morpheme_gloss_ids']),
+                'break_gloss_category': row['break_gloss_category'],
+                'syntax': row['syntax'],
+                'semantics': row['semantics'],
+                'status': row['status']
+            }
+            for name in cls.scalar_relations:
+                column = list(getattr(cls, name).property.local_columns)[0]
+                form_dict[name] = mini_dicts[name].get(row[column.name])
+            for name in cls.collection_relations:
+                form_dict[name] = lists[name].get(id_, [])
+            dicts.append(form_dict)
+        return dicts
+
+    @classmethod
+    def _get_collection_mini_dicts(cls, dbsession, name, ids):
+        """Return a dict from the ids in ``ids`` to the lists of the
+        mini-dicts of the models in the forms' ``name`` collection, in the
+        order in which they were added to it.
+        """
+        prop = getattr(cls, name).property
+        model_cls = prop.mapper.class_
+        if prop.secondary is None:
+            link_table = model_cls.__table__
+            target_column = link_table.c.id
+        else:
+            link_table = prop.secondary
+            target_column = [c for c in link_table.c
+                             if c.references(model_cls.__table__.c.id)][0]
+        form_column = [c for c in link_table.c
+                       if c.references(cls.__table__.c.id)][0]
+        links = dbsession.execute(
+            select([form_column, target_column]).where(
+                form_column.in_(ids)).order_by(link_table.c.id)).fetchall()
+        mini_dicts = model_cls.get_mini_dicts(
+            dbsession, [target_id for _, target_id in links])
+        lists = {}
+        for form_id, target_id in links:
+            if target_id in mini_dicts:
+                lists.setdefault(form_id, []).append(mini_dicts[target_id])
+        return lists
+
     def extract_word_pos_sequences(self, unknown_category, morpheme_splitter,
                                    extract_morphemes=False):
         """Return the unique word-based pos sequences, as well as (possibly)
@@ -0,0 +1,80 @@
+# Copyright 2016 Joel Dunham
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Job model
+
+A job is a request to run one of the functions of :mod:`old.lib.foma_worker`
+(e.g., compiling a phonology or generating a language model) in a worker
+process. The job table records each job's status, progress and timing so that
+clients can follow (and cancel) jobs via ``/jobs/{id}``.
+"""
+
+from sqlalchemy import Column, Sequence, ForeignKey
+from sqlalchemy.dialects import mysql
+from sqlalchemy.types import Integer, Unicode, UnicodeText, Float
+from sqlalchemy.orm import relation
+
+from old.models.meta import Base, now
+
+
+class Job(Base):
+
+    __tablename__ = 'job'
+
+    def __repr__(self):
+        return '<Job (%s)>' % self.id
+
+    id = Column(Integer, Sequence('job_seq_id', optional=True), primary_key=True)
+    UUID = Column(Unicode(36))
+    func = Column(Unicode(255))
+    model_name = Column(Unicode(255))
+    model_id = Column(Integer)
+    # Hash of the job's func, model and arguments; used to deduplicate pending
+    # jobs.
+    signature = Column(Unicode(32))
+    # JSON object of the func's keyword arguments (minus the settings).
+    args = Column(UnicodeText)
+    # One of oldc.JOB_STATUSES
+    status = Column(Unicode(20), default='pending')
+    priority = Column(Integer, default=0)
+    progress = Column(Float, default=0.0)
+    message = Column(Unicode(255))
+    pid = Column(Integer)
+    # "<hostname>:<pid>" of the web server process whose queue holds the job.
+    worker = Column(Unicode(255))
+    enterer_id = Column(Integer, ForeignKey('user.id', ondelete='SET NULL'))
+    enterer = relation('User')
+    datetime_entered = Column(mysql.DATETIME(fsp=6), default=now)
+    datetime_started = Column(mysql.DATETIME(fsp=6))
+    datetime_finished = Column(mysql.DATETIME(fsp=6))
+    datetime_modified = Column(mysql.DATETIME(fsp=6), default=now)
+
+    def get_dict(self):
+        return {
+            'id': self.id,
+            'UUID': self.UUID,
+            'func': self.func,
+            'model_name': self.model_name,
+            'model_id': self.model_id,
+            'args': self.json_loads(self.args),
+            'status': self.status,
+            'priority': self.priority,
+            'progress': self.progress,
+            'message': self.message,
+            'enterer': self.get_mini_user_dict(self.enterer),
+            'datetime_entered': self.datetime_entered,
+            'datetime_started': self.datetime_started,
+            'datetime_finished': self.datetime_finished,
+            'datetime_modified': self.datetime_modified
+        }
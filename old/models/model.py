@@ -18,8 +18,10 @@ import json
 import logging
 
 import inflect
+from sqlalchemy.sql import select
 
-from old.lib.constants import OLD_NAME_DFLT
+from old.lib.constants import GET_DICTS_BATCH_SIZE, OLD_NAME_DFLT
+from old.lib.utils import chunker
 
 inflect_p = inflect.engine()
 inflect_p.classical()
@@ -42,6 +44,7 @@ class URL:
     RSRC_NEW_SRCH_PATH = '/{old_name}/{collection_name}/new_search'
     RSRC_HIST_PATH = '/{old_name}/{collection_name}/{id_}/history'
     RSRC_SRCH_POST_PATH = '/{old_name}/{collection_name}/search'
+    RSRC_EXPORT_PATH = '/{old_name}/{collection_name}/export'
 
     def __init__(self, collection_name='resources', old_name=OLD_NAME_DFLT):
         self.collection_name = collection_name
@@ -80,6 +83,10 @@ class URL:
             return self.RSRC_SRCH_POST_PATH.format(
                 collection_name=self.collection_name,
                 old_name=self.old_name)
+        if route_name == 'export':
+            return self.RSRC_EXPORT_PATH.format(
+                collection_name=self.collection_name,
+                old_name=self.old_name)
         return None
 
 
@@ -166,6 +173,61 @@ class Model(object):
         except AttributeError:
             return None
 
+    @classmethod
+    def get_dicts(cls, dbsession, ids):
+        """Return the dicts (cf. ``get_dict``) of the models with the primary
+        key values in ``ids``, in that order.
+        """
+        # pylint: disable=no-member,import-outside-toplevel
+        from old.lib.dbutils import get_eagerloader
+        primary_key = cls.__mapper__.primary_key[0]
+        key = cls.__mapper__.get_property_by_column(primary_key).key
+        query = get_eagerloader(cls.__name__)(dbsession.query(cls))
+        models = {getattr(model, key): model for model in
+                  query.filter(primary_key.in_(ids))}
+        return [models[id_].get_dict() for id_ in ids if id_ in models]
+
+    @classmethod
+    def get_mini_dicts(cls, dbsession, ids):
+        """Return a dict from the ids in ``ids`` to the mini-dicts of the
+        corresponding models, as ``get_mini_dict`` would return them, selecting
+        only the columns that they need.
+        """
+        # pylint: disable=no-member
+        attrs = cls.table_name2core_attributes.get(cls.__tablename__, [])
+        table = cls.__table__
+        columns = [table.c[attr] for attr in attrs if attr != 'crossref_source']
+        if 'crossref_source' in attrs:
+            columns.append(table.c.crossref_source_id)
+        rows = {}
+        ids = set(ids) - {None}
+        while ids:
+            for batch in chunker(sorted(ids), GET_DICTS_BATCH_SIZE):
+                for row in dbsession.execute(
+                        select(columns).where(table.c.id.in_(batch))):
+                    rows[row['id']] = row
+            # Sources also need the mini-dicts of their crossref sources.
+            ids = set()
+            if 'crossref_source' in attrs:
+                ids = set(row['crossref_source_id'] for row in rows.values())
+                ids -= set(rows) | {None}
+        mini_dicts = {}
+
+        def get_mini_dict(id_):
+            if id_ not in mini_dicts:
+                row = rows[id_]
+                mini_dict = {}
+                for attr in attrs:
+                    if attr != 'crossref_source':
+                        mini_dict[attr] = row[attr]
+                    elif row['crossref_source_id'] in rows:
+                        mini_dict[attr] = get_mini_dict(
+                            row['crossref_source_id'])
+                mini_dicts[id_] = mini_dict
+            return mini_dicts[id_]
+
+        return {id_: get_mini_dict(id_) for id_ in rows}
+
     @staticmethod
     def json_loads(JSONString):
         try:
@@ -37,6 +37,9 @@ with the parser's cache is mediated via a ``Cache`` instance (see below) that
 provides a standardized interface to cached parses (i.e., self.cache[k],
 self.cache[k] = v, self.cache.get(k, default), self.cache.update() and
 self.cache.clear()), cf. ``lib/parser.py`` for a pickle-based Cache class.
+A ``Cache`` reads the parses of a whole parse batch from the ``parse`` table
+with one query (``self.cache.prefetch(keys)``) and keeps the parses it has seen
+in ``PARSES``, a process-wide LRU shared by the caches of all requests.
 
 The following attributes are those crucial to parsing functionality. (Note
 that the files that are crucial to a parser's parsing functionality are
@@ -97,6 +100,7 @@ that the files that are crucial to a parser's parsing functionality are
     and to pass a suitable input to the ``get_most_probable`` method.
 """
 
+from collections import OrderedDict
 import codecs
 from hashlib import md5
 import json
@@ -104,6 +108,7 @@ import logging
 import os
 import re
 from shutil import copyfile
+import threading
 from uuid import uuid4
 
 from sqlalchemy import Column, Sequence, ForeignKey
@@ -111,6 +116,7 @@ from sqlalchemy.dialects import mysql
 from sqlalchemy.types import Integer, Unicode, UnicodeText, Boolean
 from sqlalchemy.orm import relation
 
+import old.lib.constants as oldc
 from old.lib.parser import MorphologicalParser as MorphologicalParser_
 from old.lib.parser import LanguageModel, MorphologyFST, PhonologyFST
 from old.models.meta import Base, now
@@ -173,6 +179,7 @@ class MorphologicalParser(MorphologicalParser_, Base):
     generate_succeeded = Column(Boolean, default=False)
     generate_message = Column(Unicode(255))
     generate_attempt = Column(Unicode(36)) # a UUID
+    lookup_backend = Column(Unicode(10), default='flookup')
 
     # MorphologicalParser().parses is a collection of cached parse objects,
     # i.e., a mapping from transcriptions to parses.
@@ -217,7 +224,8 @@ class MorphologicalParser(MorphologicalParser_, Base):
             'generate_succeeded': self.generate_succeeded,
             'generate_message': self.generate_message,
             'generate_attempt': self.generate_attempt,
-            'morphology_rare_delimiter': self.morphology_rare_delimiter
+            'morphology_rare_delimiter': self.morphology_rare_delimiter,
+            'lookup_backend': self.lookup_backend
         }
 
     def compile(self, timeout=30*60, verification_string=None):
@@ -319,27 +327,24 @@ class MorphologicalParser(MorphologicalParser_, Base):
                 f.write('define morphophonology ?*;\n')
 
     def replicate_lm(self):
-        """Copy the parser's LM's trie pickle and ARPA files to the parser's
+        """Copy the parser's LM's trie and ARPA files to the parser's
         directory.
 
-        If this results in a new trie pickle or arpa file being written, set
-        ``self.changed = True``.
+        If this results in a new trie or arpa file being written, set
+        ``self.changed = True``. The trie file is hard-linked where possible so
+        that the LM and its parsers share one memory-mapped copy of it.
         """
         trie_path = self.language_model.get_file_path('trie')
         arpa_path = self.language_model.get_file_path('arpa')
         my_language_model = LanguageModel(parent_directory=self.directory)
         replicated_trie_path = my_language_model.get_file_path('trie')
         replicated_arpa_path = my_language_model.get_file_path('arpa')
-        self.copy_file(trie_path, replicated_trie_path)
+        self.copy_file(trie_path, replicated_trie_path, link=True)
         self.copy_file(arpa_path, replicated_arpa_path)
         try:
             del self._my_language_model
         except AttributeError:
             pass
-        try:
-            del self.language_model._trie
-        except AttributeError:
-            pass
 
     def replicate_morphology(self):
         """Copy the parser's morphology's foma script and dictionary pickle
@@ -380,9 +385,14 @@ class MorphologicalParser(MorphologicalParser_, Base):
             replicated_binary_path = my_phonology.get_file_path('binary')
             self.copy_file(binary_path, replicated_binary_path)
 
-    def copy_file(self, src, dst):
+    def copy_file(self, src, dst, link=False):
         """Copy the file at ``src`` to ``dst``.
 
+        The copy is written to a temporary file which then atomically replaces
+        ``dst``, so that processes which have ``dst`` open (or memory-mapped)
+        keep seeing its old contents. If ``link`` is ``True``, ``dst`` is made
+        a hard link to ``src`` instead of a copy, if the file system allows it.
+
         Set ``self.changed`` to ``True`` if the copying results in a change to
         the file at ``dst``.  Note that we only perform the (potentially
         expensive) check for a change to the destination file if
@@ -395,7 +405,19 @@ class MorphologicalParser(MorphologicalParser_, Base):
             if os.path.isfile(dst):
                 dst_existed = True
                 pre_hash = self.get_hash(dst)
-        copyfile(src, dst)
+        temp_path = '%s.%s.tmp' % (dst, uuid4().hex)
+        try:
+            if link:
+                try:
+                    os.link(src, temp_path)
+                except OSError:
+                    copyfile(src, temp_path)
+            else:
+                copyfile(src, temp_path)
+            os.replace(temp_path, dst)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
         if not self.changed:
             if dst_existed:
                 post_hash = self.get_hash(dst)
@@ -524,6 +546,59 @@ class MorphologicalParser(MorphologicalParser_, Base):
         self._cache = value
 
 
+class ParseRegistry(object):
+    """Process-wide LRU of parses, i.e., of (parse, candidates) pairs keyed by
+    (parser id, transcription). It holds at most ``max_entries`` parses over
+    all parsers, evicting the least recently used ones first.
+
+    Each parser's parses are stamped with the parser's UUID and modification
+    time. The parses of a parser are evicted as soon as it is seen with a
+    different stamp, e.g., because a foma worker process recompiled it and
+    cleared its persisted parses or because its id was reused.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.parses = OrderedDict()
+        self.stamps = {}
+        self.lock = threading.Lock()
+
+    def sync(self, parser_id, stamp):
+        with self.lock:
+            if self.stamps.get(parser_id) != stamp:
+                self._evict(parser_id)
+                self.stamps[parser_id] = stamp
+
+    def get(self, parser_id, transcription):
+        key = (parser_id, transcription)
+        with self.lock:
+            try:
+                self.parses.move_to_end(key)
+            except KeyError:
+                return None
+            return self.parses[key]
+
+    def set(self, parser_id, transcription, value):
+        key = (parser_id, transcription)
+        with self.lock:
+            self.parses[key] = value
+            self.parses.move_to_end(key)
+            while len(self.parses) > self.max_entries:
+                self.parses.popitem(last=False)
+
+    def recycle(self, parser_id):
+        with self.lock:
+            self._evict(parser_id)
+            self.stamps.pop(parser_id, None)
+
+    def _evict(self, parser_id):
+        for key in [key for key in self.parses if key[0] == parser_id]:
+            del self.parses[key]
+
+
+PARSES = ParseRegistry(oldc.PARSE_CACHE_MAX_ENTRIES)
+
+
 class Cache(object):
     """For caching parses; an interface to the MorphologicalParser().parses
     collection, a one-to-many relation.
@@ -536,77 +611,98 @@ class Cache(object):
     - ``__setitem__(k, v)``
     - ``__getitem__(k)``
     - ``get(k, default)``
+    - ``prefetch(keys)``
     - ``persist()``
     - ``clear()``
+
+    Parses are looked up in the process-wide ``PARSES`` LRU first. The keys
+    that it lacks are read from the db with one query per ``prefetch`` call.
+    Keys set via ``__setitem__`` that are not in the db are tracked as dirty
+    and ``persist()`` bulk-inserts exactly those.
     """
 
     def __init__(self, parser, settings, session_getter):
-        # LOGGER.warn('DB CACHE CONSTRUCTED!')
-        self.updated = False # means that ``self._store`` is in sync with persistent cache
         self.parser = parser
-        self._store = {}
+        self.parser_id = parser.id
         self.settings = settings
         self.session_getter = session_getter
+        self._dirty = {}
+        # Keys known to have no persisted parse.
+        self._missing = set()
+        PARSES.sync(parser.id, (parser.UUID, parser.datetime_modified))
+
+    @property
+    def updated(self):
+        """True if there are parses that have not been persisted."""
+        return bool(self._dirty)
 
     def __setitem__(self, k, v):
-        # LOGGER.warn('DB_CACHE[%s] = %s CALLED' % (k, v))
-        if k not in self._store:
-            self.updated = True
-        self._store[k] = v
+        if k not in self._dirty and PARSES.get(self.parser_id, k) is None:
+            self._dirty[k] = v
+        PARSES.set(self.parser_id, k, v)
 
     def __getitem__(self, k):
-        try:
-            return self._store[k]
-        except KeyError as e:
-            try:
-                dbsession = self.session_getter(self.settings)
-                dbsession.expunge_all()
-                parse = dbsession.query(Parse).filter(
-                    Parse.parser_id == self.parser.id).filter(
-                        Parse.transcription == k).first()
-                if parse:
-                    # LOGGER.warn('GOT %s FROM DB IN DB_CACHE' % k)
-                    self._store[k] = parse.parse, json.loads(parse.candidates)
-                    return self._store[k]
-                else:
-                    raise e
-            finally:
-                dbsession.commit()
-                dbsession.close()
+        value = self._dirty.get(k)
+        if value is None:
+            value = PARSES.get(self.parser_id, k)
+        if value is None and k not in self._missing:
+            self.prefetch([k])
+            value = PARSES.get(self.parser_id, k)
+        if value is None:
+            raise KeyError(k)
+        return value
 
     def get(self, k, default=None):
         try:
             return self[k]
         except KeyError:
-            # LOGGER.warn('DB_CACHE.get(%s, %s) RETURNED %s' % (k, default, default))
             return default
 
     def update(self, dict_, **kwargs):
-        old_keys = self._store.keys()
-        self._store.update(dict_, **kwargs)
-        if set(old_keys) != set(self._store.keys()):
-            self.updated = True
+        for k, v in dict(dict_, **kwargs).items():
+            self[k] = v
+
+    def prefetch(self, keys):
+        """Read the persisted parses of all of ``keys`` that are neither in
+        ``PARSES`` nor known to be missing with a single query.
+        """
+        keys = {k for k in keys if k not in self._missing and k not in
+                self._dirty and PARSES.get(self.parser_id, k) is None}
+        if not keys:
+            return
+        try:
+            dbsession = self.session_getter(self.settings)
+            dbsession.expunge_all()
+            rows = dbsession.query(
+                Parse.transcription, Parse.parse, Parse.candidates).filter(
+                    Parse.parser_id == self.parser_id).filter(
+                        Parse.transcription.in_(keys)).all()
+            for transcription, parse, candidates in rows:
+                PARSES.set(self.parser_id, transcription,
+                           (parse, json.loads(candidates)))
+                keys.discard(transcription)
+            self._missing.update(keys)
+        finally:
+            dbsession.commit()
+            dbsession.close()
 
     def persist(self):
-        """Update the persistence layer with the value of ``self._store``.
+        """Bulk-insert the dirty (i.e., new) parses into the ``parse`` table.
         """
-        if self.updated:
+        if self._dirty:
             try:
                 dbsession = self.session_getter(self.settings)
-                persisted = [
-                    parse.transcription for parse in dbsession.query(Parse).\
-                    filter(Parse.parser_id == self.parser.id).\
-                    filter(Parse.transcription.in_(self._store.keys())).all()]
-                unpersisted = [Parse(transcription=transcription,
-                                     parse=parse,
-                                     candidates=self.json_dumps_candidates(
-                                         candidates),
-                                     parser=self.parser)
-                               for transcription, (parse, candidates)
-                               in self._store.items()
-                               if transcription not in persisted]
-                dbsession.add_all(unpersisted)
-                self.updated = False
+                now_ = now()
+                dbsession.execute(Parse.__table__.insert(), [
+                    {'transcription': transcription,
+                     'parse': parse,
+                     'candidates': self.json_dumps_candidates(candidates),
+                     'parser_id': self.parser_id,
+                     'datetime_modified': now_}
+                    for transcription, (parse, candidates)
+                    in self._dirty.items()])
+                self._missing.difference_update(self._dirty)
+                self._dirty = {}
             finally:
                 dbsession.commit()
                 dbsession.close()
@@ -626,28 +722,29 @@ class Cache(object):
         the course of generating and compiling the parser's files, the parser
         changes.
         """
-        self._store = {}
+        self._dirty = {}
+        self._missing = set()
+        PARSES.recycle(self.parser_id)
         if persist:
             try:
                 dbsession = self.session_getter(self.settings)
                 delete = Parse.__table__.delete().where(
-                    Parse.__table__.c.parser_id == self.parser.id)
+                    Parse.__table__.c.parser_id == self.parser_id)
                 dbsession.execute(delete)
             finally:
                 dbsession.commit()
                 dbsession.close()
 
     def export(self):
-        """Update the local store with the persistence layer and return the
-        store.
+        """Return a dict of all of the parser's parses, persisted or not.
         """
         try:
             dbsession = self.session_getter(self.settings)
             persisted = {p.transcription: (p.parse, json.loads(p.candidates))
                          for p in dbsession.query(Parse).filter(
-                             Parse.parser_id == self.parser.id).all()}
-            self._store.update(persisted)
-            return self._store
+                             Parse.parser_id == self.parser_id).all()}
+            persisted.update(self._dirty)
+            return persisted
         finally:
             dbsession.commit()
             dbsession.close()
@@ -47,6 +47,7 @@ class MorphologicalParserBackup(Base):
     compile_succeeded = Column(Boolean, default=False)
     compile_message = Column(Unicode(255))
     compile_attempt = Column(Unicode(36)) # a UUID
+    lookup_backend = Column(Unicode(10), default='flookup')
 
     def vivify(self, morphological_parser_dict):
         """The vivify method gives life to a morphology_backup by specifying its
@@ -69,6 +70,7 @@ class MorphologicalParserBackup(Base):
         self.compile_succeeded = morphological_parser_dict['compile_succeeded']
         self.compile_message = morphological_parser_dict['compile_message']
         self.compile_attempt = morphological_parser_dict['compile_attempt']
+        self.lookup_backend = morphological_parser_dict['lookup_backend']
 
     def get_dict(self):
         return {
@@ -91,5 +93,6 @@ class MorphologicalParserBackup(Base):
             'datetime_modified': self.datetime_modified,
             'compile_succeeded': self.compile_succeeded,
             'compile_message': self.compile_message,
-            'compile_attempt': self.compile_attempt
+            'compile_attempt': self.compile_attempt,
+            'lookup_backend': self.lookup_backend
         }
@@ -19,6 +19,7 @@ import hashlib
 import logging
 import os
 import pickle
+from uuid import uuid4
 
 from sqlalchemy import Column, Sequence, ForeignKey
 from sqlalchemy.dialects import mysql
@@ -228,6 +229,14 @@ class Morphology(MorphologyFST, Base):
             morphology model because it is potentially huge, i.e., tens to
             hundreds of MB.
 
+        .. note::
+
+            A regex morphology is compiled incrementally: the lexicon of each
+            category is also written to a content-addressed fragment script
+            (see ``_write_regex_script``) and the compiler loads the compiled
+            fragments and only compiles the word formation rules, which are
+            written to their own script.
+
         """
         # pylint: disable=attribute-defined-outside-init
         self.unknown_category = unknown_category
@@ -240,19 +249,68 @@ class Morphology(MorphologyFST, Base):
         script_path = self.get_file_path('script')
         binary_path = self.get_file_path('binary')
         compiler_path = self.get_file_path('compiler')
-        with open(compiler_path, 'w') as f:
-            if self.script_type == 'lexc':
+        if self.script_type == 'lexc':
+            self.prune_fragments(())
+            with open(compiler_path, 'w') as f:
                 f.write('#!/bin/sh\nfoma -e "read lexc %s" -e "save stack %s"'
                         ' -e "quit"' % (script_path, binary_path))
-            else:
-                f.write('#!/bin/sh\nfoma -e "source %s" -e "regex morphology;" '
+            morphology_generator = self.get_morphology_generator(rules, lexicon)
+            with codecs.open(script_path, 'w', 'utf8') as f:
+                for line in morphology_generator:
+                    f.write(line)
+        else:
+            fragments = self._write_regex_script(rules, lexicon)
+            self.prune_fragments(
+                set(fragment_hash for _, fragment_hash in fragments))
+            rules_script_path = self.get_file_path('rules_script')
+            with codecs.open(rules_script_path, 'w', 'utf8') as f:
+                for line in self._get_word_formation_rules_generator(rules):
+                    f.write(line)
+            with open(compiler_path, 'w') as f:
+                f.write('#!/bin/sh\nfoma')
+                for foma_regex_name, fragment_hash in fragments:
+                    f.write(' -e "load stack %s" -e "define %s;"' % (
+                        self.get_fragment_path(fragment_hash, binary=True),
+                        foma_regex_name))
+                f.write(' -e "source %s" -e "regex morphology;" '
                         '-e "save stack %s" -e "quit"' % (
-                            script_path, binary_path))
+                            rules_script_path, binary_path))
         os.chmod(compiler_path, 0o744)
-        morphology_generator = self.get_morphology_generator(rules, lexicon)
-        with codecs.open(script_path, 'w', 'utf8') as f:
-            for line in morphology_generator:
+
+    def _write_regex_script(self, pos_sequences, morphemes):
+        """Write the regex morphology script and, while doing so, write the
+        lexicon of each category to a fragment script named by the MD5 hash of
+        its content.
+
+        :param list pos_sequences: tuples containing categories and delimiters
+        :param dict morphemes: keys are categories, values are lists of (form,
+            gloss) 2-tuples
+        :returns: list of (foma regex name, fragment hash) 2-tuples.
+        """
+        self.make_directory_safely(self.fragments_directory)
+        tmp_path = os.path.join(self.fragments_directory,
+                                '%s.tmp' % uuid4().hex)
+        fragments = []
+        with codecs.open(self.get_file_path('script'), 'w', 'utf8') as f:
+            for foma_regex_name, lines in self._get_lexicon_definitions(
+                    morphemes):
+                md5 = hashlib.md5()
+                f.write(u'define %s [\n' % foma_regex_name)
+                with codecs.open(tmp_path, 'w', 'utf8') as fragment:
+                    fragment.write(u'regex [\n')
+                    for line in lines:
+                        f.write(line)
+                        fragment.write(line)
+                        md5.update(line.encode('utf8'))
+                    fragment.write(u'];\n')
+                f.write(u'];\n\n')
+                fragment_hash = md5.hexdigest()
+                os.replace(tmp_path, self.get_fragment_path(fragment_hash))
+                fragments.append((foma_regex_name, fragment_hash))
+            f.write(u'\n\n')
+            for line in self._get_word_formation_rules_generator(pos_sequences):
                 f.write(line)
+        return fragments
 
     def get_morphology_generator(self, pos_sequences, morphemes):
         """Return a generator that yields lines of a foma morphology script.
@@ -415,21 +473,37 @@ class Morphology(MorphologyFST, Base):
             is actually that defined in ``utils.rare_delimiter`` which, by
             default, is U+2980 'TRIPLE VERTICAL BAR DELIMITER'.
         """
-        delimiter = self.rare_delimiter
+        for foma_regex_name, lines in self._get_lexicon_definitions(morphemes):
+            yield u'define %s [\n' % foma_regex_name
+            for line in lines:
+                yield line
+            yield u'];\n\n'
+
+    def _get_lexicon_definitions(self, morphemes):
+        """Return a generator that yields a (foma regex name, lines) 2-tuple
+        for each category in ``morphemes``, where lines is a generator of the
+        disjuncts of the category's lexicon.
+        """
         for pos, data in sorted(morphemes.items()):
             foma_regex_name = self._get_valid_foma_regex_name(pos)
             if foma_regex_name:
-                yield u'define %s [\n' % foma_regex_name
-                if data:
-                    if not (self.rich_upper or self.rich_lower):
-                        data = sorted(set((mb, None) for mb, mg in data))
-                    for mb, mg in data[:-1]:
-                        yield u'    %s |\n' % self._get_morpheme_representation(
-                            mb=mb, mg=mg, pos=pos, delimiter=delimiter)
-                    yield u'    %s \n' % self._get_morpheme_representation(
-                        mb=data[-1][0], mg=data[-1][1], pos=pos,
-                        delimiter=delimiter)
-                yield u'];\n\n'
+                yield foma_regex_name, self._get_lexicon_disjuncts_generator(
+                    pos, data)
+
+    def _get_lexicon_disjuncts_generator(self, pos, data):
+        """Return a generator that yields the lines of the disjunction of the
+        morphemes in ``data``, i.e., the lexicon of category ``pos``.
+        """
+        delimiter = self.rare_delimiter
+        if data:
+            if not (self.rich_upper or self.rich_lower):
+                data = sorted(set((mb, None) for mb, mg in data))
+            for mb, mg in data[:-1]:
+                yield u'    %s |\n' % self._get_morpheme_representation(
+                    mb=mb, mg=mg, pos=pos, delimiter=delimiter)
+            yield u'    %s \n' % self._get_morpheme_representation(
+                mb=data[-1][0], mg=data[-1][1], pos=pos,
+                delimiter=delimiter)
 
     def _get_valid_foma_regex_name(self, candidate):
         """Return the candidate foma regex name with all reserved symbols
@@ -0,0 +1,148 @@
+# Copyright 2016 Joel Dunham
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Search trigram model
+
+The search trigram table is an inverted index from the (case-folded) trigrams
+of the values of the text attributes in ``INDEXED_ATTRIBUTES`` to the ids of
+the models that have them. :mod:`old.lib.SQLAQueryBuilder` uses it to narrow
+``like`` and ``regexp`` searches on those attributes to the models whose values
+contain every trigram of the literal parts of the pattern (cf.
+:mod:`old.lib.searchindex`).
+
+The index is kept up to date by ``update_search_index``, which listens for the
+flushes of OLD db sessions, and by ``add_to_search_index`` for models inserted
+in bulk; ``rebuild_search_index`` indexes a whole database, e.g., one created
+before the index existed.
+"""
+
+from sqlalchemy import Column, Index, Sequence
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.types import Integer, Unicode
+
+from old.models.meta import Base
+
+
+INDEXED_ATTRIBUTES = {
+    'Form': ('transcription', 'phonetic_transcription',
+             'narrow_phonetic_transcription', 'morpheme_break',
+             'morpheme_gloss'),
+    'Translation': ('transcription',),
+    'Collection': ('title', 'description', 'contents'),
+    'Source': ('title', 'author'),
+}
+
+
+class SearchTrigram(Base):
+
+    __tablename__ = 'searchtrigram'
+    __table_args__ = (
+        Index('ix_searchtrigram_lookup', 'model_name', 'attribute_name',
+              'trigram', 'model_id'),
+        Index('ix_searchtrigram_model', 'model_name', 'model_id'),
+        Base.__table_args__
+    )
+
+    def __repr__(self):
+        return '<SearchTrigram (%s)>' % self.id
+
+    id = Column(
+        Integer, Sequence('searchtrigram_seq_id', optional=True),
+        primary_key=True)
+    model_name = Column(Unicode(50))
+    attribute_name = Column(Unicode(50))
+    model_id = Column(Integer)
+    # Trigrams must be compared as binary strings: under a case- and
+    # accent-insensitive collation distinct trigrams of a pattern could match
+    # the same row and candidates would be missed.
+    trigram = Column(Unicode(3).with_variant(
+        mysql.VARCHAR(3, charset='utf8', collation='utf8_bin'), 'mysql'))
+
+
+def get_trigrams(text):
+    """Return the set of trigrams of the case-folded ``text``."""
+    if not isinstance(text, str):
+        return set()
+    text = text.casefold()
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+def _get_rows(model_name, model):
+    return [{'model_name': model_name,
+             'attribute_name': attribute_name,
+             'model_id': model.id,
+             'trigram': trigram}
+            for attribute_name in INDEXED_ATTRIBUTES[model_name]
+            for trigram in get_trigrams(getattr(model, attribute_name))]
+
+
+def update_search_index(dbsession, flush_context):
+    """Re-index the indexed models that the flush inserted, updated or
+    deleted. Registered as an ``after_flush`` listener of OLD db sessions, when
+    ``dbsession.new`` etc. still hold the flushed models and their attribute
+    histories.
+    """
+    table = SearchTrigram.__table__
+    stale = []
+    rows = []
+    for model in dbsession.new:
+        model_name = type(model).__name__
+        if model_name in INDEXED_ATTRIBUTES:
+            rows += _get_rows(model_name, model)
+    for model in dbsession.dirty:
+        model_name = type(model).__name__
+        if model_name in INDEXED_ATTRIBUTES and any(
+                get_history(model, attribute_name).has_changes()
+                for attribute_name in INDEXED_ATTRIBUTES[model_name]):
+            stale.append((model_name, model.id))
+            rows += _get_rows(model_name, model)
+    for model in dbsession.deleted:
+        model_name = type(model).__name__
+        if model_name in INDEXED_ATTRIBUTES:
+            stale.append((model_name, model.id))
+    for model_name, model_id in stale:
+        dbsession.execute(table.delete().where(
+            (table.c.model_name == model_name) &
+            (table.c.model_id == model_id)))
+    if rows:
+        dbsession.execute(table.insert(), rows)
+
+
+def add_to_search_index(dbsession, model_name, models):
+    """Index ``models``, which were inserted without the ORM and hence without
+    ``update_search_index`` seeing them (e.g., by bulk form imports). They need
+    only have an ``id`` and the attributes of ``model_name`` that are indexed.
+    """
+    rows = [row for model in models for row in _get_rows(model_name, model)]
+    if rows:
+        dbsession.execute(SearchTrigram.__table__.insert(), rows)
+
+
+def rebuild_search_index(dbsession):
+    """Index all of the indexed models in the database from scratch."""
+    # pylint: disable=import-outside-toplevel
+    import old.models as old_models
+    dbsession.execute(SearchTrigram.__table__.delete())
+    for model_name in INDEXED_ATTRIBUTES:
+        model_cls = getattr(old_models, model_name)
+        rows = []
+        for model in dbsession.query(model_cls).yield_per(1000):
+            rows += _get_rows(model_name, model)
+            if len(rows) >= 10000:
+                dbsession.execute(SearchTrigram.__table__.insert(), rows)
+                rows = []
+        if rows:
+            dbsession.execute(SearchTrigram.__table__.insert(), rows)
+    dbsession.commit()
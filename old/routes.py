@@ -42,6 +42,7 @@ RESOURCES = {
     },
     'formsearch': {'searchable': True},
     'formbackup': {'searchable': True},
+    'job': {},
     'keyboard': {'searchable': True},
     'language': {'searchable': True},
     'morphemelanguagemodel': {
@@ -87,6 +88,18 @@ def add_resource(config, member_name, rsrc_config=None):
     class_name = collection_name.capitalize()
     view_callable = 'old.views.{}.{}'.format(collection_name, class_name)
 
+    # Export routes. These precede the search and CRUD routes, whose paths
+    # would otherwise match /<collection_name>/export.
+    for route_name, path, request_method, attr in get_export_config(
+            collection_name, rsrc_config.get('searchable', False)):
+        config.add_route(route_name, path, request_method=request_method)
+        config.add_view(view_callable,
+                        attr=attr,
+                        route_name=route_name,
+                        request_method=request_method,
+                        renderer='json',
+                        decorator=get_auth_decorators(member_name, attr))
+
     # Search-related routes
     if rsrc_config.get('searchable', False):
         for route_name, path, request_method, attr in get_search_config(
@@ -323,6 +336,19 @@ def get_search_config(collection_name):
     )
 
 
+def get_export_config(collection_name, searchable):
+    """Return the route name, path, request method, and class attribute for
+    configuring the export of the resource with collection name
+    ``collection_name``, and of searches over it if it is ``searchable``.
+    """
+    path = '/{{old_name}}/{}/export'.format(collection_name)
+    config = [('export_{}'.format(collection_name), path, 'GET', 'export')]
+    if searchable:
+        config.append(('export_search_{}'.format(collection_name), path,
+                       ('POST', 'SEARCH'), 'export_search'))
+    return config
+
+
 def cors(request):
     request.response.status_int = 204
     return request.response
@@ -419,6 +445,15 @@ def _forms_special_routing(config):
                     request_method='POST',
                     renderer='json',
                     decorator=authenticate)
+    config.add_route('bulk_forms',
+                     '/{old_name}/forms/bulk',
+                     request_method='POST')
+    config.add_view('old.views.forms.Forms',
+                    attr='bulk',
+                    route_name='bulk_forms',
+                    request_method='POST',
+                    renderer='json',
+                    decorator=get_auth_decorators('form', 'create'))
     config.add_route('update_morpheme_references',
                      '/{old_name}/forms/update_morpheme_references',
                      request_method='PUT')
@@ -507,6 +542,15 @@ def _mp_special_routing(config):
                     request_method='PUT',
                     renderer='json',
                     decorator=authenticate)
+    config.add_route('mparser_bulkparse',
+                     '/{old_name}/morphologicalparsers/{id}/bulkparse',
+                     request_method='PUT')
+    config.add_view('old.views.morphologicalparsers.Morphologicalparsers',
+                    attr='bulkparse',
+                    route_name='mparser_bulkparse',
+                    request_method='PUT',
+                    renderer='json',
+                    decorator=authenticate)
     config.add_route('mparser_export',
                      '/{old_name}/morphologicalparsers/{id}/export',
                      request_method='GET')
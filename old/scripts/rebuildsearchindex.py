@@ -0,0 +1,65 @@
+# Copyright 2018 Joel Dunham
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Build the trigram search index of an existing OLD instance, creating its
+table if needed. Run this before setting ``search_index = 1`` for an OLD whose
+database was created without the index.
+"""
+
+import argparse
+import logging
+
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+)
+
+from old import (
+    db_session_factory_registry,
+    override_settings_with_env_vars
+)
+from old.models.searchtrigram import SearchTrigram, rebuild_search_index
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Rebuild the trigram search index of an OLD instance.')
+    parser.add_argument(
+        'config_file', metavar='CONFIG_FILE',
+        help='Path (relative or absolute) to the OLD config file, e.g.,'
+             'config.ini',
+        default='config.ini')
+    parser.add_argument(
+        'old_name', metavar='OLD_NAME',
+        help='The name of the OLD instance whose search index is rebuilt',
+        default='old')
+    return parser.parse_args()
+
+
+def main(argv=None):
+    args = get_args()
+    setup_logging(args.config_file)
+    settings = get_appsettings(args.config_file, options={})
+    settings['old_name'] = args.old_name
+    settings = override_settings_with_env_vars(settings)
+    dbsession = db_session_factory_registry.get_session(settings)()
+    try:
+        SearchTrigram.__table__.create(bind=dbsession.bind, checkfirst=True)
+        rebuild_search_index(dbsession)
+        LOGGER.info('Rebuilt the search index of old "%s".', args.old_name)
+    finally:
+        dbsession.close()
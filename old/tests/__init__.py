@@ -445,7 +445,8 @@ class TestView(TestCase):
             'phonology': '',
             'morphology': '',
             'language_model': '',
-            'description': ''
+            'description': '',
+            'lookup_backend': ''
         }
         self.orthography_create_params = {
             'name': '',
@@ -15,10 +15,12 @@
 import datetime
 import logging
 import json
+import re
 
 from old.lib.dbutils import DBUtils
 from old.tests import TestView
 from old.models import ApplicationSettings, User, Orthography
+from old.models.applicationsettings import Inventory
 import old.lib.helpers as h
 import old.models.modelbuilders as omb
 
@@ -510,3 +512,94 @@ class TestApplicationsettingsView(TestView):
             extra_environ=self.extra_environ_admin, status=404)
         assert response.json_body['error'] == \
             'There is no application settings with id %s' % id
+
+    def test_cache(self):
+        """Tests that the current application settings and the data that input
+        validation derives from them are cached and that changes to them, to
+        tags and to foreign words invalidate the cache.
+        """
+
+        dbsession = self.dbsession
+        application_settings = add_default_application_settings(dbsession)
+        snapshot = DBUtils(dbsession, self.settings).cached_app_set
+        assert DBUtils(dbsession, self.settings).cached_app_set is snapshot
+        assert snapshot.values['id'] == application_settings.id
+        assert snapshot.foreign_word_tag_id is None
+        assert snapshot.inventories['orthographic'].string_is_valid('bdg ms')
+        assert not snapshot.inventories['orthographic'].string_is_valid('John')
+
+        # Updating the application settings in a request invalidates the
+        # cache.
+        params = self.application_settings_create_params.copy()
+        params.update({'grammaticalities': '*,?',
+                       'morpheme_delimiters': '-,='})
+        response = self.app.put(
+            url('update', id=application_settings.id), json.dumps(params),
+            self.json_headers, self.extra_environ_admin)
+        assert response.json_body['grammaticalities'] == '*,?'
+        db = DBUtils(dbsession, self.settings)
+        assert db.cached_app_set is not snapshot
+        assert db.get_grammaticalities() == ['', '*', '?']
+        assert db.get_morpheme_delimiters() == ['-', '=']
+        snapshot = db.cached_app_set
+
+        # So do foreign words: their transcriptions are valid.
+        foreign_word_tag = omb.generate_foreign_word_tag()
+        dbsession.add(foreign_word_tag)
+        dbsession.commit()
+        db = DBUtils(dbsession, self.settings)
+        assert db.cached_app_set is not snapshot
+        assert db.get_foreign_word_tag_id() == foreign_word_tag.id
+        snapshot = db.cached_app_set
+        form = omb.generate_default_form()
+        form.transcription = 'John'
+        form.tags = [foreign_word_tag]
+        dbsession.add(form)
+        dbsession.commit()
+        db = DBUtils(dbsession, self.settings)
+        assert db.cached_app_set is not snapshot
+        assert db.foreign_word_transcriptions.orthographic == ['John']
+        assert db.get_transcription_inventory('orthographic').string_is_valid(
+            'John')
+
+        # Dropping the tables invalidates the cache too.
+        snapshot = db.cached_app_set
+        self.create_db()
+        db = DBUtils(dbsession, self.settings)
+        assert db.cached_app_set is not snapshot
+        assert db.cached_app_set.values == {}
+
+    def test_inventory(self):
+        """Tests that inventories validate strings as the alternation regexes
+        of their graphemes would.
+        """
+
+        inventory = Inventory(['ab', 'a', 'bc', 'x-y', ' '])
+
+        # A string is valid if some concatenation of graphemes yields it, even
+        # if the longest first grapheme leads nowhere.
+        assert inventory.string_is_valid('abc ab')
+        assert inventory.string_is_valid('')
+        assert inventory.string_is_valid('x-y\n')
+        assert not inventory.string_is_valid('abcb')
+        assert not inventory.string_is_valid('x-')
+        regex = re.compile(inventory.get_regex_validator())
+        for string in ('abc ab', 'abcb', 'aabx-y', 'x-yx'):
+            assert inventory.string_is_valid(string) == bool(
+                regex.match(string))
+
+        # Invalid spans are reported in the same pass.
+        validation = inventory.validate('abcbd x-y?')
+        assert not validation.is_valid
+        assert validation.invalid_spans == [(2, 5), (9, 10)]
+        assert inventory.get_non_matching_substrings('abcbd x-y?') == [
+            'cbd', '\\?']
+        assert inventory.validate_many(['ab', 'abd', 'ab']) == [
+            (True, []), (False, [(2, 3)]), (True, [])]
+
+        # Thousands of foreign words are no problem.
+        foreign_words = ['word%d' % index for index in range(5000)]
+        inventory = Inventory(foreign_words + [' '])
+        assert inventory.string_is_valid('word42 word4999 word1')
+        assert inventory.get_non_matching_substrings('word0 words') == [
+            'words']
@@ -23,6 +23,7 @@ from uuid import uuid4
 
 from sqlalchemy.sql import desc
 
+import old.lib.constants as oldc
 from old.lib.dbutils import DBUtils
 from old.lib.SQLAQueryBuilder import SQLAQueryBuilder
 import old.models.modelbuilders as omb
@@ -33,6 +34,7 @@ from old.models import (
     User,
 )
 from old.models.form import FormFile
+from old.models.searchtrigram import SearchTrigram
 from old.tests import TestView, add_SEARCH_to_web_test_valid_methods
 
 LOGGER = logging.getLogger(__name__)
@@ -3450,3 +3452,216 @@ class TestFormsView(TestView):
         })
         params = json.dumps(params)
         response = self.app.post(url('create'), params, self.json_headers, extra_environ)
+
+    def test_bulk_import(self):
+        """Tests that POST /forms/bulk imports the forms of an NDJSON body in
+        a job, resolving the morpheme references of the imported forms and of
+        the existing forms that contain them.
+        """
+        dbsession = self.dbsession
+        N = omb.generate_n_syntactic_category()
+        Num = omb.generate_num_syntactic_category()
+        tag = Tag()
+        tag.name = 'imported'
+        application_settings = omb.generate_default_application_settings()
+        dbsession.add_all([N, Num, tag, application_settings])
+        dbsession.commit()
+        NId, NumId, tag_id = N.id, Num.id, tag.id
+        bulk_url = '/{}/forms/bulk'.format(self.old_name)
+
+        def get_params(transcription, morpheme_break, morpheme_gloss,
+                       translation, **kwargs):
+            params = self.form_create_params.copy()
+            params.update({
+                'transcription': transcription,
+                'morpheme_break': morpheme_break,
+                'morpheme_gloss': morpheme_gloss,
+                'translations': [{'transcription': translation,
+                                  'grammaticality': ''}]
+            })
+            params.update(kwargs)
+            return params
+
+        def import_forms(lines):
+            body = '\n'.join(json.dumps(line) if isinstance(line, dict)
+                             else line for line in lines)
+            response = self.app.post(bulk_url, body.encode('utf8'),
+                                     self.json_headers,
+                                     self.extra_environ_contrib)
+            job = response.json_body['job']
+            assert job['func'] == 'import_forms'
+            assert job['model_name'] == 'Form'
+            assert job['model_id'] is None
+            while True:
+                job = self.app.get(
+                    '/{}/jobs/{}'.format(self.old_name, job['id']),
+                    headers=self.json_headers,
+                    extra_environ=self.extra_environ_view).json_body
+                if job['status'] in oldc.JOB_FINAL_STATUSES:
+                    return job
+                sleep(0.5)
+
+        # An existing form that contains morphemes that are imported below.
+        response = self.app.post(
+            url('create'),
+            json.dumps(get_params('chiens', 'chien-s', 'dog-PL', 'dogs')),
+            self.json_headers, self.extra_environ_admin)
+        chiens_id = response.json_body['id']
+        assert response.json_body['morpheme_break_ids'] == [[[], []]]
+
+        # The complex form precedes its morphemes in the body, whose blank
+        # line is ignored.
+        job = import_forms([
+            get_params('chats', 'chat-s', 'cat-PL', 'cats', tags=[tag_id]),
+            get_params('chat', 'chat', 'cat', 'cat', syntactic_category=NId),
+            '',
+            get_params('chien', 'chien', 'dog', 'dog', syntactic_category=NId),
+            get_params('s', 's', 'PL', 'plural', syntactic_category=NumId)])
+        assert job['status'] == 'succeeded'
+        assert job['message'] == ('Imported 4 forms and updated the'
+                                  ' morphological analyses of 1 other forms.')
+        forms = {form['transcription']: form for form in self.app.get(
+            url('index'), headers=self.json_headers,
+            extra_environ=self.extra_environ_admin).json_body}
+        assert len(forms) == 5
+        chat_id = forms['chat']['id']
+        chien_id = forms['chien']['id']
+        s_id = forms['s']['id']
+        chats = forms['chats']
+        assert chats['enterer']['role'] == 'contributor'
+        assert [t['transcription'] for t in chats['translations']] == ['cats']
+        assert [t['id'] for t in chats['tags']] == [tag_id]
+        assert chats['morpheme_break_ids'] == [
+            [[[chat_id, 'cat', 'N']], [[s_id, 'PL', 'Num']]]]
+        assert chats['morpheme_gloss_ids'] == [
+            [[[chat_id, 'chat', 'N']], [[s_id, 's', 'Num']]]]
+        assert chats['syntactic_category_string'] == 'N-Num'
+        assert chats['break_gloss_category'] == 'chat|cat|N-s|PL|Num'
+        assert forms['chat']['morpheme_break_ids'] == [
+            [[[chat_id, 'cat', 'N']]]]
+        chiens = forms['chiens']
+        assert chiens['morpheme_break_ids'] == [
+            [[[chien_id, 'dog', 'N']], [[s_id, 'PL', 'Num']]]]
+        assert chiens['break_gloss_category'] == 'chien|dog|N-s|PL|Num'
+        assert chiens['modifier']['role'] == 'contributor'
+
+        # The existing form was backed up before its update.
+        form_backups = dbsession.query(old_models.FormBackup).all()
+        assert [fb.form_id for fb in form_backups] == [chiens_id]
+        assert json.loads(form_backups[0].morpheme_break_ids) == [[[], []]]
+
+        # The imported forms and their translations are in the search index.
+        dbsession.expire_all()
+        assert dbsession.query(SearchTrigram).filter(
+            SearchTrigram.model_name == 'Form').filter(
+                SearchTrigram.model_id == chat_id).filter(
+                    SearchTrigram.trigram == 'cha').count() == 2
+        assert dbsession.query(SearchTrigram).filter(
+            SearchTrigram.model_name == 'Translation').filter(
+                SearchTrigram.model_id == chats['translations'][0]['id']
+            ).count() == 2
+
+        # If any form is invalid, none are imported.
+        job = import_forms([
+            get_params('chien', 'chien', 'dog', 'dog'),
+            get_params('chat', 'chat', 'cat', ''),
+            get_params('chat', 'chat', 'cat', 'cat', speaker=1000)])
+        assert job['status'] == 'failed'
+        assert job['message'].startswith(
+            '2 of the 3 forms are invalid so none were imported; line 2:'
+            ' {"translations": "Please enter one or more translations"};'
+            ' line 3: {"speaker": "There is no speaker with id 1000."}')
+        assert dbsession.query(Form).count() == 5
+
+        # The body must be NDJSON with at least one form.
+        for body in ('[{"transcription": "chat"}]', 'chat', '\n\n'):
+            response = self.app.post(
+                bulk_url, body, self.json_headers,
+                self.extra_environ_contrib, status=400)
+            assert 'error' in response.json_body
+        assert os.listdir(os.path.join(
+            os.path.dirname(self.users_path), 'imports')) == []
+
+        # Viewers may not import forms.
+        response = self.app.post(
+            bulk_url, json.dumps(get_params('chat', 'chat', 'cat', 'cat')),
+            self.json_headers, self.extra_environ_view, status=403)
+
+    def test_update_morpheme_references(self):
+        """Tests that PUT /forms/update_morpheme_references regenerates the
+        morphological analyses of all forms from an index of their morphemes.
+        """
+        dbsession = self.dbsession
+        N = omb.generate_n_syntactic_category()
+        Num = omb.generate_num_syntactic_category()
+        application_settings = omb.generate_default_application_settings()
+        dbsession.add_all([N, Num, application_settings])
+        dbsession.commit()
+        update_url = '/{}/forms/update_morpheme_references'.format(
+            self.old_name)
+
+        form_ids = {}
+        for transcription, morpheme_break, morpheme_gloss, category_id in (
+                ('chien', 'chien', 'dog', N.id),
+                ('s', 's', 'PL', Num.id),
+                ('s', 's', 'PL', N.id),
+                ('chiens', 'chien-s', 'dog-PL', None),
+                ('chats', 'chat-s', 'cat-PL', None)):
+            params = self.form_create_params.copy()
+            params.update({
+                'transcription': transcription,
+                'morpheme_break': morpheme_break,
+                'morpheme_gloss': morpheme_gloss,
+                'translations': [{'transcription': transcription,
+                                  'grammaticality': ''}],
+                'syntactic_category': category_id
+            })
+            response = self.app.post(url('create'), json.dumps(params),
+                                     self.json_headers,
+                                     self.extra_environ_admin)
+            form_ids.setdefault(transcription, []).append(
+                response.json_body['id'])
+        chien_id, = form_ids['chien']
+        s_num_id, s_n_id = form_ids['s']
+        chiens_id, = form_ids['chiens']
+        expected = {
+            'morpheme_break_ids': [[[[chien_id, 'dog', 'N']],
+                                    [[s_num_id, 'PL', 'Num'],
+                                     [s_n_id, 'PL', 'N']]]],
+            'morpheme_gloss_ids': [[[[chien_id, 'chien', 'N']],
+                                    [[s_num_id, 's', 'Num'],
+                                     [s_n_id, 's', 'N']]]],
+            'syntactic_category_string': 'N-Num',
+            'break_gloss_category': 'chien|dog|N-s|PL|Num'
+        }
+        response = self.app.get(url('show', id=chiens_id),
+                                extra_environ=self.extra_environ_admin)
+        assert {attr: response.json_body[attr] for attr in expected} == \
+            expected
+
+        # Nothing is stale, so nothing is updated.
+        response = self.app.put(update_url, headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin)
+        assert response.json_body == []
+
+        # Stale analyses (e.g., of forms written by another process) are
+        # regenerated.
+        form_table = Form.__table__
+        dbsession.execute(form_table.update().where(
+            form_table.c.id == chiens_id).values(
+                morpheme_break_ids=json.dumps([[[], []]]),
+                morpheme_gloss_ids=json.dumps([[[], []]]),
+                syntactic_category_string='?-?',
+                break_gloss_category='chien|dog|?-s|PL|?'))
+        dbsession.commit()
+        response = self.app.put(update_url, headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin)
+        assert response.json_body == [chiens_id]
+        response = self.app.get(url('show', id=chiens_id),
+                                extra_environ=self.extra_environ_admin)
+        assert {attr: response.json_body[attr] for attr in expected} == \
+            expected
+
+        # Only administrators may request this.
+        self.app.put(update_url, headers=self.json_headers,
+                     extra_environ=self.extra_environ_contrib, status=403)
@@ -23,16 +23,30 @@ I altered the global valid_methods tuple of webtest.lint at runtime by adding a
 'SEARCH' method (see _add_SEARCH_to_web_test_valid_methods() below).
 """
 
+import csv
 from datetime import date, datetime, timedelta
 from functools import reduce
+import gzip
+import io
 import json
 import logging
 import platform
 import re
 
+from webob import Request
+
+from old import get_json_renderer
 from old.tests import TestView, add_SEARCH_to_web_test_valid_methods
+import old.lib.constants as oldc
 from old.lib.dbutils import DBUtils
+from old.lib.querybudget import QUERY_COUNT_HEADER
+from old.lib.SQLAQueryBuilder import QUERY_PLANS, SQLAQueryBuilder
 import old.models as old_models
+from old.models.searchtrigram import (
+    SearchTrigram,
+    get_trigrams,
+    rebuild_search_index
+)
 import old.lib.helpers as h
 import old.models.modelbuilders as omb
 
@@ -1627,6 +1641,30 @@ class TestFormsSearchView(TestView):
                 f['date_elicited'] is not None)]
         assert len(resp) == len(result_set)
 
+        # The same search with different values reuses the query plan of the
+        # previous one: only the new values are converted and bound.
+        hits = QUERY_PLANS.info()['hits']
+        tag_names = ['name 3', 'name 5', 'name 77']
+        patt = '[02468]$'
+        json_query = json.dumps({'query': {'filter': [
+            'or', [
+                ['Translation', 'transcription', 'like', '%2%'],
+                ['Tag', 'name', 'in', tag_names],
+                ['and', [
+                    ['not', ['File', 'name', 'regex', patt]],
+                    ['Form', 'date_elicited', '!=', None]]]]]}})
+        response = self.app.post(url('search_post'), json_query,
+                        self.json_headers, self.extra_environ_admin)
+        resp = response.json_body
+        assert QUERY_PLANS.info()['hits'] == hits + 1
+        result_set = [f for f in forms if
+            '2' in ' '.join([g['transcription'] for g in f['translations']]) or
+            set([t['name'] for t in f['tags']]) & set(tag_names) or
+            (f['files'] and
+                not re.search(patt, ', '.join([fi['name'] for fi in f['files']])) and
+                f['date_elicited'] is not None)]
+        assert sorted(f['id'] for f in resp) == sorted(f['id'] for f in result_set)
+
         # A super complex search ...  The implicit assertion is that a 200 status
         # code is returned.  At this point I am not going to bother attempting to
         # emulate this query in Python ...
@@ -1710,6 +1748,69 @@ class TestFormsSearchView(TestView):
         assert resp['items'][0]['id'] == result_set[16]['id']
         assert resp['items'][-1]['id'] == result_set[31]['id']
 
+        # A paginator with a 'cursor' key requests keyset pagination: each
+        # page comes with a 'next_cursor' that requests the following page
+        # and that is null on the last page. An empty cursor requests the
+        # first page.
+        for order_by in (None, ['Form', 'transcription', 'desc'],
+                         ['Form', 'grammaticality', 'asc'],
+                         ['Form', 'datetime_modified', 'desc']):
+            query = {'filter': ['Form', 'transcription', 'like', '%T%']}
+            if order_by:
+                query['order_by'] = order_by
+            response = self.app.request(
+                url('search'), method='SEARCH',
+                body=json.dumps({'query': query}).encode('utf8'),
+                headers=self.json_headers, environ=self.extra_environ_admin)
+            expected_ids = [f['id'] for f in response.json_body]
+            ids = []
+            cursor = ''
+            while cursor is not None:
+                json_query = json.dumps({'query': query, 'paginator': {
+                    'cursor': cursor, 'items_per_page': 7}})
+                response = self.app.request(
+                    url('search'), method='SEARCH',
+                    body=json_query.encode('utf8'), headers=self.json_headers,
+                    environ=self.extra_environ_admin)
+                resp = response.json_body
+                assert resp['paginator']['count'] == len(result_set)
+                assert resp['paginator']['cursor'] == (cursor or None)
+                assert len(resp['items']) <= 7
+                ids += [f['id'] for f in resp['items']]
+                cursor = resp['paginator']['next_cursor']
+            assert ids == expected_ids
+
+        # GET /forms supports keyset pagination too.
+        params = {'cursor': '', 'items_per_page': 30,
+                  'order_by_model': 'Form', 'order_by_attribute': 'id',
+                  'order_by_direction': 'desc'}
+        response = self.app.get(url('index'), params, headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin)
+        resp = response.json_body
+        assert resp['paginator']['count'] == len(forms)
+        assert [f['id'] for f in resp['items']] == [
+            f['id'] for f in reversed(forms)][:30]
+        params['cursor'] = resp['paginator']['next_cursor']
+        response = self.app.get(url('index'), params, headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin)
+        resp = response.json_body
+        assert [f['id'] for f in resp['items']] == [
+            f['id'] for f in reversed(forms)][30:60]
+
+        # Invalid cursors, including a cursor from a query with a different
+        # ORDER BY, result in 400 errors.
+        params['cursor'] = 'abc'
+        response = self.app.get(url('index'), params, headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin,
+                                status=400)
+        assert response.json_body['errors']['cursor'] == 'The cursor is invalid.'
+        params['order_by_attribute'] = 'transcription'
+        params['cursor'] = resp['paginator']['next_cursor']
+        response = self.app.get(url('index'), params, headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin,
+                                status=400)
+        assert response.json_body['errors']['cursor'] == 'The cursor is invalid.'
+
     def test_search_z_order_by(self):
         """Tests POST /forms/search: order by."""
 
@@ -1952,6 +2053,259 @@ class TestFormsSearchView(TestView):
         assert len(resp) == 1
         assert response.content_type == 'application/json'
 
+    def test_search_zc_search_index(self):
+        """Tests that like and regexp searches narrowed via the trigram search
+        index return the same forms as those that are not.
+        """
+
+        dbsession = self.dbsession
+        db = DBUtils(dbsession, self.settings)
+
+        # The search index holds the trigrams of the forms' indexed attributes.
+        form = db.get_forms()[0]
+        trigrams = set(
+            r.trigram for r in dbsession.query(SearchTrigram).filter(
+                SearchTrigram.model_name == 'Form',
+                SearchTrigram.attribute_name == 'transcription',
+                SearchTrigram.model_id == form.id))
+        assert trigrams == get_trigrams(form.transcription)
+
+        # An update re-indexes the form.
+        form.transcription = 'xyzzy'
+        dbsession.commit()
+        form = db.get_forms()[0]
+        trigrams = set(
+            r.trigram for r in dbsession.query(SearchTrigram).filter(
+                SearchTrigram.model_name == 'Form',
+                SearchTrigram.attribute_name == 'transcription',
+                SearchTrigram.model_id == form.id))
+        assert trigrams == {'xyz', 'yzz', 'zzy'}
+
+        # Rebuilding the index from scratch yields the same index.
+        count = dbsession.query(SearchTrigram).count()
+        rebuild_search_index(dbsession)
+        assert dbsession.query(SearchTrigram).count() == count
+
+        query_builder = SQLAQueryBuilder(
+            dbsession, 'Form', settings=self.settings)
+        indexed_query_builder = SQLAQueryBuilder(
+            dbsession, 'Form', settings=dict(self.settings, search_index='1'))
+        filters = [
+            ['Form', 'transcription', 'like', '%ption 1%'],
+            ['Form', 'transcription', 'like', '%PTION 1%'],
+            ['Form', 'transcription', 'like', '%ption 2%'],
+            ['Form', 'transcription', 'like', 'xyz%'],
+            ['Form', 'transcription', 'like', '%1%'],
+            ['Form', 'morpheme_gloss', 'regex', 'gloss [12]1$'],
+            ['Form', 'morpheme_gloss', 'regex', 'gloss 3|break'],
+            ['not', ['Form', 'morpheme_break', 'like', '%break 5%']],
+            ['Translation', 'transcription', 'like', '%the second%'],
+            ['Form', 'translations', 'transcription', 'regex',
+             'tion 2. the'],
+            ['or', [['Form', 'phonetic_transcription', 'like', '%ption 7%'],
+                    ['Form', 'id', '<', 10]]]
+        ]
+        for filter_ in filters:
+            # Each search is run twice, the second time from its query plan.
+            for _ in range(2):
+                expected = [f.id for f in query_builder.get_SQLA_query(
+                    {'filter': filter_}).all()]
+                result = [f.id for f in indexed_query_builder.get_SQLA_query(
+                    {'filter': filter_}).all()]
+                assert result == expected
+
+    def test_search_zd_streamed(self):
+        """Tests that the forms of unpaginated GET /forms and SEARCH /forms
+        requests, which are streamed, are serialized exactly as the JSON
+        renderer serializes form models.
+        """
+
+        dbsession = self.dbsession
+        db = DBUtils(dbsession, self.settings)
+        sources = db.get_sources()
+        sources[43].crossref_source = sources[0]
+        sources[0].crossref_source = sources[1]
+        dbsession.commit()
+        render = get_json_renderer()(None)
+
+        forms = dbsession.query(old_models.Form).order_by(
+            old_models.Form.id).all()
+        response = self.app.get(url('index'), headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin)
+        assert response.content_type == 'application/json'
+        assert response.body == render(forms, {}).encode('utf8')
+
+        # The forms of searches with joins are not repeated.
+        query = {'filter': ['or', [
+            ['Translation', 'transcription', 'like', '%1%'],
+            ['Tag', 'name', 'like', '%8%']]],
+            'order_by': ['Form', 'transcription', 'desc']}
+        forms = SQLAQueryBuilder(
+            dbsession, 'Form', settings=self.settings).get_SQLA_query(
+                query).all()
+        response = self.app.post(url('search_post'),
+                                 json.dumps({'query': query}),
+                                 self.json_headers, self.extra_environ_admin)
+        assert response.body == render(forms, {}).encode('utf8')
+
+        query = {'filter': ['Form', 'transcription', '=', 'nothing']}
+        response = self.app.post(url('search_post'),
+                                 json.dumps({'query': query}),
+                                 self.json_headers, self.extra_environ_admin)
+        assert response.body == b'[]'
+
+    def test_search_ze_export(self):
+        """Tests GET /forms/export and SEARCH /forms/export: streaming NDJSON
+        and CSV exports.
+        """
+
+        dbsession = self.dbsession
+        export_url = url('export')
+        forms = self.app.get(url('index'), headers=self.json_headers,
+                             extra_environ=self.extra_environ_admin).json_body
+
+        # NDJSON: one form dict per line.
+        response = self.app.get(export_url, headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin)
+        assert response.content_type == 'application/x-ndjson'
+        assert response.content_disposition == (
+            'attachment; filename="forms.ndjson"')
+        ndjson = response.body
+        lines = ndjson.decode('utf8').splitlines()
+        assert [json.loads(line) for line in lines] == forms
+
+        # Gzipped, if requested. (WebTest would decode the response.)
+        request = Request.blank(
+            export_url, environ=dict(self.extra_environ_admin),
+            headers={'Accept-Encoding': 'gzip'})
+        response = request.get_response(self.app.app)
+        assert response.content_encoding == 'gzip'
+        assert gzip.decompress(response.body) == ndjson
+
+        # CSV: a header row of form dict keys and one row per form.
+        response = self.app.get(export_url, {'format': 'csv'},
+                                headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin)
+        assert response.content_type == 'text/csv'
+        rows = list(csv.reader(io.StringIO(response.body.decode('utf8'))))
+        assert rows[0] == list(forms[0])
+        assert len(rows) == len(forms) + 1
+        transcriptions = rows[0].index('transcription')
+        translations = rows[0].index('translations')
+        assert [row[transcriptions] for row in rows[1:]] == [
+            f['transcription'] for f in forms]
+        assert [json.loads(row[translations]) for row in rows[1:]] == [
+            f['translations'] for f in forms]
+
+        # Ordering parameters are respected.
+        response = self.app.get(
+            export_url, {'order_by_model': 'Form',
+                         'order_by_attribute': 'id',
+                         'order_by_direction': 'desc'},
+            headers=self.json_headers, extra_environ=self.extra_environ_admin)
+        assert [json.loads(line)['id'] for line in
+                response.body.decode('utf8').splitlines()] == [
+                    f['id'] for f in reversed(forms)]
+
+        # Restricted forms are not exported to viewers.
+        viewer_forms = self.app.get(
+            url('index'), headers=self.json_headers,
+            extra_environ=self.extra_environ_view).json_body
+        response = self.app.get(export_url, headers=self.json_headers,
+                                extra_environ=self.extra_environ_view)
+        viewer_lines = response.body.decode('utf8').splitlines()
+        assert [json.loads(line) for line in viewer_lines] == viewer_forms
+        assert len(viewer_forms) < len(forms)
+
+        # Searches are exported without repeating the forms that their joins
+        # repeat.
+        query = {'query': {'filter': ['or', [
+            ['Translation', 'transcription', 'like', '%1%'],
+            ['Tag', 'name', 'like', '%8%']]]}}
+        searched_forms = self.app.post(
+            url('search_post'), json.dumps(query), self.json_headers,
+            self.extra_environ_admin).json_body
+        response = self.app.request(
+            export_url, method='SEARCH', body=json.dumps(query).encode('utf8'),
+            headers=self.json_headers, environ=self.extra_environ_admin)
+        assert [json.loads(line) for line in
+                response.body.decode('utf8').splitlines()] == searched_forms
+
+        # Invalid formats and searches are errors.
+        response = self.app.get(export_url, {'format': 'xml'},
+                                headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin,
+                                status=400)
+        assert response.json_body['error'] == (
+            'The export format must be one of csv, ndjson; not xml.')
+        response = self.app.post(
+            export_url, json.dumps({'query': {'filter': ['Foo', 'id', '=', 1]}}),
+            self.json_headers, self.extra_environ_admin, status=400)
+        assert 'Foo' in response.json_body['errors']
+
+        # Other resources are exported from their model dicts.
+        tags = self.app.get(old_models.Tag._url(old_name=self.old_name)('index'),
+                            headers=self.json_headers,
+                            extra_environ=self.extra_environ_admin).json_body
+        response = self.app.get(
+            old_models.Tag._url(old_name=self.old_name)('export'),
+            headers=self.json_headers, extra_environ=self.extra_environ_admin)
+        assert [json.loads(line) for line in
+                response.body.decode('utf8').splitlines()] == tags
+
+    def test_search_zf_query_budget(self):
+        """Tests that the number of SQL statements that GET /forms, SEARCH
+        /forms and GET /forms/<id> requests execute does not depend on the
+        number of forms returned and that requests that exceed their query
+        budget fail when testing.
+        """
+
+        json_query = {'query': {'filter': ['Form', 'id', '>', 0]}}
+        counts = {'index': set(), 'search': set()}
+        # (The sources of forms 42 to 52 have chains of crossref sources, each
+        # link of which takes a query of its own.)
+        for items_per_page in (10, 40):
+            paginator = {'page': 1, 'items_per_page': items_per_page}
+            response = self.app.get(url('index'), paginator,
+                                    headers=self.json_headers,
+                                    extra_environ=self.extra_environ_admin)
+            assert len(response.json_body['items']) == items_per_page
+            counts['index'].add(response.headers[QUERY_COUNT_HEADER])
+            json_query['paginator'] = paginator
+            response = self.app.request(
+                url('search'), method='SEARCH',
+                body=json.dumps(json_query).encode('utf8'),
+                headers=self.json_headers, environ=self.extra_environ_admin)
+            assert len(response.json_body['items']) == items_per_page
+            counts['search'].add(response.headers[QUERY_COUNT_HEADER])
+        assert len(counts['index']) == 1
+        assert int(counts['index'].pop()) <= oldc.QUERY_BUDGETS['index_forms']
+        assert len(counts['search']) == 1
+        assert int(counts['search'].pop()) <= oldc.QUERY_BUDGETS['search_forms']
+
+        # Form 79 has two translations, two tags, a file, a speaker, etc.
+        form_id = self.dbsession.query(old_models.Form).filter(
+            old_models.Form.transcription == 'TRANSCRIPTION 79').one().id
+        response = self.app.get(url('show', id=form_id),
+                                headers=self.json_headers,
+                                extra_environ=self.extra_environ_admin)
+        assert len(response.json_body['translations']) == 2
+        assert len(response.json_body['tags']) == 2
+        count = int(response.headers[QUERY_COUNT_HEADER])
+        assert count <= oldc.QUERY_BUDGETS['show_form']
+
+        # A request over its budget fails.
+        budget = oldc.QUERY_BUDGETS['show_form']
+        oldc.QUERY_BUDGETS['show_form'] = count - 1
+        try:
+            response = self.app.get(url('show', id=form_id),
+                                    headers=self.json_headers,
+                                    extra_environ=self.extra_environ_admin,
+                                    status=500)
+        finally:
+            oldc.QUERY_BUDGETS['show_form'] = budget
+        assert response.json_body == {'error': 'Internal Server Error'}
+
     def test_z_cleanup(self):
         """Tests POST /forms/search: clean up the database."""
 
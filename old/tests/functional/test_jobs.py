@@ -0,0 +1,210 @@
+# Copyright 2016 Joel Dunham
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import codecs
+import json
+import logging
+from time import sleep
+
+from old.tests import TestView
+import old.lib.constants as oldc
+import old.lib.helpers as h
+from old.models import Job, Phonology
+
+LOGGER = logging.getLogger(__name__)
+
+
+url = Job._url(old_name=TestView.old_name)
+phonologies_url = Phonology._url(old_name=TestView.old_name)
+
+
+class TestJobsView(TestView):
+
+    def setUp(self):
+        super().setUp()
+        with codecs.open(self.test_phonology_script_path, 'r', 'utf8') as filei:
+            self.test_phonology_script = h.normalize(filei.read())
+        with codecs.open(self.test_large_phonology_script_path, 'r', 'utf8') as filei:
+            self.test_large_phonology_script = h.normalize(filei.read())
+
+    def tearDown(self):
+        super().tearDown(dirs_to_destroy=['user', 'phonology'])
+
+    def _create_phonology(self, name, script):
+        params = self.phonology_create_params.copy()
+        params.update({'name': name, 'script': script})
+        response = self.app.post(
+            phonologies_url('create'), json.dumps(params), self.json_headers,
+            self.extra_environ_admin)
+        return response.json_body['id']
+
+    def _compile_phonology(self, phonology_id):
+        response = self.app.put(
+            '/{old_name}/phonologies/{id}/compile'.format(
+                old_name=self.old_name, id=phonology_id),
+            headers=self.json_headers,
+            extra_environ=self.extra_environ_contrib)
+        return response.json_body['job']
+
+    def _wait_for_job(self, job_id):
+        while True:
+            resp = self.app.get(
+                url('show', id=job_id), headers=self.json_headers,
+                extra_environ=self.extra_environ_view).json_body
+            if resp['status'] in oldc.JOB_FINAL_STATUSES:
+                return resp
+            LOGGER.debug('Waiting for job %d to finish ...', job_id)
+            sleep(0.5)
+
+    def test_index_show_and_cancel(self):
+        """Tests GET /jobs, GET /jobs/id and DELETE /jobs/id on a job that is
+        not held by any worker, and that jobs cannot be created via /jobs.
+        """
+        # Nothing has been enqueued yet.
+        resp = self.app.get(url('index'), headers=self.json_headers,
+                            extra_environ=self.extra_environ_view).json_body
+        assert resp == []
+
+        # Jobs cannot be created via the jobs resource.
+        self.app.post(url('create'), '{}', self.json_headers,
+                      self.extra_environ_admin, status=404)
+
+        # Nonexistent jobs.
+        resp = self.app.get(
+            url('show', id=100987), headers=self.json_headers,
+            extra_environ=self.extra_environ_view, status=404).json_body
+        assert resp['error'] == 'There is no job with id 100987'
+        self.app.delete(
+            url('delete', id=100987), headers=self.json_headers,
+            extra_environ=self.extra_environ_admin, status=404)
+
+        dbsession = self.dbsession
+        now = h.now()
+        job = Job(UUID='0' * 36, func='compile_phonology',
+                  model_name='Phonology', model_id=1, args='{}',
+                  status='pending', priority=0, progress=0.0,
+                  datetime_entered=now, datetime_modified=now)
+        dbsession.add(job)
+        dbsession.commit()
+        job_id = job.id
+
+        resp = self.app.get(
+            url('show', id=job_id), headers=self.json_headers,
+            extra_environ=self.extra_environ_view).json_body
+        assert resp['status'] == 'pending'
+        assert resp['func'] == 'compile_phonology'
+        # There are no successful jobs to estimate the duration from.
+        assert 'eta' in resp
+        assert resp['eta'] is None
+        resp = self.app.get(url('index'), headers=self.json_headers,
+                            extra_environ=self.extra_environ_view).json_body
+        assert [job_['id'] for job_ in resp] == [job_id]
+
+        # Viewers may not cancel jobs.
+        self.app.delete(
+            url('delete', id=job_id), headers=self.json_headers,
+            extra_environ=self.extra_environ_view, status=403)
+
+        resp = self.app.delete(
+            url('delete', id=job_id), headers=self.json_headers,
+            extra_environ=self.extra_environ_contrib).json_body
+        assert resp['status'] == 'cancelled'
+        assert resp['message'] == 'Cancelled.'
+        assert resp['eta'] is None
+        resp = self.app.delete(
+            url('delete', id=job_id), headers=self.json_headers,
+            extra_environ=self.extra_environ_contrib, status=400).json_body
+        assert resp['error'] == (
+            'Job %d cannot be cancelled because it has cancelled.' % job_id)
+
+    def test_job(self):
+        """Tests that compile requests create jobs that can be followed via
+        GET /jobs/id and that finished jobs cannot be cancelled.
+        """
+        if not h.foma_installed():
+            return
+        phonology_id = self._create_phonology('Phonology',
+                                              self.test_phonology_script)
+        job = self._compile_phonology(phonology_id)
+        assert job['func'] == 'compile_phonology'
+        assert job['model_name'] == 'Phonology'
+        assert job['model_id'] == phonology_id
+        assert job['args']['phonology_id'] == phonology_id
+        assert 'settings' not in job['args']
+        assert 'config_path' not in job['args']
+        assert 'user_id' not in job['args']
+        assert job['status'] in ('pending', 'running')
+        assert job['enterer']['role'] == 'contributor'
+
+        resp = self._wait_for_job(job['id'])
+        assert resp['status'] == 'succeeded'
+        assert resp['progress'] == 1.0
+        assert resp['eta'] is None
+        assert resp['datetime_started'] is not None
+        assert resp['datetime_finished'] is not None
+        phonology = self.app.get(
+            phonologies_url('show', id=phonology_id), headers=self.json_headers,
+            extra_environ=self.extra_environ_view).json_body
+        assert phonology['compile_succeeded'] is True
+
+        # Finished jobs cannot be cancelled.
+        resp = self.app.delete(
+            url('delete', id=job['id']), headers=self.json_headers,
+            extra_environ=self.extra_environ_admin, status=400).json_body
+        assert resp['error'] == (
+            'Job %d cannot be cancelled because it has succeeded.' % job['id'])
+
+        # The job is in the index.
+        resp = self.app.get(url('index'), headers=self.json_headers,
+                            extra_environ=self.extra_environ_view).json_body
+        assert [job_['id'] for job_ in resp] == [job['id']]
+
+    def test_deduplicate_and_cancel(self):
+        """Tests that identical pending jobs are deduplicated and that pending
+        and running jobs can be cancelled via DELETE /jobs/id.
+        """
+        if not h.foma_installed():
+            return
+        # Occupy every worker with a slow compilation.
+        pool_size = int(
+            self.settings.get('jobs.pool_size') or oldc.JOB_POOL_SIZE)
+        running = [
+            self._compile_phonology(self._create_phonology(
+                'Large Phonology %d' % index,
+                self.test_large_phonology_script))
+            for index in range(pool_size)]
+        phonology_id = self._create_phonology('Phonology',
+                                              self.test_phonology_script)
+        job = self._compile_phonology(phonology_id)
+        assert job['status'] == 'pending'
+        duplicate = self._compile_phonology(phonology_id)
+        assert duplicate['id'] == job['id']
+
+        # Cancel the pending job.
+        resp = self.app.delete(
+            url('delete', id=job['id']), headers=self.json_headers,
+            extra_environ=self.extra_environ_contrib).json_body
+        assert resp['status'] == 'cancelled'
+
+        # Cancel the running jobs; their worker processes are killed.
+        for running_job in running:
+            resp = self.app.delete(
+                url('delete', id=running_job['id']), headers=self.json_headers,
+                extra_environ=self.extra_environ_contrib).json_body
+            assert resp['status'] == 'cancelled'
+        for job_id in [job['id']] + [job_['id'] for job_ in running]:
+            sleep(0.5)
+            resp = self._wait_for_job(job_id)
+            assert resp['status'] == 'cancelled'
+            assert resp['message'] == 'Cancelled.'
@@ -15,22 +15,27 @@
 from datetime import date, datetime
 import codecs
 import hashlib
+from io import BytesIO
 import json
 import logging
 import os
 from shutil import copyfileobj
 from subprocess import call
 from time import sleep
+from zipfile import ZipFile
 
 from sqlalchemy.sql import desc
 
 import old.lib.constants as oldc
 from old.lib.dbutils import DBUtils
+from old.lib.foma_lookup import Transducer
+from old.lib.parser import DICTIONARIES, FLOOKUP_POOLS
+from old.lib.simplelm import LM_TRIES
 import old.lib.helpers as h
 import old.models.modelbuilders as omb
 import old.models as old_models
 from old.models import MorphologicalParser, MorphologicalParserBackup
-from old.models.morphologicalparser import Parse
+from old.models.morphologicalparser import Parse, PARSES
 from old.tests import TestView, add_SEARCH_to_web_test_valid_methods
 
 
@@ -538,6 +543,7 @@ define phonology eDrop .o. breakDrop;
         response = self.app.post(url('create'), params, self.json_headers, self.extra_environ_admin)
         resp = response.json_body
         morphological_parser_id = resp['id']
+        assert resp['lookup_backend'] == 'flookup'
 
         # Generate the parser's morphophonology FST and compile it.
         response = self.app.put(
@@ -597,6 +603,170 @@ define phonology eDrop .o. breakDrop;
         assert resp[transcription3] == transcription3_correct_parse
         assert resp['abc'] is None
 
+        # The parses are also held in the process-wide LRU and each
+        # transcription was persisted exactly once.
+        assert PARSES.get(morphological_parser_id, transcription1)[0] == \
+            transcription1_correct_parse
+        assert sorted(p.transcription for p in dbsession.query(Parse).filter(
+            Parse.parser_id == morphological_parser_id)) == sorted(
+                [transcription1, transcription3, 'abc'])
+
+        # Bulk parse an NDJSON body: each unique word is parsed once and the
+        # parses are streamed back as NDJSON in order of first occurrence.
+        bulkparse_url = '/{old_name}/morphologicalparsers/{id}/bulkparse'.format(
+            old_name=self.old_name, id=morphological_parser_id)
+        body = '\n'.join(map(json.dumps, [
+            '%s %s' % (transcription1, transcription3), transcription1, 'abc']))
+        response = self.app.put(bulkparse_url, body.encode('utf8'),
+                                self.json_headers, self.extra_environ_admin)
+        assert response.content_type == 'application/x-ndjson'
+        lines = [json.loads(line) for line in
+                 response.body.decode('utf8').splitlines()]
+        assert lines == [
+            {'transcription': transcription1,
+             'parse': transcription1_correct_parse},
+            {'transcription': transcription3,
+             'parse': transcription3_correct_parse},
+            {'transcription': 'abc', 'parse': None}]
+
+        # Ask for the two most probable candidates of each parse too.
+        response = self.app.put(bulkparse_url + '?candidates=2',
+                                json.dumps(transcription1).encode('utf8'),
+                                self.json_headers, self.extra_environ_admin)
+        lines = [json.loads(line) for line in
+                 response.body.decode('utf8').splitlines()]
+        assert len(lines) == 1
+        candidates = lines[0]['candidates']
+        assert 0 < len(candidates) <= 2
+        assert candidates[0][0] == transcription1_correct_parse
+        assert [score for _, score in candidates] == sorted(
+            [score for _, score in candidates], reverse=True)
+
+        # Bulk parse the words of the rules corpus and compare the parses with
+        # those of the parse endpoint.
+        corpus_words = []
+        for form in dbsession.query(old_models.Corpus).get(
+                rules_corpus_id).forms:
+            for word in form.transcription.split():
+                if h.normalize(word) not in corpus_words:
+                    corpus_words.append(h.normalize(word))
+        response = self.app.put(
+            bulkparse_url + '?corpus=%d' % rules_corpus_id, b'',
+            self.json_headers, self.extra_environ_admin)
+        lines = [json.loads(line) for line in
+                 response.body.decode('utf8').splitlines()]
+        assert sorted(line['transcription'] for line in lines) == sorted(
+            corpus_words)
+        response = self.app.put(
+            '/{old_name}/morphologicalparsers/{id}/parse'.format(
+                old_name=self.old_name, id=morphological_parser_id),
+            json.dumps({'transcriptions': corpus_words}), self.json_headers,
+            self.extra_environ_admin)
+        resp = response.json_body
+        for line in lines:
+            assert resp[line['transcription']] == line['parse']
+
+        # Invalid bulk parse requests.
+        resp = self.app.put(bulkparse_url + '?candidates=100', b'',
+                            self.json_headers, self.extra_environ_admin,
+                            status=400).json_body
+        assert resp['error'] == (
+            'The candidates parameter must be an integer between 0 and %d.' %
+            oldc.BULK_PARSE_MAX_CANDIDATES)
+        resp = self.app.put(bulkparse_url, b'{"transcriptions": []}',
+                            self.json_headers, self.extra_environ_admin,
+                            status=400).json_body
+        assert resp['error'] == ('The request body must be NDJSON with one'
+                                 ' JSON string (a transcription) per line.')
+        resp = self.app.put(bulkparse_url + '?corpus=123456789', b'',
+                            self.json_headers, self.extra_environ_admin,
+                            status=400).json_body
+        assert resp['error'] == 'There is no corpus with id 123456789'
+
+        # Create a second toy French parser that looks up words in its
+        # morphophonology FST in-process instead of via flookup and make sure
+        # that it behaves exactly like the first.
+        flookup_parser_id = morphological_parser_id
+        params = self.morphological_parser_create_params.copy()
+        params.update({
+            'name': 'Morphological parser for toy French, in-process lookup',
+            'phonology': phonology_id,
+            'morphology': morphology_id,
+            'language_model': morpheme_language_model_id,
+            'lookup_backend': 'python'
+        })
+        params = json.dumps(params)
+        response = self.app.post(url('create'), params, self.json_headers, self.extra_environ_admin)
+        resp = response.json_body
+        python_parser_id = resp['id']
+        assert resp['lookup_backend'] == 'python'
+        response = self.app.put(
+            '/{old_name}/morphologicalparsers/{id}/generate_and_compile'.format(
+                old_name=self.old_name, id=python_parser_id),
+            headers=self.json_headers, extra_environ=self.extra_environ_admin)
+        job_id = response.json_body['job']['id']
+        while True:
+            response = self.app.get(
+                '/{old_name}/jobs/{id}'.format(old_name=self.old_name, id=job_id),
+                headers=self.json_headers, extra_environ=self.extra_environ_contrib)
+            if response.json_body['status'] in oldc.JOB_FINAL_STATUSES:
+                break
+            sleep(0.5)
+        assert response.json_body['status'] == 'succeeded'
+
+        # The transducer's flookup-style output lines equal flookup's, in both
+        # directions, for accepted inputs, rejected inputs (``+?``), inputs
+        # with unknown symbols and inputs with word boundaries.
+        python_parser = dbsession.query(MorphologicalParser).get(python_parser_id)
+        binary_path = python_parser.get_file_path('binary')
+        transducer = Transducer.from_foma_binary(binary_path)
+        boundary = python_parser.word_boundary_symbol
+        upper_inputs = [transcription1, transcription2, transcription3, 'abc',
+                        'xyz⦀', '', boundary + transcription1 + boundary]
+        lower_inputs = [transcription1_correct_parse,
+                        transcription3_correct_parse, 'abc',
+                        boundary + transcription1_correct_parse + boundary]
+        for direction, inputs in (('up', upper_inputs), ('down', lower_inputs)):
+            assert transducer.lookup(inputs, direction) == \
+                FLOOKUP_POOLS.get_pool(binary_path, direction).lookup(inputs)
+
+        # So the parsers' apply and parse responses are the same.
+        for parser_id in (flookup_parser_id, python_parser_id):
+            params = json.dumps({'transcriptions': [transcription1, transcription2]})
+            response = self.app.put(
+                '/{old_name}/morphologicalparsers/{id}/applyup'.format(
+                    old_name=self.old_name, id=parser_id),
+                params, self.json_headers, self.extra_environ_admin)
+            if parser_id == flookup_parser_id:
+                flookup_applyup = response.json_body
+            else:
+                assert response.json_body == flookup_applyup
+            params = json.dumps({'morpheme_sequences': [transcription1_correct_parse]})
+            response = self.app.put(
+                '/{old_name}/morphologicalparsers/{id}/applydown'.format(
+                    old_name=self.old_name, id=parser_id),
+                params, self.json_headers, self.extra_environ_admin)
+            if parser_id == flookup_parser_id:
+                flookup_applydown = response.json_body
+            else:
+                assert response.json_body == flookup_applydown
+        params = json.dumps({'transcriptions': [transcription1, transcription3, 'abc']})
+        response = self.app.put(
+            '/{old_name}/morphologicalparsers/{id}/parse'.format(
+                old_name=self.old_name, id=python_parser_id),
+            params, self.json_headers, self.extra_environ_admin)
+        resp = response.json_body
+        assert resp[transcription1] == transcription1_correct_parse
+        assert resp[transcription3] == transcription3_correct_parse
+        assert resp['abc'] is None
+        # Delete the in-process lookup parser (and its backup) so that it does not
+        # affect the counts below.
+        self.app.delete(url('delete', id=python_parser_id), headers=self.json_headers,
+                        extra_environ=self.extra_environ_admin)
+        dbsession.query(MorphologicalParserBackup).filter(
+            MorphologicalParserBackup.morphologicalparser_id == python_parser_id).delete()
+        dbsession.commit()
+
         ################################################################################
         # END MORPHOLOGICAL PARSER 1
         ################################################################################
@@ -899,7 +1069,7 @@ define phonology eDrop .o. breakDrop;
             mlm_url('update', id=categorial_language_model_id),
             params, self.json_headers, self.extra_environ_admin)
         # Request that the files of the language model be generated anew; this
-        # will create a new LMTree pickle file.
+        # will create a new compact LM trie file.
         response = self.app.put(
             '/{old_name}/morphemelanguagemodels/{id}/generate'.format(
                 old_name=self.old_name, id=categorial_language_model_id),
@@ -1171,6 +1341,8 @@ define phonology eDrop .o. breakDrop;
             desc(MorphologicalParserBackup.id)).first()
         assert backup.datetime_modified.isoformat() == morphological_parser_1_modified
         assert backup.description == morphological_parser_1_description
+        assert backup.lookup_backend == 'flookup'
+        assert backup.get_dict()['lookup_backend'] == 'flookup'
         assert response.content_type == 'application/json'
 
         # Attempt an update with no new input and expect to fail
@@ -1269,20 +1441,38 @@ define phonology eDrop .o. breakDrop;
             extra_environ=self.extra_environ_admin)
         assert response.content_type == 'application/zip'
         # To ensure the exported parser works, unzip it and test it out: ./parse.py chiens chats
+        archive_names = ZipFile(BytesIO(response.body)).namelist()
+        assert [name for name in archive_names if name.endswith('config.pickle')]
+        assert [name for name in archive_names if name.endswith('.lm')]
+        assert not [name for name in archive_names
+                    if name.endswith(('.lmtrie', '.tmp', 'morpheme_language_model.pickle'))]
 
         parser_1_cache = sorted([p.transcription for p in dbsession.query(Parse).\
             filter(Parse.parser_id==morphological_parser_1_id).all()])
-        assert parser_1_cache == [u'abc', 'chiens', 'tombait']
+        # The bulk parse of the rules corpus cached the parses of its words.
+        assert parser_1_cache == sorted(
+            set([u'abc', 'chiens', 'tombait'] + corpus_words))
 
         # Test morphological parser deletion.
         assert 'morphophonology.script' in os.listdir(morphological_parser_1_dir)
         assert 'morphophonology.foma' in os.listdir(morphological_parser_1_dir)
+        parser_1 = dbsession.query(MorphologicalParser).get(
+            morphological_parser_1_id)
+        parser_1_trie_path = parser_1.my_language_model.get_file_path('trie')
+        parser_1_dictionary_path = parser_1.my_morphology.get_file_path(
+            'dictionary')
+        assert parser_1_trie_path in LM_TRIES.tries
+        if os.path.isfile(parser_1_dictionary_path):
+            DICTIONARIES.get_dictionary(parser_1_dictionary_path)
         response = self.app.delete(
             url('delete', id=morphological_parser_1_id),
             headers=self.json_headers,
             extra_environ=self.extra_environ_admin)
         resp = response.json_body
         assert not os.path.exists(morphological_parser_1_dir)
+        # The parser's LM trie and morphology dictionary have been released.
+        assert parser_1_trie_path not in LM_TRIES.tries
+        assert parser_1_dictionary_path not in DICTIONARIES.dictionaries
         assert resp['description'] == 'Newer description'
         assert resp['phonology']['id'] == morphological_parser_1_phonology_id
 
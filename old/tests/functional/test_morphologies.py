@@ -452,6 +452,13 @@ class TestMorphologiesView(TestView):
         resp = response.json_body
         assert resp['error'] == 'There is no morphology with id 123456789'
 
+        # The lexicon of each category has been compiled to a fragment.
+        fragments_dir = os.path.join(morphology_dir, 'lexicon_fragments')
+        fragment_mtimes = dict(
+            (fn, os.path.getmtime(os.path.join(fragments_dir, fn)))
+            for fn in os.listdir(fragments_dir) if fn.endswith('.foma'))
+        assert len(fragment_mtimes) == len(lexicon)
+
         # Compile the first morphology's script again
         response = self.app.put(
             '/{old_name}/morphologies/{id}/generate_and_compile'.format(old_name=self.old_name, id=morphology_1_id),
@@ -478,6 +485,11 @@ class TestMorphologiesView(TestView):
         assert resp['compile_message'] == 'Compilation process terminated successfully and new binary file was written.'
         assert morphology_binary_filename in os.listdir(morphology_dir)
 
+        # None of the unchanged lexicon fragments was recompiled.
+        assert fragment_mtimes == dict(
+            (fn, os.path.getmtime(os.path.join(fragments_dir, fn)))
+            for fn in os.listdir(fragments_dir) if fn.endswith('.foma'))
+
         # Test that PUT /morphologies/id/applydown and PUT /morphologies/id/applyup are working correctly.
         # Note that the value of the ``transcriptions`` key can be a string or a list of strings.
 
@@ -692,6 +704,20 @@ class TestMorphologiesView(TestView):
         assert 'V-AGR' in rules # cf. nage-aient, parle-ait
         assert ['chat', 'cat'] in resp['lexicon']['N']
 
+        # Only the changed lexicon fragments were compiled anew and those of
+        # the old N lexicon have been removed.
+        new_fragment_mtimes = dict(
+            (fn, os.path.getmtime(os.path.join(fragments_dir, fn)))
+            for fn in os.listdir(fragments_dir) if fn.endswith('.foma'))
+        assert len(new_fragment_mtimes) == len(resp['lexicon'])
+        assert set(new_fragment_mtimes) - set(fragment_mtimes)
+        assert set(fragment_mtimes) - set(new_fragment_mtimes)
+        for fn in set(fragment_mtimes) & set(new_fragment_mtimes):
+            assert fragment_mtimes[fn] == new_fragment_mtimes[fn]
+        assert not [fn for fn in os.listdir(fragments_dir)
+                    if fn.split('.', 1)[0] not in
+                    [fn_.split('.', 1)[0] for fn_ in new_fragment_mtimes]]
+
         # Compile the fourth morphology's script (include unknowns)
         response = self.app.put(
             '/{old_name}/morphologies/{id}/generate_and_compile'.format(old_name=self.old_name, id=morphology_4_id),
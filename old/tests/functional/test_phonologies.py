@@ -26,6 +26,7 @@ import old.models as old_models
 import old.lib.helpers as h
 import old.lib.constants as oldc
 import old.models.modelbuilders as omb
+from old.lib.parser import FLOOKUP_POOLS
 from old.models import Phonology, PhonologyBackup
 
 LOGGER = logging.getLogger(__name__)
@@ -1138,6 +1139,76 @@ class TestPhonologiesView(TestView):
         resp = response.json_body
         assert resp['error'] == 'Phonology %d has not been compiled yet.' % phonology2_id
 
+    def test_flookup_pools(self):
+        """Tests that phonologies are applied by pooled flookup coprocesses
+        that are restarted when they die, replaced when the phonology is
+        recompiled and terminated when idle.
+        """
+        if not h.foma_installed():
+            return
+        dbsession = self.dbsession
+        params = self.phonology_create_params.copy()
+        params.update({
+            'name': 'Blackfoot Phonology',
+            'script': self.test_phonology_script
+        })
+        response = self.app.post(url('create'), json.dumps(params),
+                                 self.json_headers, self.extra_environ_admin)
+        phonology_id = response.json_body['id']
+
+        def compile_phonology():
+            response = self.app.put(
+                '/{old_name}/phonologies/{id}/compile'.format(
+                    old_name=self.old_name, id=phonology_id),
+                headers=self.json_headers,
+                extra_environ=self.extra_environ_contrib)
+            job_id = response.json_body['job']['id']
+            while True:
+                response = self.app.get(
+                    '/{old_name}/jobs/{id}'.format(old_name=self.old_name,
+                                                   id=job_id),
+                    headers=self.json_headers,
+                    extra_environ=self.extra_environ_contrib)
+                if response.json_body['status'] in oldc.JOB_FINAL_STATUSES:
+                    return response.json_body
+                sleep(0.5)
+
+        assert compile_phonology()['status'] == 'succeeded'
+        phonology = dbsession.query(Phonology).get(phonology_id)
+        binary_path = phonology.get_file_path('binary')
+        assert phonology.applydown('nit-wa') == {'nit-wa': ['nita']}
+        pool = FLOOKUP_POOLS.get_pool(binary_path, 'down')
+        assert pool.idle_count == 1
+
+        # A coprocess that dies is replaced transparently.
+        process = pool._idle.get_nowait()
+        process.process.kill()
+        process.process.wait()
+        pool._idle.put(process)
+        assert phonology.applydown(['nit-wa']) == {'nit-wa': ['nita']}
+        assert pool.idle_count == 1
+
+        # Recompiling writes a new binary, which gets a new pool.
+        sleep(0.01)
+        assert compile_phonology()['status'] == 'succeeded'
+        assert phonology.applydown('nit-wa') == {'nit-wa': ['nita']}
+        new_pool = FLOOKUP_POOLS.get_pool(binary_path, 'down')
+        assert new_pool is not pool
+        assert pool.closed
+        assert new_pool.idle_count == 1
+
+        # Idle coprocesses (and then their pools) are reaped.
+        FLOOKUP_POOLS.reap(idle_timeout=0)
+        assert new_pool.idle_count == 0
+        assert (binary_path, 'down') not in FLOOKUP_POOLS.pools
+
+        # Removing a phonology's directory closes its pools.
+        assert phonology.applydown('nit-wa') == {'nit-wa': ['nita']}
+        new_pool = FLOOKUP_POOLS.get_pool(binary_path, 'down')
+        phonology.remove_directory()
+        assert new_pool.closed
+        assert (binary_path, 'down') not in FLOOKUP_POOLS.pools
+
     def test_runtests(self):
         """Tests that ``GET /phonologies/id/runtests`` runs the tests in the phonology's script."""
 
@@ -20,11 +20,13 @@
 """
 
 import logging
+import os
 import re
 import json
 from uuid import uuid4
 
 from formencode.validators import Invalid
+from pyramid.response import Response
 from sqlalchemy import bindparam
 from sqlalchemy.sql import asc, or_
 from sqlalchemy.orm import subqueryload
@@ -32,6 +34,7 @@ from sqlalchemy.orm import subqueryload
 from old.lib.constants import (
     DEFAULT_DELIMITER,
     FORM_REFERENCE_PATTERN,
+    GET_DICTS_BATCH_SIZE,
     JSONDecodeErrorResponse,
     UNAUTHORIZED_MSG,
     UNKNOWN_CATEGORY,
@@ -43,7 +46,9 @@ from old.models import (
     Form,
     FormBackup,
     Collection,
-    User
+    SyntacticCategory,
+    User,
+    get_session_factory
 )
 from old.views.resources import (
     Resources,
@@ -69,6 +74,39 @@ class Forms(Resources):
         """
         return self._filter_restricted_models(query_obj)
 
+    def _get_all_response(self, query_obj):
+        """Stream the JSON array of the dicts of all of the forms of
+        ``query_obj``. Its bytes are those that the JSON renderer would produce
+        from the form models but the dicts are built in batches from the
+        columns that they need (cf. ``Form.get_dicts``) instead of from
+        models.
+        """
+        ids = []
+        seen = set()
+        for id_, in query_obj.with_entities(Form.id):
+            if id_ not in seen:
+                seen.add(id_)
+                ids.append(id_)
+        return Response(
+            app_iter=self._get_form_dicts_chunks(
+                get_session_factory(self.request.dbsession.get_bind()), ids),
+            content_type='application/json',
+            charset='utf8')
+
+    @staticmethod
+    def _get_form_dicts_chunks(session_factory, ids):
+        """Yield the JSON array of the dicts of the forms with the ids in
+        ``ids`` in chunks. The chunks are produced after the view has returned
+        so they are read with a db session of their own.
+        """
+        dbsession = session_factory()
+        try:
+            yield from h.get_json_array_chunks(
+                Form.get_dicts(dbsession, batch)
+                for batch in h.chunker(ids, GET_DICTS_BATCH_SIZE))
+        finally:
+            dbsession.close()
+
     def __headers_control(self, result):
         """Set Last-Modified in response header and return 304 if the requester
         already has an up-to-date cache of the results of this call to index/
@@ -254,48 +292,7 @@ class Forms(Resources):
         return user_data
 
     def _get_user_data(self, data):
-        user_data = {
-            # Unicode Data
-            'transcription': h.to_single_space(
-                h.normalize(data['transcription'])),
-            'phonetic_transcription': h.to_single_space(
-                h.normalize(data['phonetic_transcription'])),
-            'narrow_phonetic_transcription': h.to_single_space(
-                h.normalize(data['narrow_phonetic_transcription'])),
-            'morpheme_break': h.to_single_space(
-                h.normalize(data['morpheme_break'])),
-            'morpheme_gloss': h.to_single_space(
-                h.normalize(data['morpheme_gloss'])),
-            'comments': h.normalize(data['comments']),
-            'speaker_comments': h.normalize(data['speaker_comments']),
-            'syntax': h.normalize(data['syntax']),
-            'semantics': h.normalize(data['semantics']),
-            'grammaticality': data['grammaticality'],
-            'status': data['status'],
-            # User-entered date: date_elicited
-            'date_elicited': data['date_elicited'],
-            # Many-to-One
-            'elicitation_method': data['elicitation_method'],
-            'syntactic_category': data['syntactic_category'],
-            'source': data['source'],
-            'elicitor': data['elicitor'],
-            'verifier': data['verifier'],
-            'speaker': data['speaker'],
-            # One-to-Many Data: translations
-            'translations': data['translations'],
-            # Many-to-Many Data: tags & files
-            'tags': [t for t in data['tags'] if t],
-            'files': [f for f in data['files'] if f]
-        }
-        # Restrict the entire form if it is associated to restricted files.
-        tags = [f.tags for f in user_data['files']]
-        tags = [tag for tag_list in tags for tag in tag_list]
-        restricted_tags = [tag for tag in tags if tag.name == 'restricted']
-        if restricted_tags:
-            restricted_tag = restricted_tags[0]
-            if restricted_tag not in user_data['tags']:
-                user_data['tags'].append(restricted_tag)
-        return user_data
+        return get_user_data(data)
 
     ###########################################################################
     # Idiosyncratic Form Resource Actions
@@ -383,14 +380,71 @@ class Forms(Resources):
         """
         LOGGER.info('Attempting to update the morphological analysis-related'
                     ' attributes of all forms.')
-        forms = self.db.get_forms()
+        morpheme_delimiters = self.db.get_morpheme_delimiters()
         return self.update_morpheme_references_of_forms(
             self.db.get_forms(),
-            self.db.get_morpheme_delimiters(),
-            whole_db=forms,
+            morpheme_delimiters,
+            index=MorphemeIndex.from_db(self.request.dbsession,
+                                        morpheme_delimiters),
             make_backups=False
         )
 
+    def bulk(self):
+        """Import forms in bulk.
+
+        :URL: ``POST /forms/bulk``
+        :Request body: NDJSON, i.e., one JSON object per line, each
+            representing a form as in the body of a ``POST /forms`` request.
+        :returns: a dict with the import job under the 'job' key;
+            ``GET /jobs/<job.id>`` can be polled to follow the import.
+
+        .. note::
+
+           The forms are validated and imported by a job (cf.
+           :mod:`old.lib.formimport`) in a single transaction: if any form is
+           invalid, none are imported and the job fails with a message
+           listing the first errors. Otherwise, the job's message states how
+           many forms were imported and how many existing forms had their
+           morphological analyses updated.
+        """
+        LOGGER.info('Attempting to import forms in bulk.')
+        dir_path = h.get_old_directory_path(
+            'imports', self.request.registry.settings)
+        h.make_directory_safely(dir_path)
+        file_name = '{}.ndjson'.format(uuid4())
+        path = os.path.join(dir_path, file_name)
+        count = 0
+        try:
+            with open(path, 'w', encoding='utf8') as fileo:
+                self.request.body_file_seekable.seek(0)
+                for line in self.request.body_file_seekable:
+                    line = line.decode(self.request.charset).strip()
+                    if line:
+                        if not isinstance(json.loads(line), dict):
+                            raise ValueError('Not a JSON object: {}'.format(
+                                line))
+                        count += 1
+                    # Blank lines are kept so that line numbers in error
+                    # messages are those of the request body.
+                    fileo.write(line + '\n')
+        except (UnicodeDecodeError, ValueError):
+            os.remove(path)
+            self.request.response.status_int = 400
+            msg = ('The request body must be NDJSON with one JSON object (a'
+                   ' form) per line.')
+            LOGGER.warning(msg)
+            return {'error': msg}
+        if not count:
+            os.remove(path)
+            self.request.response.status_int = 400
+            msg = 'The request body contains no forms.'
+            LOGGER.warning(msg)
+            return {'error': msg}
+        result = self._enqueue_job(
+            'import_forms', None, {'file_name': file_name, 'forms': count})
+        LOGGER.info('Enqueued the import of %d forms.', count)
+        return result
+
     ###########################################################################
     # Form-specific private methods
     ###########################################################################
@@ -404,15 +458,15 @@ class Forms(Resources):
         ``morpheme_gloss_ids``, ``syntactic_category_string`` and
         ``break_gloss_category`` attributes of all forms in ``forms``. The
         ``kwargs`` dict may contain ``lexical_items``,
-        ``deleted_lexical_items`` or ``whole_db`` values which will be passed
+        ``deleted_lexical_items`` or ``index`` values which will be passed
         to compile_morphemic_analysis.
 
         :param list forms: the form models to be updated.
         :param list valid_delimiters: morpheme delimiters as strings.
         :param list kwargs['lexical_items']: a list of form models.
         :param list kwargs['deleted_lexical_items']: a list of form models.
-        :param list kwargs['whole_db']: a list of all the form models in the
-            database.
+        :param kwargs['index']: a :class:`MorphemeIndex` of all the forms in
+            the database.
         :returns: a list of form ``id`` values corresponding to the forms that
             have been updated.
         """
@@ -541,6 +595,8 @@ class Forms(Resources):
             potential matches.
         :param list deleted_lexical_items: forms that must be deleted from the
             matches.
+        :param index: a :class:`MorphemeIndex` of all forms, in which the
+            morpheme is looked up instead of in the database, or ``None``.
         :returns: an ordered pair (tuple), where the second element is always
             the (potentially updated) ``matches_found`` dictionary.  In the
             normal case, the first element is the list of perfect matches for
@@ -551,19 +607,18 @@ class Forms(Resources):
         """
         try:
             (form, word_index, morpheme_index, morpheme, gloss, matches_found,
-             lexical_items, deleted_lexical_items, whole_db) = args
+             lexical_items, deleted_lexical_items, index) = args
         except ValueError:
             raise TypeError(
                 'get_perfect_matches() missing 9 required'
                 ' positional arguments: \'form\', \'word_index\','
                 ' \'morpheme_index\', \'morpheme\', \'gloss\','
                 ' \'matches_found\', \'lexical_items\','
-                ' \'deleted_lexical_items\' and \'whole_db\'')
+                ' \'deleted_lexical_items\' and \'index\'')
         if (morpheme, gloss) in matches_found:
             return matches_found[(morpheme, gloss)], matches_found
-        if whole_db:
-            result = [f for f in whole_db if f.morpheme_break == morpheme and
-                      f.morpheme_gloss == gloss]
+        if index is not None:
+            result = index.get_perfect_matches(morpheme, gloss)
         elif lexical_items or deleted_lexical_items:
             extant_morpheme_break_ids = json.loads(form.morpheme_break_ids)
             extant_morpheme_gloss_ids = json.loads(form.morpheme_gloss_ids)
@@ -637,6 +692,8 @@ class Forms(Resources):
             pool of potential matches.
         :param list kwargs['deleted_lexical_items']: forms that must be deleted
             from the matches.
+        :param kwargs['index']: a :class:`MorphemeIndex` of all forms, in
+            which the morpheme is looked up instead of in the database.
         :param iterable kwargs['force_query']: a 2-tuple representing a
             morpheme or a list of perfect matches.
         :returns: an ordered pair (tuple), where the first element is the list
@@ -645,7 +702,7 @@ class Forms(Resources):
         """
         lexical_items = kwargs.get('lexical_items')
         deleted_lexical_items = kwargs.get('deleted_lexical_items')
-        whole_db = kwargs.get('whole_db')
+        index = kwargs.get('index')
         force_query = kwargs.get('force_query')   # The output of
                                                   # get_perfect_matches: []
                                                   # or (morpheme, gloss)
@@ -655,8 +712,8 @@ class Forms(Resources):
         value = morpheme or gloss
         if (morpheme, gloss) in matches_found:
             return matches_found[(morpheme, gloss)], matches_found
-        if whole_db:
-            result = [f for f in whole_db if getattr(f, attribute) == value]
+        if index is not None:
+            result = index.get_partial_matches(morpheme=morpheme, gloss=gloss)
         elif lexical_items or deleted_lexical_items:
             if value in force_query:
                 result = self.request.dbsession.query(Form)\
@@ -772,7 +829,7 @@ class Forms(Resources):
         # temporary store -- eliminates redundant queries & processing -- updated
         # as a byproduct of get_perfect_matches and get_partial_matches
         matches_found = kwargs.get('cache', {})
-        whole_db = kwargs.get('whole_db')
+        index = kwargs.get('index')
         morpheme_break_ids = []
         morpheme_gloss_ids = []
         syntactic_category_string = []
@@ -812,7 +869,7 @@ class Forms(Resources):
                     gloss = mg_word_morphemes_list[j]
                     perfect_matches, matches_found = self.get_perfect_matches(
                         form, i, j, morpheme, gloss, matches_found,
-                        lexical_items, deleted_lexical_items, whole_db)
+                        lexical_items, deleted_lexical_items, index)
                     if perfect_matches and isinstance(perfect_matches, list):
                         mb_word_analysis.append(
                             [(f.id, f.morpheme_gloss,
@@ -832,7 +889,7 @@ class Forms(Resources):
                                 force_query=perfect_matches,
                                 lexical_items=lexical_items,
                                 deleted_lexical_items=deleted_lexical_items,
-                                whole_db=whole_db)
+                                index=index)
                         if morpheme_matches:
                             mb_word_analysis.append(
                                 [(f.id, f.morpheme_gloss,
@@ -845,7 +902,7 @@ class Forms(Resources):
                             force_query=perfect_matches,
                             lexical_items=lexical_items,
                             deleted_lexical_items=deleted_lexical_items,
-                            whole_db=whole_db)
+                            index=index)
                         if gloss_matches:
                             mg_word_analysis.append(
                                 [(f.id, f.morpheme_break,
@@ -943,8 +1000,9 @@ class Forms(Resources):
                     matches, morpheme_delimiters, lexical_items=[form])
 
     def form_is_foreign_word(self, form_model):
-        foreign_word_tag = self.db.get_foreign_word_tag()
-        if foreign_word_tag in form_model.tags:
+        foreign_word_tag_id = self.db.get_foreign_word_tag_id()
+        if foreign_word_tag_id is not None and foreign_word_tag_id in [
+                tag.id for tag in form_model.tags]:
             return True
         return False
 
@@ -969,6 +1027,54 @@ class Forms(Resources):
             return False
 
 
+def get_user_data(data):
+    """Return the attribute values of a form given the output ``data`` of
+    ``FormSchema``.
+    """
+    user_data = {
+        # Unicode Data
+        'transcription': h.to_single_space(
+            h.normalize(data['transcription'])),
+        'phonetic_transcription': h.to_single_space(
+            h.normalize(data['phonetic_transcription'])),
+        'narrow_phonetic_transcription': h.to_single_space(
+            h.normalize(data['narrow_phonetic_transcription'])),
+        'morpheme_break': h.to_single_space(
+            h.normalize(data['morpheme_break'])),
+        'morpheme_gloss': h.to_single_space(
+            h.normalize(data['morpheme_gloss'])),
+        'comments': h.normalize(data['comments']),
+        'speaker_comments': h.normalize(data['speaker_comments']),
+        'syntax': h.normalize(data['syntax']),
+        'semantics': h.normalize(data['semantics']),
+        'grammaticality': data['grammaticality'],
+        'status': data['status'],
+        # User-entered date: date_elicited
+        'date_elicited': data['date_elicited'],
+        # Many-to-One
+        'elicitation_method': data['elicitation_method'],
+        'syntactic_category': data['syntactic_category'],
+        'source': data['source'],
+        'elicitor': data['elicitor'],
+        'verifier': data['verifier'],
+        'speaker': data['speaker'],
+        # One-to-Many Data: translations
+        'translations': data['translations'],
+        # Many-to-Many Data: tags & files
+        'tags': [t for t in data['tags'] if t],
+        'files': [f for f in data['files'] if f]
+    }
+    # Restrict the entire form if it is associated to restricted files.
+    tags = [f.tags for f in user_data['files']]
+    tags = [tag for tag_list in tags for tag in tag_list]
+    restricted_tags = [tag for tag in tags if tag.name == 'restricted']
+    if restricted_tags:
+        restricted_tag = restricted_tags[0]
+        if restricted_tag not in user_data['tags']:
+            user_data['tags'].append(restricted_tag)
+    return user_data
+
+
 def update_has_changed_the_analysis(form, form_dict):
     """Return ``True`` if the update from form_dict to form has changed the
     morphological analysis of the form.
@@ -1130,3 +1236,76 @@ def get_fake_form(quadruple):
         syntactic_category=fake_syntactic_category
     )
     return fake_form
+
+
+class MorphemeIndex(object):
+    """In-memory index from morphemes and glosses to the forms that match
+    them, i.e., to the forms that ``Forms.get_perfect_matches`` and
+    ``Forms.get_partial_matches`` would otherwise query the database for. The
+    matches are form-like objects in the order in which they were added, which
+    should be that of their ids. Values that contain whitespace or a morpheme
+    delimiter cannot be morphemes and are not indexed.
+
+    Building the index takes one query (cf. :meth:`get_rows`) and a linear
+    pass over the forms, after which each morpheme lookup is a dict lookup.
+    """
+
+    def __init__(self, morpheme_delimiters):
+        self.separator = re.compile('[\\s{}]'.format(''.join(
+            h.esc_RE_meta_chars(delimiter) for delimiter in
+            morpheme_delimiters)))
+        self.perfect = {}
+        self.breaks = {}
+        self.glosses = {}
+
+    @staticmethod
+    def get_rows(dbsession):
+        """Return a query for the ``(id, morpheme_break, morpheme_gloss,
+        syntactic category name)`` quadruples of all forms, ordered by id.
+        """
+        return dbsession.query(
+            Form.id, Form.morpheme_break, Form.morpheme_gloss,
+            SyntacticCategory.name).outerjoin(
+                SyntacticCategory,
+                Form.syntacticcategory_id == SyntacticCategory.id).order_by(
+                    asc(Form.id))
+
+    @classmethod
+    def from_db(cls, dbsession, morpheme_delimiters):
+        """Return an index of all of the forms in the database."""
+        index = cls(morpheme_delimiters)
+        for row in cls.get_rows(dbsession):
+            index.add(*row)
+        return index
+
+    def add(self, id_, morpheme_break, morpheme_gloss, category_name):
+        match = FakeForm(
+            id=id_,
+            morpheme_break=morpheme_break,
+            morpheme_gloss=morpheme_gloss,
+            syntactic_category=None if category_name is None else
+            FakeSyntacticCategory(name=category_name))
+        break_is_morpheme = self._is_morpheme(morpheme_break)
+        gloss_is_morpheme = self._is_morpheme(morpheme_gloss)
+        if break_is_morpheme:
+            self.breaks.setdefault(morpheme_break, []).append(match)
+        if gloss_is_morpheme:
+            self.glosses.setdefault(morpheme_gloss, []).append(match)
+        if break_is_morpheme and gloss_is_morpheme:
+            self.perfect.setdefault(
+                (morpheme_break, morpheme_gloss), []).append(match)
+
+    def _is_morpheme(self, value):
+        return value is None or not self.separator.search(value)
+
+    def get_perfect_matches(self, morpheme, gloss):
+        return self.perfect.get((morpheme, gloss), [])
+
+    def get_partial_matches(self, morpheme=None, gloss=None):
+        """Return the forms whose morpheme break is ``morpheme`` or, if that is
+        empty, those whose morpheme gloss is ``gloss``, as
+        ``Forms.get_partial_matches`` does.
+        """
+        if morpheme:
+            return self.breaks.get(morpheme, [])
+        return self.glosses.get(gloss, [])
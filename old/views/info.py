@@ -37,6 +37,7 @@ RESOURCES = (
     'Form',
     'FormBackup',
     'FormSearch',
+    'Job',
     'Keyboard',
     'Language',
     'MorphemeLanguageModel',
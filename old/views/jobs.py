@@ -0,0 +1,84 @@
+import logging
+
+import old.lib.constants as oldc
+import old.lib.helpers as h
+from old.lib.foma_worker import cancel_job
+from old.views.resources import ReadonlyResources
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of recent successful jobs whose durations are averaged when
+# estimating the duration of a job that has reported no progress.
+ETA_SAMPLE_SIZE = 20
+
+
+class Jobs(ReadonlyResources):
+    """Jobs are created by the compile/generate/compute_perplexity requests of
+    phonologies, morphologies, morphological parsers and morpheme language
+    models; they cannot be created or updated via this resource. A job's show
+    dict includes an 'eta': the estimated number of seconds until it finishes
+    (or ``None`` if this cannot be estimated). Deleting a job cancels it.
+    """
+
+    def __init__(self, request):
+        self.model_name = 'Job'
+        self.hmn_member_name = 'job'
+        super().__init__(request)
+
+    def delete(self):
+        """Cancel a pending or running job.
+        :URL: ``DELETE /jobs/<id>``
+        :param str id: the ``id`` value of the job to be cancelled.
+        :returns: the cancelled job; if the job was running, its worker process
+            (and that process's children) are killed.
+        """
+        LOGGER.info('Attempting to cancel a job.')
+        job, id_ = self._model_from_id()
+        if not job:
+            self.request.response.status_int = 404
+            msg = self._rsrc_not_exist(id_)
+            LOGGER.warning(msg)
+            return {'error': msg}
+        if job.status in oldc.JOB_FINAL_STATUSES:
+            self.request.response.status_int = 400
+            msg = 'Job {} cannot be cancelled because it has {}.'.format(
+                id_, job.status)
+            LOGGER.warning(msg)
+            return {'error': msg}
+        job = cancel_job(self.request.registry.settings, id_)
+        LOGGER.info('Cancelled job %d.', id_)
+        return self._get_show_dict(job)
+
+    def _get_show_dict(self, resource_model):
+        result = resource_model.get_dict()
+        result['eta'] = self._get_eta(resource_model)
+        return result
+
+    def _get_eta(self, job):
+        """Estimate the number of seconds until ``job`` finishes. A running job
+        that has reported progress is extrapolated from its elapsed time;
+        otherwise the mean duration of recent successful jobs of the same kind
+        is used.
+        """
+        if job.status in oldc.JOB_FINAL_STATUSES:
+            return None
+        elapsed = 0.0
+        if job.status == 'running' and job.datetime_started:
+            elapsed = (h.now() - job.datetime_started).total_seconds()
+            if job.progress:
+                return max(elapsed * (1 - job.progress) / job.progress, 0.0)
+        durations = [
+            (finished - started).total_seconds() for started, finished in
+            self.request.dbsession.query(
+                self.model_cls.datetime_started,
+                self.model_cls.datetime_finished)
+            .filter(self.model_cls.func == job.func)
+            .filter(self.model_cls.status == 'succeeded')
+            .filter(self.model_cls.datetime_started != None)
+            .order_by(self.model_cls.id.desc())
+            .limit(ETA_SAMPLE_SIZE)
+            if finished]
+        if not durations:
+            return None
+        return max(sum(durations) / len(durations) - elapsed, 0.0)
@@ -13,7 +13,7 @@ class Languages(ReadonlyResources):
         super().__init__(request)
         self.primary_key = 'Id'
 
-    def _model_from_id(self, eager=False):
+    def _model_from_id(self, eager=False, action='show'):
         """Return a particular model instance (and the id value), given the
         model id supplied in the URL path.
         """
@@ -21,6 +21,7 @@ class Languages(ReadonlyResources):
         if eager:
             return (
                 self._eagerload_model(
-                    self.request.dbsession.query(self.model_cls)).get(id_),
+                    self.request.dbsession.query(self.model_cls),
+                    action).get(id_),
                 id_)
         return self.request.dbsession.query(self.model_cls).get(id_), id_
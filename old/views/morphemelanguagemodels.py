@@ -7,7 +7,6 @@ from formencode.validators import Invalid
 from pyramid.response import FileResponse
 
 import old.lib.constants as oldc
-from old.lib.foma_worker import FOMA_WORKER_Q
 import old.lib.helpers as h
 from old.lib.schemata import MorphemeSequencesSchema
 from old.models import MorphemeLanguageModelBackup
@@ -44,21 +43,13 @@ class Morphemelanguagemodels(Resources):
             msg = 'There is no morpheme language model with id {}'.format(id_)
             LOGGER.warning(msg)
             return {'error': msg}
-        args = {
+        result = self._enqueue_job('generate_language_model', langmod, {
             'morpheme_language_model_id': langmod.id,
-            'user_id': self.logged_in_user.id,
-            'timeout': oldc.MORPHEME_LANGUAGE_MODEL_GENERATE_TIMEOUT,
-            'config_path': self.request.registry.settings['__file__'],
-            'settings': self.request.registry.settings
-        }
-        FOMA_WORKER_Q.put({
-            'id': h.generate_salt(),
-            'func': 'generate_language_model',
-            'args': args
+            'timeout': oldc.MORPHEME_LANGUAGE_MODEL_GENERATE_TIMEOUT
         })
         LOGGER.info('Added generation of morpheme language model %d to the foma'
                     ' worker queue.', id_)
-        return langmod
+        return result
 
     def get_probabilities(self):
         """Return the probability of each sequence of morphemes passed in the
@@ -116,21 +107,13 @@ class Morphemelanguagemodels(Resources):
             msg = 'There is no morpheme language model with id {}'.format(id_)
             LOGGER.warning(msg)
             return {'error': msg}
-        args = {
+        result = self._enqueue_job('compute_perplexity', langmod, {
             'morpheme_language_model_id': langmod.id,
-            'user_id': self.logged_in_user.id,
-            'timeout': oldc.MORPHEME_LANGUAGE_MODEL_GENERATE_TIMEOUT,
-            'config_path': self.request.registry.settings['__file__'],
-            'settings': self.request.registry.settings
-        }
-        FOMA_WORKER_Q.put({
-            'id': h.generate_salt(),
-            'func': 'compute_perplexity',
-            'args': args
+            'timeout': oldc.MORPHEME_LANGUAGE_MODEL_GENERATE_TIMEOUT
         })
         LOGGER.info('Added computation of perplexity of morpheme language model'
                     ' %d to the foma worker queue.', id_)
-        return langmod
+        return result
 
     def serve_arpa(self):
         """Serve the generated ARPA file of the morpheme language model.
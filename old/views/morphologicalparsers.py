@@ -6,17 +6,22 @@ import pickle
 from uuid import uuid4
 
 from formencode.validators import Invalid
-from pyramid.response import FileResponse
+from pyramid.response import FileResponse, Response
 
 from old import db_session_factory_registry
 import old.lib.constants as oldc
-from old.lib.foma_worker import FOMA_WORKER_Q
 import old.lib.helpers as h
 from old.lib.schemata import (
     TranscriptionsSchema,
     MorphemeSequencesSchema
 )
-from old.models import MorphologicalParserBackup
+from old.models import (
+    Corpus,
+    Form,
+    MorphologicalParserBackup,
+    get_session_factory
+)
+from old.models.corpus import CorpusForm
 from old.models.morphologicalparser import Cache
 from old.views.resources import Resources
 
@@ -196,6 +201,138 @@ class Morphologicalparsers(Resources):
             LOGGER.warning(msg, exc_info=True)
             return {'error': msg}
 
+    def bulkparse(self):
+        """Parse all of the words of a corpus, or of an NDJSON request body,
+        and stream the parses back as NDJSON.
+
+        :URL: ``PUT /morphologicalparsers/{id}/bulkparse``
+        :param str id: the ``id`` value of the morphological parser that will
+            be used.
+        :GET param str corpus: the ``id`` value of a corpus; if supplied, the
+            transcriptions of the corpus's forms are parsed and the request
+            body is ignored.
+        :GET param str candidates: how many of the most probable candidate
+            parses to return with each parse (default 0).
+        :Request body: if there is no ``corpus`` param, NDJSON, i.e., one JSON
+            string per line, each a transcription of one or more words.
+        :returns: if the morphological parser exists and foma is installed, an
+            ``application/x-ndjson`` response with one JSON object per unique
+            word, e.g., ``{"transcription": t1, "parse": p1, "candidates":
+            [[c1, logprob1], ...]}``, in the order in which the words first
+            occur in the input.
+
+        .. note::
+
+            Transcriptions are split into words at whitespace. The unique words
+            are parsed in batches of ``oldc.BULK_PARSE_BATCH_SIZE`` and the
+            parses of each batch are sent as soon as they are produced.
+        """
+        morphparser, id_ = self._model_from_id(eager=True)
+        LOGGER.info('Attempting to call bulk parse against morphological'
+                    ' parser %d', id_)
+        if not morphparser:
+            self.request.response.status_int = 404
+            msg = 'There is no morphological parser with id {}'.format(id_)
+            LOGGER.warning(msg)
+            return {'error': msg}
+        if not h.foma_installed():
+            self.request.response.status_int = 400
+            msg = 'Foma and flookup are not installed.'
+            LOGGER.warning(msg)
+            return {'error': msg}
+        try:
+            max_candidates = int(self.request.GET.get('candidates', 0))
+            if not 0 <= max_candidates <= oldc.BULK_PARSE_MAX_CANDIDATES:
+                raise ValueError
+        except ValueError:
+            self.request.response.status_int = 400
+            msg = ('The candidates parameter must be an integer between 0'
+                   ' and {}.'.format(oldc.BULK_PARSE_MAX_CANDIDATES))
+            LOGGER.warning(msg)
+            return {'error': msg}
+        corpus_id = self.request.GET.get('corpus')
+        if corpus_id is not None:
+            corpus = Corpus.get_int(corpus_id)
+            if corpus is not None:
+                corpus = self.request.dbsession.query(Corpus).get(corpus)
+            if not corpus:
+                self.request.response.status_int = 400
+                msg = 'There is no corpus with id {}'.format(corpus_id)
+                LOGGER.warning(msg)
+                return {'error': msg}
+            corpus_id = corpus.id
+        else:
+            try:
+                for _ in self._get_ndjson_transcriptions():
+                    pass
+            except (UnicodeDecodeError, ValueError):
+                self.request.response.status_int = 400
+                msg = ('The request body must be NDJSON with one JSON string'
+                       ' (a transcription) per line.')
+                LOGGER.warning(msg)
+                return {'error': msg}
+        # The parses are produced after this view has returned and the
+        # request's db session has been committed, so the parser is detached
+        # with the attributes that parsing needs already loaded and the
+        # corpus's forms are read with a db session of their own.
+        morphparser.my_morphology
+        morphparser.my_language_model
+        self.request.dbsession.expunge(morphparser)
+        settings = dict(self.request.registry.settings)
+        morphparser.cache = Cache(morphparser, settings, session_getter)
+        if corpus_id is None:
+            transcriptions = self._get_ndjson_transcriptions()
+        else:
+            transcriptions = self._get_corpus_transcriptions(
+                get_session_factory(self.request.dbsession.get_bind()),
+                corpus_id)
+        LOGGER.info('Streaming bulk parse of morphological parser %d', id_)
+        return Response(
+            app_iter=self._get_bulk_parse_lines(
+                morphparser, transcriptions, max_candidates),
+            content_type='application/x-ndjson',
+            charset='utf8')
+
+    def _get_ndjson_transcriptions(self):
+        """Yield the transcriptions in the NDJSON request body."""
+        self.request.body_file_seekable.seek(0)
+        for line in self.request.body_file_seekable:
+            line = line.decode(self.request.charset).strip()
+            if not line:
+                continue
+            transcription = json.loads(line)
+            if not isinstance(transcription, str):
+                raise ValueError('Not a JSON string: {}'.format(line))
+            yield transcription
+
+    @staticmethod
+    def _get_corpus_transcriptions(session_factory, corpus_id):
+        """Yield the transcriptions of the forms of the corpus with id
+        ``corpus_id``, reading them from the db in batches.
+        """
+        dbsession = session_factory()
+        try:
+            query = dbsession.query(Form.transcription).join(
+                CorpusForm, CorpusForm.form_id == Form.id).filter(
+                    CorpusForm.corpus_id == corpus_id).order_by(Form.id)
+            for transcription, in query.yield_per(oldc.BULK_PARSE_BATCH_SIZE):
+                yield transcription
+        finally:
+            dbsession.close()
+
+    @staticmethod
+    def _get_bulk_parse_lines(morphparser, transcriptions, max_candidates):
+        """Yield the NDJSON lines of a bulk parse response."""
+        words = (h.normalize(word) for transcription in transcriptions
+                 for word in (transcription or '').split())
+        for transcription, parse, candidates in morphparser.parse_stream(
+                words, batch_size=oldc.BULK_PARSE_BATCH_SIZE,
+                max_candidates=max_candidates):
+            result = {'transcription': transcription, 'parse': parse}
+            if max_candidates:
+                result['candidates'] = candidates
+            yield (json.dumps(result) + '\n').encode('utf8')
+
     def servecompiled(self):
         """Serve the compiled foma script of the morphophonology FST of the
         morphological parser.
@@ -271,15 +408,20 @@ class Morphologicalparsers(Resources):
             # executable.
             zip_path = os.path.join(directory, 'archive.zip')
             zip_file = h.ZipFile(zip_path, 'w')
+            # The LM trie (and any legacy pickled trie) is not included: it
+            # is a native-endian binary file that the exported parser
+            # regenerates from the ARPA file. Leftover temporary files from
+            # interrupted writes are skipped too.
             for file_name in os.listdir(directory):
                 if (    os.path.splitext(file_name)[1] not in
-                        ('.log', '.sh', '.zip') and
+                        ('.log', '.sh', '.zip', '.tmp', '.lmtrie') and
                         file_name != 'morpheme_language_model.pickle'):
                     zip_file.write_file(os.path.join(directory, file_name))
             zip_file.write_directory(
                 os.path.join(lib_path, 'simplelm'),
                 keep_dir=True)
             zip_file.write_file(os.path.join(lib_path, 'parser.py'))
+            zip_file.write_file(os.path.join(lib_path, 'foma_lookup.py'))
             zip_file.write_file(os.path.join(lib_path, 'parse.py'))
             zip_file.close()
             LOGGER.info('Served the morphological parser %d as a .zip'
@@ -358,21 +500,15 @@ class Morphologicalparsers(Resources):
             msg = 'Foma and flookup are not installed.'
             LOGGER.warning(msg)
             return {'error': msg}
-        FOMA_WORKER_Q.put({
-            'id': h.generate_salt(),
-            'func': 'generate_and_compile_parser',
-            'args': {
+        result = self._enqueue_job(
+            'generate_and_compile_parser', morphparser, {
                 'morphological_parser_id': morphparser.id,
                 'compile': compile_,
-                'user_id': self.logged_in_user.id,
-                'timeout': oldc.MORPHOLOGICAL_PARSER_COMPILE_TIMEOUT,
-                'config_path': self.request.registry.settings['__file__'],
-                'settings': self.request.registry.settings
-            }
-        })
+                'timeout': oldc.MORPHOLOGICAL_PARSER_COMPILE_TIMEOUT
+            })
         LOGGER.info('Added generation (and possible compilation) of'
                     ' morphological parser %d to the foma worker queue.', id_)
-        return morphparser
+        return result
 
     def _post_create(self, parser):
         parser.make_directory_safely(parser.directory)
@@ -386,7 +522,8 @@ class Morphologicalparsers(Resources):
             'description': h.normalize(data['description']),
             'phonology': data['phonology'],
             'morphology': data['morphology'],
-            'language_model': data['language_model']
+            'language_model': data['language_model'],
+            'lookup_backend': data['lookup_backend']
         }
 
     def _get_create_data(self, data):
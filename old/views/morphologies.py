@@ -9,7 +9,6 @@ from formencode.validators import Invalid
 from pyramid.response import FileResponse
 
 from old.models import MorphologyBackup
-from old.lib.foma_worker import FOMA_WORKER_Q
 import old.lib.helpers as h
 import old.lib.constants as oldc
 from old.lib.schemata import MorphemeSequencesSchema
@@ -97,21 +96,15 @@ class Morphologies(Resources):
             msg = 'Foma and flookup are not installed.'
             LOGGER.warning(msg)
             return {'error': msg}
-        FOMA_WORKER_Q.put({
-            'id': h.generate_salt(),
-            'func': 'generate_and_compile_morphology',
-            'args': {
+        result = self._enqueue_job(
+            'generate_and_compile_morphology', morphology, {
                 'morphology_id': morphology.id,
                 'compile': compile_,
-                'user_id': self.logged_in_user.id,
-                'timeout': oldc.MORPHOLOGY_COMPILE_TIMEOUT,
-                'config_path': self.request.registry.settings['__file__'],
-                'settings': self.request.registry.settings
-            }
-        })
+                'timeout': oldc.MORPHOLOGY_COMPILE_TIMEOUT
+            })
         LOGGER.info('Added generation (and possible compilation) of'
                     ' morphology %d to the foma worker queue.', id_)
-        return morphology
+        return result
 
     def servecompiled(self):
         """Serve the compiled foma script of the morphology.
@@ -7,7 +7,6 @@ from formencode.validators import Invalid
 from pyramid.response import FileResponse
 
 import old.lib.constants as oldc
-from old.lib.foma_worker import FOMA_WORKER_Q
 import old.lib.helpers as h
 from old.lib.schemata import MorphophonemicTranscriptionsSchema
 from old.models import PhonologyBackup
@@ -24,11 +23,12 @@ class Phonologies(Resources):
         :URL: ``PUT /phonologies/compile/id``
         :param str id: the ``id`` value of the phonology whose script will be compiled.
         :returns: if the phonology exists and foma is installed, the phonology
-            model is returned;  ``GET /phonologies/id`` must be polled to
-            determine when and how the compilation task has terminated.
+            is returned with the compilation job under its 'job' key;
+            ``GET /jobs/<job.id>`` (or ``GET /phonologies/id``) can be polled
+            to determine when and how the compilation task has terminated.
         .. note::
-            The script is compiled asynchronously in a worker thread. See
-            :mod:`onlinelinguisticdatabase.lib.foma_worker`.
+            The script is compiled asynchronously in a worker process. See
+            :mod:`old.lib.foma_worker`.
         """
         phonology, id_ = self._model_from_id(eager=True)
         LOGGER.info('Attempting to compile phonology %d', id_)
@@ -42,20 +42,13 @@ class Phonologies(Resources):
             msg = 'Foma and flookup are not installed.'
             LOGGER.warning(msg)
             return {'error': msg}
-        FOMA_WORKER_Q.put({
-            'id': h.generate_salt(),
-            'func': 'compile_phonology',
-            'args': {
-                'phonology_id': phonology.id,
-                'user_id': self.logged_in_user.id,
-                'timeout': oldc.PHONOLOGY_COMPILE_TIMEOUT,
-                'config_path': self.request.registry.settings['__file__'],
-                'settings': self.request.registry.settings
-            }
+        result = self._enqueue_job('compile_phonology', phonology, {
+            'phonology_id': phonology.id,
+            'timeout': oldc.PHONOLOGY_COMPILE_TIMEOUT
         })
         LOGGER.info('Added compilation of phonolgy %d to the foma worker'
                     ' queue.', id_)
-        return phonology
+        return result
 
     def servecompiled(self):
         """Serve the compiled foma script of the phonology.
@@ -5,6 +5,7 @@ import logging
 
 from formencode.validators import Invalid
 import inflect
+from pyramid.response import Response
 from sqlalchemy.sql import asc
 from sqlalchemy.exc import OperationalError
 
@@ -12,6 +13,7 @@ from old.lib.constants import (
     ALLOWED_FILE_TYPES,
     COLLECTION_TYPES,
     CORPUS_FORMATS,
+    EXPORT_FORMATS,
     JSONDecodeErrorResponse,
     LANGUAGE_MODEL_TOOLKITS,
     MARKUP_LANGUAGES,
@@ -22,16 +24,20 @@ from old.lib.constants import (
 )
 from old.lib.SQLAQueryBuilder import SQLAQueryBuilder, OLDSearchParseError
 from old.lib.bibtex import ENTRY_TYPES
+from old.lib.foma_worker import enqueue_job
 from old.lib.dbutils import (
     add_pagination,
     DBUtils,
     _filter_restricted_models_from_query,
+    get_dicts_batches,
     get_eagerloader,
+    is_unpaginated,
     minimal_model
 )
 import old.lib.helpers as h
 import old.lib.schemata as old_schemata
 import old.models as old_models
+from old.models import get_session_factory
 
 
 # pylint: disable=no-self-use
@@ -70,6 +76,10 @@ class ReadonlyResources:
     | Search          | SEARCH      | /<cllctn_name>           | search |
     +-----------------+-------------+--------------------------+--------+
 
+    All resources can also be exported (i.e., streamed as NDJSON or CSV) via
+    ``GET /<cllctn_name>/export`` (``export``) and searchable ones via ``SEARCH
+    /<cllctn_name>/export`` (``export_search``).
+
     Note: the create, new, update, edit, and delete actions are all exposed via
     the REST API; however, they invariably return 404 responses.
     """
@@ -151,13 +161,19 @@ class ReadonlyResources:
         :returns: a JSON-serialized array of resources objects.
         """
         LOGGER.info('Attempting to read all %s', self.hmn_collection_name)
-        query = self._eagerload_model(
-            self.request.dbsession.query(self.model_cls))
+        query = self.request.dbsession.query(self.model_cls)
         get_params = dict(self.request.GET)
         try:
             query = self.add_order_by(query, get_params)
             query = self._filter_query(query)
-            result = add_pagination(query, get_params)
+            if is_unpaginated(get_params):
+                response = self._get_all_response(query)
+                if response is not None:
+                    LOGGER.info('Reading all %s', self.hmn_collection_name)
+                    return response
+            action = 'minimal' if get_params.get('minimal') else 'list'
+            result = add_pagination(
+                self._eagerload_model(query, action), get_params)
         except Invalid as error:
             self.request.response.status_int = 400
             errors = error.unpack_errors()
@@ -177,7 +193,9 @@ class ReadonlyResources:
         :returns: a resource model object.
         """
         LOGGER.info('Attempting to read a single %s', self.hmn_member_name)
-        resource_model, id_ = self._model_from_id(eager=True)
+        minimal = dict(self.request.GET).get('minimal')
+        resource_model, id_ = self._model_from_id(
+            eager=True, action='minimal' if minimal else 'show')
         if not resource_model:
             self.request.response.status_int = 404
             msg = self._rsrc_not_exist(id_)
@@ -188,7 +206,7 @@ class ReadonlyResources:
             LOGGER.warning(UNAUTHORIZED_MSG)
             return UNAUTHORIZED_MSG
         LOGGER.info('Reading a single %s', self.hmn_member_name)
-        if dict(self.request.GET).get('minimal'):
+        if minimal:
             return minimal_model(resource_model)
         return self._get_show_dict(resource_model)
 
@@ -223,37 +241,22 @@ class ReadonlyResources:
           where the ``order_by`` and ``paginator`` attributes are optional.
         """
         LOGGER.info('Attempting to search over %s', self.hmn_collection_name)
+        python_search_params, sqla_query = self._get_search_query()
+        if python_search_params is None:
+            return sqla_query
+        query = self._filter_query(sqla_query)
+        paginator = python_search_params.get('paginator')
         try:
-            python_search_params = json.loads(
-                self.request.body.decode(self.request.charset))
-        except ValueError:
-            self.request.response.status_int = 400
-            LOGGER.warning('Request body was not valid JSON')
-            return JSONDecodeErrorResponse
-        try:
-            sqla_query = self.query_builder.get_SQLA_query(
-                python_search_params.get('query'))
-        except (OLDSearchParseError, Invalid) as error:
-            self.request.response.status_int = 400
-            errors = error.unpack_errors()
-            LOGGER.warning(
-                'Attempt to search over all %s resulted in an error(s): %s',
-                self.hmn_collection_name, errors)
-            return {'errors': errors}
-        # Might be better to catch (OperationalError, AttributeError,
-        # InvalidRequestError, RuntimeError):
-        except Exception as error:  # FIX: too general exception
-            LOGGER.warning('%s\'s filter expression (%s) raised an unexpected'
-                           ' exception: %s.',
-                           h.get_user_full_name(self.request.session['user']),
-                           self.request.body, error)
-            self.request.response.status_int = 400
-            return {'error': 'The specified search parameters generated an'
-                             ' invalid database query'}
-        query = self._eagerload_model(sqla_query)
-        query = self._filter_query(query)
-        try:
-            ret = add_pagination(query, python_search_params.get('paginator'))
+            if is_unpaginated(paginator):
+                response = self._get_all_response(query)
+                if response is not None:
+                    LOGGER.info('Successful search over %s',
+                                self.hmn_collection_name)
+                    return response
+            action = ('minimal' if paginator and paginator.get('minimal')
+                      else 'list')
+            ret = add_pagination(
+                self._eagerload_model(query, action), paginator)
         except OperationalError:
             self.request.response.status_int = 400
             msg = ('The specified search parameters generated an invalid'
@@ -271,6 +274,55 @@ class ReadonlyResources:
             LOGGER.info('Successful search over %s', self.hmn_collection_name)
             return ret
 
+    def export(self):
+        """Stream all resources as NDJSON or CSV.
+
+        - URL: ``GET /<resource_collection_name>/export`` with an optional
+          ``format`` query string parameter (``ndjson``, the default, or
+          ``csv``) and optional parameters for ordering.
+
+        The response is gzipped if the request's ``Accept-Encoding`` header
+        accepts that.
+        """
+        LOGGER.info('Attempting to export all %s', self.hmn_collection_name)
+        get_params = dict(self.request.GET)
+        format_ = get_params.get('format', 'ndjson')
+        if format_ not in EXPORT_FORMATS:
+            return self._export_format_error(format_)
+        try:
+            query = self.add_order_by(
+                self.request.dbsession.query(self.model_cls), get_params)
+        except Invalid as error:
+            self.request.response.status_int = 400
+            errors = error.unpack_errors()
+            LOGGER.warning('Attempt to export all %s resulted in an error(s):'
+                           ' %s', self.hmn_collection_name, errors)
+            return {'errors': errors}
+        LOGGER.info('Exporting all %s', self.hmn_collection_name)
+        return self._get_export_response(self._filter_query(query), format_)
+
+    def export_search(self):
+        """Stream the resources matching the input JSON query as NDJSON or CSV.
+
+        - URL: ``SEARCH /<resource_collection_name>/export`` (or ``POST
+          /<resource_collection_name>/export``) with an optional ``format``
+          query string parameter, as for ``export``.
+        - request body: A JSON object of the form::
+
+              {"query": {"filter": [ ... ], "order_by": [ ... ]}}
+        """
+        LOGGER.info('Attempting to export a search over %s',
+                    self.hmn_collection_name)
+        format_ = self.request.GET.get('format', 'ndjson')
+        if format_ not in EXPORT_FORMATS:
+            return self._export_format_error(format_)
+        python_search_params, sqla_query = self._get_search_query()
+        if python_search_params is None:
+            return sqla_query
+        LOGGER.info('Exporting a search over %s', self.hmn_collection_name)
+        return self._get_export_response(
+            self._filter_query(sqla_query), format_, unique=True)
+
     def new_search(self):
         """Return the data necessary to search over this type of resource.
 
@@ -303,9 +355,87 @@ class ReadonlyResources:
     def _get_update_dict(self, resource_model):
         return self._get_create_dict(resource_model)
 
-    def _eagerload_model(self, query_obj):
-        """Override this in a subclass with model-specific eager loading."""
-        return get_eagerloader(self.model_name)(query_obj)
+    def _eagerload_model(self, query_obj, action='list'):
+        """Eager load the relations that the ``action`` view (``'list'``,
+        ``'show'`` or ``'minimal'``) of the queried models needs; cf.
+        ``old.lib.dbutils.EAGERLOADS``. Override this in a subclass with
+        model-specific eager loading.
+        """
+        return get_eagerloader(self.model_name, action)(query_obj)
+
+    def _get_search_query(self):
+        """Return the search parameters in the JSON request body and the query
+        that they express or, if either is invalid, ``None`` and the error
+        response.
+        """
+        try:
+            python_search_params = json.loads(
+                self.request.body.decode(self.request.charset))
+        except ValueError:
+            self.request.response.status_int = 400
+            LOGGER.warning('Request body was not valid JSON')
+            return None, JSONDecodeErrorResponse
+        try:
+            sqla_query = self.query_builder.get_SQLA_query(
+                python_search_params.get('query'))
+        except (OLDSearchParseError, Invalid) as error:
+            self.request.response.status_int = 400
+            errors = error.unpack_errors()
+            LOGGER.warning(
+                'Attempt to search over all %s resulted in an error(s): %s',
+                self.hmn_collection_name, errors)
+            return None, {'errors': errors}
+        # Might be better to catch (OperationalError, AttributeError,
+        # InvalidRequestError, RuntimeError):
+        except Exception as error:  # FIX: too general exception
+            LOGGER.warning('%s\'s filter expression (%s) raised an unexpected'
+                           ' exception: %s.',
+                           h.get_user_full_name(self.request.session['user']),
+                           self.request.body, error)
+            self.request.response.status_int = 400
+            return None, {'error': 'The specified search parameters generated'
+                                   ' an invalid database query'}
+        return python_search_params, sqla_query
+
+    def _export_format_error(self, format_):
+        self.request.response.status_int = 400
+        msg = 'The export format must be one of {}; not {}.'.format(
+            ', '.join(sorted(EXPORT_FORMATS)), format_)
+        LOGGER.warning(msg)
+        return {'error': msg}
+
+    def _get_export_response(self, query_obj, format_, unique=False):
+        """Return a response that streams the dicts of the resources of
+        ``query_obj`` in the format ``format_``, gzipped if the request
+        accepts that.
+        """
+        batches = get_dicts_batches(
+            get_session_factory(self.request.dbsession.get_bind()),
+            query_obj.with_entities(getattr(self.model_cls, self.primary_key)),
+            self.model_cls, unique=unique)
+        if format_ == 'csv':
+            chunks = h.get_csv_chunks(batches)
+        else:
+            chunks = h.get_ndjson_chunks(batches)
+        response = Response(content_type=EXPORT_FORMATS[format_],
+                            charset='utf8')
+        response.content_disposition = 'attachment; filename="{}.{}"'.format(
+            self.collection_name, format_)
+        if ('Accept-Encoding' in self.request.headers and
+                self.request.accept_encoding.acceptable_offers(['gzip'])):
+            response.content_encoding = 'gzip'
+            chunks = h.get_gzipped_chunks(chunks)
+        response.app_iter = chunks
+        return response
+
+    def _get_all_response(self, query_obj):
+        """Return the response to an index or search request for all of the
+        resources of ``query_obj`` (i.e., without pagination) or ``None`` to
+        have the JSON renderer serialize them. Override this in a subclass to,
+        e.g., stream the resources, cf. the forms view.
+        """
+        # pylint: disable=unused-argument
+        return None
 
     def _filter_query(self, query_obj):
         """Override this in a subclass with model-specific query filtering.
@@ -340,7 +470,7 @@ class ReadonlyResources:
         """
         return False
 
-    def _model_from_id(self, eager=False):
+    def _model_from_id(self, eager=False, action='show'):
         """Return a particular model instance (and the id value), given the
         model id supplied in the URL path.
         """
@@ -348,7 +478,8 @@ class ReadonlyResources:
         if eager:
             return (
                 self._eagerload_model(
-                    self.request.dbsession.query(self.model_cls)).get(id_),
+                    self.request.dbsession.query(self.model_cls),
+                    action).get(id_),
                 id_)
         return self.request.dbsession.query(self.model_cls).get(id_), id_
 
@@ -367,6 +498,31 @@ class ReadonlyResources:
         return 'There is no %s with %s %s' % (self.hmn_member_name,
                                               self.primary_key, id_)
 
+    def _enqueue_job(self, func, resource_model, args):
+        """Enqueue a job that calls ``func`` (a function in
+        :mod:`old.lib.foma_worker`) with ``args`` on ``resource_model`` (or on
+        no model in particular if it is ``None``). The optional ``priority``
+        GET param (an integer; higher runs first) sets the job's priority.
+        :returns: the dict of ``resource_model`` (if any) with the dict of the
+            job under the 'job' key; ``GET /jobs/<job.id>`` can be polled to
+            follow the job.
+        """
+        try:
+            priority = int(self.request.GET.get('priority', 0))
+        except ValueError:
+            priority = 0
+        args = dict(
+            args,
+            user_id=self.logged_in_user.id,
+            config_path=self.request.registry.settings.get('__file__'),
+            settings=self.request.registry.settings)
+        job = enqueue_job(func, args, model_name=self.model_name,
+                          model_id=getattr(resource_model, 'id', None),
+                          priority=priority)
+        result = resource_model.get_dict() if resource_model else {}
+        result['job'] = job.get_dict()
+        return result
+
     def add_order_by(self, query, order_by_params, query_builder=None):
         """Add an ORDER BY clause to the query using the get_SQLA_order_by
         method of the instance's query_builder (if possible) or using a default
@@ -112,4 +112,5 @@ setup(name='old',
       main = old:main
       [console_scripts]
       initialize_old = old.scripts.initialize:main
+      rebuild_search_index_old = old.scripts.rebuildsearchindex:main
       """)